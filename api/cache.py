@@ -0,0 +1,169 @@
+"""Read-through cache of rendered policies
+
+Rendered policies are cached in the Django cache named by ``settings.POLICY_CACHE_ALIAS``,
+under a key made of the policy id and its current version. The version is a random token,
+also kept in the cache, which is replaced to invalidate the policy, so that:
+
+- a request that rendered the policy from data read before an invalidation can only
+  store it under the old version, which is never read again.
+- if the version of a policy is evicted from the cache, a new one is made, so entries
+  stored under an older version are never served.
+
+Policies are invalidated whenever they, their quote or their customer are written
+(see :meth:`api.models.Policy.save` and :func:`invalidate_policies`).
+
+A cache miss is rebuilt by a single request at a time per policy (single flight), using a
+lock made with ``cache.add``, which is atomic in the cache backends that Django ships.
+Other requests missing the same policy wait for it to be stored instead of rebuilding it.
+
+:func:`aget_or_build` is the same for async views, with the async methods of the cache.
+"""
+
+import asyncio
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# How long a request waits for another one to rebuild an entry, before rebuilding it too
+SINGLE_FLIGHT_WAIT = 2
+
+# How often a waiting request checks if the entry was stored
+SINGLE_FLIGHT_POLL_INTERVAL = 0.01
+
+
+def get_cache():
+    return caches[getattr(settings, "POLICY_CACHE_ALIAS", "default")]
+
+
+def get_timeout():
+    return getattr(settings, "POLICY_CACHE_TIMEOUT", 300)
+
+
+def _version_key(policy_id):
+    return f"policy:{policy_id}:version"
+
+
+def _get_version(cache, policy_id):
+    version = cache.get(_version_key(policy_id))
+
+    if version is None:
+        # Another request may have made one meanwhile, in which case it is kept
+        cache.add(_version_key(policy_id), uuid.uuid4().hex, timeout=None)
+        version = cache.get(_version_key(policy_id))
+
+    return version
+
+
+def get_or_build(policy_id, build):
+    """Returns the cached entry of a policy, building and caching it on a miss
+
+    :param policy_id: The id of the policy
+    :param build: A callable returning the entry to cache, or None if there is nothing to
+        cache (such as when the policy does not exist)
+    """
+
+    cache = get_cache()
+    key = f"policy:{policy_id}:{_get_version(cache, policy_id)}"
+    entry = cache.get(key)
+
+    if entry is not None:
+        return entry
+
+    lock_key = f"{key}:lock"
+    deadline = time.monotonic() + SINGLE_FLIGHT_WAIT
+
+    while not cache.add(lock_key, True, timeout=SINGLE_FLIGHT_WAIT):
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+
+        entry = cache.get(key)
+
+        if entry is not None:
+            return entry
+
+        # The request holding the lock may have failed. Stop waiting for it
+        if time.monotonic() > deadline:
+            break
+
+    try:
+        entry = build()
+
+        if entry is not None:
+            cache.set(key, entry, timeout=get_timeout())
+
+        return entry
+    finally:
+        cache.delete(lock_key)
+
+
+async def _aget_version(cache, policy_id):
+    version = await cache.aget(_version_key(policy_id))
+
+    if version is None:
+        await cache.aadd(_version_key(policy_id), uuid.uuid4().hex, timeout=None)
+        version = await cache.aget(_version_key(policy_id))
+
+    return version
+
+
+async def aget_or_build(policy_id, build):
+    """Async version of :func:`get_or_build`
+
+    :param build: A coroutine function returning the entry to cache, or None
+    """
+
+    cache = get_cache()
+    key = f"policy:{policy_id}:{await _aget_version(cache, policy_id)}"
+    entry = await cache.aget(key)
+
+    if entry is not None:
+        return entry
+
+    lock_key = f"{key}:lock"
+    deadline = time.monotonic() + SINGLE_FLIGHT_WAIT
+
+    while not await cache.aadd(lock_key, True, timeout=SINGLE_FLIGHT_WAIT):
+        await asyncio.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+
+        entry = await cache.aget(key)
+
+        if entry is not None:
+            return entry
+
+        if time.monotonic() > deadline:
+            break
+
+    try:
+        entry = await build()
+
+        if entry is not None:
+            await cache.aset(key, entry, timeout=get_timeout())
+
+        return entry
+    finally:
+        await cache.adelete(lock_key)
+
+
+def invalidate_policies(policy_ids):
+    """Invalidates the cached entries of the given policies
+
+    Call this whenever a policy, its quote or its customer are written.
+    The policies are invalidated immediately, and again when the current transaction
+    commits, in case a request rendered them from the data read before the commit.
+    """
+
+    policy_ids = list(policy_ids)
+
+    if not policy_ids:
+        return
+
+    def invalidate():
+        get_cache().set_many(
+            {_version_key(policy_id): uuid.uuid4().hex for policy_id in policy_ids},
+            timeout=None,
+        )
+
+    invalidate()
+    transaction.on_commit(invalidate)
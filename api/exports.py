@@ -0,0 +1,144 @@
+"""Exports of the API's tables as NDJSON (one JSON object per line), for syncing them elsewhere
+
+The rows are read as tuples with ``values_list``, through a server-side cursor where the
+database supports it (see: :meth:`django.db.models.query.QuerySet.iterator`), and written a
+chunk at a time, so an export takes the same memory whatever the size of the table.
+Under ASGI, Django consumes sync iterators of streaming responses whole before sending them,
+so the exports are read with the async ORM instead, by :func:`aexport_ndjson`.
+"""
+
+import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import dateparse, timezone
+
+from api.models import Customer, Policy, Quote
+
+# The number of rows fetched from the database, and written, at a time
+CHUNK_SIZE = 2000
+
+# The model and the exported fields, by export name
+EXPORTS = {
+    "customers": (
+        Customer,
+        ("id", "first_name", "last_name", "date_of_birth", "created", "last_modified"),
+    ),
+    "quotes": (
+        Quote,
+        (
+            "id",
+            "status",
+            "type",
+            "premium",
+            "cover",
+            "customer_id",
+            "created",
+            "last_modified",
+        ),
+    ),
+    "policies": (
+        Policy,
+        (
+            "id",
+            "type",
+            "state",
+            "premium",
+            "cover",
+            "customer_id",
+            "quote_id",
+            "created",
+            "last_modified",
+        ),
+    ),
+}
+
+
+def parse_updated_since(value: str) -> datetime.datetime:
+    """Parses an ISO 8601 date or datetime. Dates and naive datetimes are in the current timezone
+
+    :raises ValueError: If the value is neither
+    """
+
+    try:
+        parsed = dateparse.parse_datetime(value)
+
+        if parsed is None:
+            date = dateparse.parse_date(value)
+            parsed = date and datetime.datetime.combine(date, datetime.time())
+    except ValueError:
+        parsed = None
+
+    if parsed is None:
+        raise ValueError("updated_since must be an ISO 8601 date or datetime")
+
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+
+    return parsed
+
+
+def export_rows(name, updated_since=None):
+    """Returns the exported fields and the queryset of the rows of an export, in ascending
+    order of id
+
+    :raises KeyError: If there is no such export
+    """
+
+    model, fields = EXPORTS[name]
+
+    rows = model.objects.order_by("id")
+
+    if updated_since is not None:
+        rows = rows.filter(last_modified__gte=updated_since)
+
+    return fields, rows
+
+
+def encode_lines(encoder, rows) -> bytes:
+    """Encodes rows, as dicts, as lines of NDJSON"""
+
+    return ("\n".join(encoder.encode(row) for row in rows) + "\n").encode()
+
+
+def export_ndjson(name, updated_since=None, chunk_size=CHUNK_SIZE):
+    """Yields the rows of an export as NDJSON, in ascending order of id, a chunk of lines at a time
+
+    :param name: One of :data:`EXPORTS`
+    :param updated_since: Only export the rows modified at or after this datetime
+    :param chunk_size: The number of rows per chunk
+    :raises KeyError: If there is no such export
+    """
+
+    fields, rows = export_rows(name, updated_since)
+    encoder = DjangoJSONEncoder()
+    chunk = []
+
+    for row in rows.values_list(*fields).iterator(chunk_size=chunk_size):
+        chunk.append(dict(zip(fields, row)))
+
+        if len(chunk) == chunk_size:
+            yield encode_lines(encoder, chunk)
+            chunk = []
+
+    if chunk:
+        yield encode_lines(encoder, chunk)
+
+
+async def aexport_ndjson(name, updated_since=None, chunk_size=CHUNK_SIZE):
+    """Async version of :func:`export_ndjson`, for ASGI"""
+
+    fields, rows = export_rows(name, updated_since)
+    encoder = DjangoJSONEncoder()
+    chunk = []
+
+    # values() rather than values_list(), whose aiterator() runs the query in the event
+    # loop's thread (as of Django 5.2), which raises SynchronousOnlyOperation
+    async for row in rows.values(*fields).aiterator(chunk_size=chunk_size):
+        chunk.append(row)
+
+        if len(chunk) == chunk_size:
+            yield encode_lines(encoder, chunk)
+            chunk = []
+
+    if chunk:
+        yield encode_lines(encoder, chunk)
@@ -0,0 +1,196 @@
+"""Compact snapshots of policies for :class:`api.models.PolicyStateHistory`
+
+A snapshot is what :meth:`api.models.Policy.serialize` returned when the entry was recorded.
+Storing it in full duplicates the customer (once in the policy and once in its quote) and
+repeats everything that did not change since the previous entry. Instead, entries store:
+
+- a keyframe: the snapshot, without the quote's customer when it is the policy's customer
+  (which it always is for policies issued from a quote)::
+
+    {"format": "compact", "depth": 0, "snapshot": {...}}
+
+- or a delta: the fields that changed since the previous entry of the policy, by path::
+
+    {"format": "compact", "depth": 2, "previous": 41, "changes": {"state": "bound"}, "removed": []}
+
+Every :data:`KEYFRAME_INTERVAL` entries of a policy is a keyframe, so at most that many
+entries have to be read to reconstruct any of them.
+Entries stored before this format (the full snapshot) are read as keyframes.
+
+These are pure functions on JSON values. The migration that compacted the existing entries
+(``0010_compact_policy_state_history``) has its own copy of them.
+"""
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+COMPACT_FORMAT = "compact"
+
+# The maximum number of entries in a chain of deltas, keyframe included
+KEYFRAME_INTERVAL = 16
+
+_MISSING = object()
+
+
+def to_json_value(snapshot):
+    """Converts a snapshot to the JSON value it is stored as (such as Decimals to strings)"""
+
+    return json.loads(json.dumps(snapshot, cls=DjangoJSONEncoder))
+
+
+def is_delta(as_json) -> bool:
+    return as_json.get("format") == COMPACT_FORMAT and "previous" in as_json
+
+
+def keyframe_snapshot(as_json) -> dict:
+    """Returns the snapshot stored in a keyframe, in either format"""
+
+    return as_json["snapshot"] if as_json.get("format") == COMPACT_FORMAT else as_json
+
+
+def depth(as_json) -> int:
+    """Returns the number of deltas between an entry and its keyframe"""
+
+    return as_json.get("depth", 0) if as_json.get("format") == COMPACT_FORMAT else 0
+
+
+def flatten(snapshot) -> dict:
+    """Flattens a snapshot to a dict of paths ("quote.status") to values
+
+    The quote's customer is left out if it is the policy's customer.
+    """
+
+    snapshot = dict(snapshot)
+
+    if isinstance(snapshot.get("quote"), dict):
+        quote = dict(snapshot["quote"])
+
+        if quote.get("customer", _MISSING) == snapshot.get("customer"):
+            del quote["customer"]
+
+        snapshot["quote"] = quote
+
+    flat = {}
+
+    def visit(value, path):
+        if isinstance(value, dict) and value:
+            for key, item in value.items():
+                visit(item, f"{path}.{key}")
+        else:
+            flat[path] = value
+
+    for key, value in snapshot.items():
+        visit(value, key)
+
+    return flat
+
+
+def nest(flat: dict) -> dict:
+    """Nests a flattened snapshot, without adding back the quote's customer"""
+
+    snapshot = {}
+
+    for path, value in flat.items():
+        *parents, key = path.split(".")
+        node = snapshot
+
+        for parent in parents:
+            node = node.setdefault(parent, {})
+
+        node[key] = value
+
+    return snapshot
+
+
+def unflatten(flat: dict) -> dict:
+    """Reverses :func:`flatten`"""
+
+    snapshot = nest(flat)
+    quote = snapshot.get("quote")
+
+    if isinstance(quote, dict) and "customer" not in quote and "customer" in snapshot:
+        quote["customer"] = json.loads(json.dumps(snapshot["customer"]))
+
+    return snapshot
+
+
+def _same(a, b) -> bool:
+    # 1, 1.0 and True are equal, but are not rendered the same
+    return type(a) is type(b) and a == b
+
+
+def compact(snapshot, previous_flat=None, previous_depth=0, previous_id=None) -> dict:
+    """Returns the compact entry for a snapshot
+
+    :param snapshot: The JSON value of the snapshot. See :func:`to_json_value`
+    :param previous_flat: The flattened snapshot of the previous entry, if any
+    :param previous_depth: The depth of the previous entry
+    :param previous_id: The id of the previous entry
+    """
+
+    flat = flatten(snapshot)
+
+    if previous_flat is None or previous_depth + 1 >= KEYFRAME_INTERVAL:
+        return {"format": COMPACT_FORMAT, "depth": 0, "snapshot": nest(flat)}
+
+    return {
+        "format": COMPACT_FORMAT,
+        "depth": previous_depth + 1,
+        "previous": previous_id,
+        "changes": {
+            path: value
+            for path, value in flat.items()
+            if not _same(previous_flat.get(path, _MISSING), value)
+        },
+        "removed": [path for path in previous_flat if path not in flat],
+    }
+
+
+def resolve(as_json_by_id: dict, entry_ids) -> dict:
+    """Reconstructs the flattened snapshots of entries
+
+    :param as_json_by_id: The stored JSON of entries by id, including all the entries their
+        deltas are based on
+    :param entry_ids: The ids of the entries to reconstruct
+    :returns: The flattened snapshots, by id. They include the entries the requested ones are
+        based on
+    :raises KeyError: If an entry a delta is based on is not in ``as_json_by_id``
+    """
+
+    flat_by_id = {}
+
+    for entry_id in entry_ids:
+        chain = []
+
+        while entry_id not in flat_by_id:
+            as_json = as_json_by_id[entry_id]
+
+            if not is_delta(as_json):
+                flat_by_id[entry_id] = flatten(keyframe_snapshot(as_json))
+                break
+
+            chain.append(entry_id)
+            entry_id = as_json["previous"]
+
+        for delta_id in reversed(chain):
+            delta = as_json_by_id[delta_id]
+            flat = dict(flat_by_id[delta["previous"]])
+
+            for path in delta["removed"]:
+                flat.pop(path, None)
+
+            flat.update(delta["changes"])
+            flat_by_id[delta_id] = flat
+
+    return flat_by_id
+
+
+def missing_bases(as_json_by_id: dict) -> set:
+    """Returns the ids of the entries deltas are based on that are not in ``as_json_by_id``"""
+
+    return {
+        as_json["previous"]
+        for as_json in as_json_by_id.values()
+        if is_delta(as_json) and as_json["previous"] not in as_json_by_id
+    }
@@ -0,0 +1,49 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import PolicyStateHistory, PolicyStateHistoryArchive
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the policy state history entries older than an age to the archive, "
+        "a batch of policies at a time"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=settings.POLICY_HISTORY_ARCHIVE_AFTER_DAYS,
+            help="The age of the entries to archive, in days",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="The number of policies whose entries are archived in one transaction",
+        )
+
+    def handle(self, *args, older_than_days, batch_size, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=older_than_days)
+
+        policy_ids = list(
+            PolicyStateHistory.objects.filter(created__lt=cutoff)
+            .order_by("policy_id")
+            .values_list("policy_id", flat=True)
+            .distinct()
+        )
+
+        archived = 0
+
+        for start in range(0, len(policy_ids), batch_size):
+            archived += PolicyStateHistoryArchive.archive_older_than(
+                policy_ids[start : start + batch_size], cutoff
+            )
+
+        self.stdout.write(
+            f"Archived {archived} state history entries of {len(policy_ids)} policies"
+        )
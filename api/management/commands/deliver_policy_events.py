@@ -0,0 +1,228 @@
+import datetime
+import json
+import random
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from api.models import PolicyEvent
+
+# The delay before retrying a failed delivery doubles with each attempt, up to the maximum
+BACKOFF_BASE = datetime.timedelta(seconds=5)
+BACKOFF_MAX = datetime.timedelta(hours=1)
+
+# The time a worker has to deliver the batches it claimed, before other workers may claim them
+CLAIM_TIMEOUT = datetime.timedelta(minutes=5)
+
+
+def backoff(attempts):
+    """Returns the delay before the next delivery, after a number of failed ones (with jitter)"""
+
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+    return delay * random.uniform(0.5, 1)
+
+
+def post_events(destination, events):
+    """POSTs a batch of events to a webhook, as ``{"events": [...]}``
+
+    :raises OSError: If the webhook cannot be reached or does not respond with a 2xx
+    :raises http.client.HTTPException: If the webhook responds with something other than HTTP
+    :raises ValueError: If the destination is not a valid URL
+    """
+
+    request = urllib.request.Request(
+        destination,
+        data=json.dumps(
+            {"events": [event.payload for event in events]}, cls=DjangoJSONEncoder
+        ).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+
+    # Responses other than 2xx (and 3xx, which are followed) raise HTTPError
+    with urllib.request.urlopen(request, timeout=settings.POLICY_EVENT_TIMEOUT):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Delivers the policy events in the outbox to their webhooks, in batches, "
+        "in order for each webhook. Several workers may run at once: each batch is "
+        "claimed by one of them"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="The maximum number of events sent to a webhook in one request",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="The number of webhooks delivered to at the same time",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1,
+            help="How often to look for new events, in seconds",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=10,
+            help=(
+                "The number of failed deliveries after which a batch is given up on, "
+                "so that the next events of its webhook are delivered"
+            ),
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once there are no events ready to be delivered",
+        )
+
+    def handle(
+        self,
+        *args,
+        batch_size,
+        concurrency,
+        poll_interval,
+        max_attempts,
+        once,
+        **options,
+    ):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                delivered = self.deliver(executor, batch_size, max_attempts)
+
+                if delivered:
+                    continue
+
+                if once:
+                    break
+
+                time.sleep(poll_interval)
+
+    def deliver(self, executor, batch_size, max_attempts):
+        """Delivers the next batch of events of every webhook
+
+        The events of a webhook are delivered in order: if the oldest one is waiting to be
+        retried, so are the others. After ``max_attempts`` failed deliveries, the events of
+        the batch are marked as failed (dead letters), and the next ones are delivered.
+        The webhooks are requested concurrently, but the database is only used from this
+        thread. Each batch is claimed first (see: :meth:`claim`), so that workers running
+        at the same time do not deliver the same events.
+
+        :returns: The number of events delivered
+        """
+
+        now = timezone.now()
+
+        pending = PolicyEvent.objects.filter(failed_at__isnull=True)
+        batches = []
+
+        for destination in self.get_destinations():
+            events = list(
+                pending.filter(destination=destination).order_by("id")[:batch_size]
+            )
+
+            # Another worker may have delivered the last events since they were listed
+            if not events:
+                continue
+
+            if events[0].next_attempt_at <= now and self.claim(events[0], now):
+                batches.append(events)
+
+        futures = [
+            (events, executor.submit(post_events, events[0].destination, events))
+            for events in batches
+        ]
+
+        delivered = 0
+
+        for events, future in futures:
+            try:
+                future.result()
+            # Any error is retried, so that it does not stop the delivery of the other batches
+            except Exception as err:
+                # The first event of the batch holds the retry state of the webhook
+                head = events[0]
+                head.attempts += 1
+                head.next_attempt_at = timezone.now() + backoff(head.attempts)
+                head.last_error = str(err)
+
+                if head.attempts >= max_attempts:
+                    self.give_up(events, err)
+                    continue
+
+                head.save(update_fields=["attempts", "next_attempt_at", "last_error"])
+
+                self.stderr.write(
+                    f"{head.destination}: {err} "
+                    f"(attempt {head.attempts}, retrying at {head.next_attempt_at})"
+                )
+            else:
+                PolicyEvent.objects.filter(
+                    id__in=[event.id for event in events]
+                ).delete()
+                delivered += len(events)
+
+        if delivered:
+            self.stdout.write(f"Delivered {delivered} policy events")
+
+        return delivered
+
+    def get_destinations(self) -> list:
+        """Returns the webhooks with events to deliver"""
+
+        return list(
+            PolicyEvent.objects.filter(failed_at__isnull=True)
+            .order_by()
+            .values_list("destination", flat=True)
+            .distinct()
+        )
+
+    def give_up(self, events, err):
+        """Marks the events of a batch as failed, after its last delivery failed with an error"""
+
+        head = events[0]
+
+        PolicyEvent.objects.filter(id__in=[event.id for event in events]).update(
+            failed_at=timezone.now(), last_error=str(err)
+        )
+        PolicyEvent.objects.filter(id=head.id).update(attempts=head.attempts)
+
+        self.stderr.write(
+            f"{head.destination}: {err} (attempt {head.attempts}, giving up on "
+            f"{len(events)} events from id {head.id})"
+        )
+
+    def claim(self, head, now) -> bool:
+        """Claims the batch of a webhook for :data:`CLAIM_TIMEOUT`, by pushing back the next
+        attempt of its first event
+
+        The next attempt is only pushed back if no other worker has since the event was
+        read. A single conditional UPDATE does this, on every database (SQLite has no
+        ``SELECT ... FOR UPDATE SKIP LOCKED``). If a worker stops before the end of the
+        delivery, its claim expires, and the batch is delivered again.
+
+        :returns: Whether the batch was claimed
+        """
+
+        claimed_until = now + CLAIM_TIMEOUT
+        claimed = PolicyEvent.objects.filter(
+            id=head.id, next_attempt_at=head.next_attempt_at
+        ).update(next_attempt_at=claimed_until)
+        head.next_attempt_at = claimed_until
+
+        return bool(claimed)
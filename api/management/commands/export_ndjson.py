@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.exports import EXPORTS, export_ndjson, parse_updated_since
+
+
+class Command(BaseCommand):
+    help = "Exports all the rows of a table as NDJSON (one JSON object per line)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("export", choices=sorted(EXPORTS))
+        parser.add_argument(
+            "--updated-since",
+            help="Only export the rows modified since this ISO 8601 date or datetime",
+        )
+        parser.add_argument(
+            "--output",
+            help="The file to write the rows to. Defaults to the standard output",
+        )
+
+    def handle(self, *args, export, updated_since, output, **options):
+        if updated_since is not None:
+            try:
+                updated_since = parse_updated_since(updated_since)
+            except ValueError as err:
+                raise CommandError(err)
+
+        chunks = export_ndjson(export, updated_since)
+
+        if output is None:
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending="")
+        else:
+            with open(output, "wb") as file:
+                file.writelines(chunks)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Customer, Policy, Quote, TableStatistics
+
+
+class Command(BaseCommand):
+    help = "Counts the rows of the API's tables, for the estimates served by the API"
+
+    models = (Customer, Quote, Policy)
+
+    def handle(self, *args, **options):
+        for model in self.models:
+            row_count = model.objects.count()
+
+            TableStatistics.objects.update_or_create(
+                table=model._meta.db_table,
+                defaults={"row_count": row_count},
+            )
+
+            self.stdout.write(f"{model._meta.db_table}: {row_count} rows")
@@ -0,0 +1,169 @@
+import collections
+import datetime
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import Policy, Quote, share_customers
+from api.v1.rating import RateTable
+from api.v1.rerating import init_worker, reprice
+
+# The policies whose price may still change
+OPEN_STATES = (Policy.PolicyState.QUOTED, Policy.PolicyState.NEW)
+
+
+class Command(BaseCommand):
+    help = (
+        "Prices the open (quoted or new) policies, and their quotes, again with the "
+        "current rates, in parallel"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="The number of policies read, priced and written at a time",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="The number of processes pricing the policies",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help=(
+                "A file to record progress in after each chunk. If it exists, the "
+                "command resumes from it. It is deleted once every policy is repriced"
+            ),
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report the prices that would change, without changing them",
+        )
+
+    def handle(self, *args, chunk_size, workers, checkpoint, dry_run, **options):
+        after = 0
+
+        if checkpoint is not None and os.path.exists(checkpoint):
+            with open(checkpoint) as file:
+                after = json.load(file)["after"]
+
+            self.stdout.write(f"Resuming after policy {after}")
+
+        # Fail early if the rates are invalid, and price the whole run with the same rates
+        rates_file = settings.QUOTE_RATES_FILE
+
+        try:
+            RateTable.from_file(rates_file)
+        except (OSError, ValueError) as err:
+            raise CommandError(f"Could not load the rates: {err}")
+
+        today = datetime.date.today()
+        read = changed = 0
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(rates_file, Quote.QuoteType.values),
+        ) as executor:
+            # Chunks are read and priced ahead, but written (and checkpointed) in order
+            pending = collections.deque()
+
+            while True:
+                while len(pending) < 2 * workers:
+                    rows = self.read_chunk(after, chunk_size)
+
+                    if not rows:
+                        break
+
+                    after = rows[-1][0]
+                    read += len(rows)
+                    pending.append((after, executor.submit(reprice, rows, today)))
+
+                if not pending:
+                    break
+
+                last_id, future = pending.popleft()
+                changes = future.result()
+                changed += len(changes)
+
+                if dry_run:
+                    self.report(changes)
+                else:
+                    self.write_chunk(changes)
+
+                    if checkpoint is not None:
+                        self.write_checkpoint(checkpoint, last_id)
+
+        if checkpoint is not None and not dry_run and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        self.stdout.write(
+            f"{'Would reprice' if dry_run else 'Repriced'} {changed} of {read} open policies"
+        )
+
+    def read_chunk(self, after, chunk_size):
+        return list(
+            Policy.objects.filter(id__gt=after, state__in=OPEN_STATES)
+            .order_by("id")
+            .values_list("id", "type", "cover", "premium", "customer__date_of_birth")[
+                :chunk_size
+            ]
+        )
+
+    def write_chunk(self, changes):
+        """Saves the new prices of policies and their quotes, with one statement per table
+
+        The policies are read again (and locked) first, so one that was bound since it was
+        priced is left as is.
+        """
+
+        prices = {
+            policy_id: (cover, premium) for policy_id, _, cover, _, premium in changes
+        }
+
+        with transaction.atomic():
+            policies = list(
+                Policy.objects.for_serialization()
+                .select_for_update(of=("self",))
+                .filter(id__in=prices, state__in=OPEN_STATES)
+            )
+            share_customers(policies)
+
+            now = timezone.now()
+
+            for policy in policies:
+                policy.cover, policy.premium = prices[policy.id]
+                policy.quote.cover, policy.quote.premium = prices[policy.id]
+                policy.quote.last_modified = now
+
+            Quote.objects.bulk_update(
+                [policy.quote for policy in policies],
+                ["cover", "premium", "last_modified"],
+                batch_size=500,
+            )
+            Policy.save_state_changes(policies, fields=("cover", "premium"))
+
+    def write_checkpoint(self, checkpoint, after):
+        # Replace the file at once, so that it is never half written
+        with open(f"{checkpoint}.tmp", "w") as file:
+            json.dump({"after": after}, file)
+
+        os.replace(f"{checkpoint}.tmp", checkpoint)
+
+    def report(self, changes):
+        for policy_id, cover, new_cover, premium, new_premium in changes:
+            self.stdout.write(
+                f"policy {policy_id}: cover {cover} -> {new_cover}, "
+                f"premium {premium} -> {new_premium}"
+            )
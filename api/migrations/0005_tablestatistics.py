@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-17 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_alter_policy_options_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TableStatistics",
+            fields=[
+                (
+                    "table",
+                    models.CharField(max_length=100, primary_key=True, serialize=False),
+                ),
+                ("row_count", models.BigIntegerField()),
+                ("refreshed", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "table statistics",
+                "db_table": "table_statistics",
+            },
+        ),
+    ]
@@ -0,0 +1,99 @@
+"""Adds a trigram index of customer names, where the database supports it
+
+See :mod:`api.search`
+"""
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE customers_name_fts USING fts5(
+        first_name, last_name, content='customers', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER customers_name_fts_insert AFTER INSERT ON customers BEGIN
+        INSERT INTO customers_name_fts(rowid, first_name, last_name)
+        VALUES (new.id, new.first_name, new.last_name);
+    END
+    """,
+    """
+    CREATE TRIGGER customers_name_fts_delete AFTER DELETE ON customers BEGIN
+        INSERT INTO customers_name_fts(customers_name_fts, rowid, first_name, last_name)
+        VALUES ('delete', old.id, old.first_name, old.last_name);
+    END
+    """,
+    """
+    CREATE TRIGGER customers_name_fts_update AFTER UPDATE OF first_name, last_name
+    ON customers BEGIN
+        INSERT INTO customers_name_fts(customers_name_fts, rowid, first_name, last_name)
+        VALUES ('delete', old.id, old.first_name, old.last_name);
+        INSERT INTO customers_name_fts(rowid, first_name, last_name)
+        VALUES (new.id, new.first_name, new.last_name);
+    END
+    """,
+    # Index the customers that already exist
+    "INSERT INTO customers_name_fts(customers_name_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS customers_name_fts_update",
+    "DROP TRIGGER IF EXISTS customers_name_fts_delete",
+    "DROP TRIGGER IF EXISTS customers_name_fts_insert",
+    "DROP TABLE IF EXISTS customers_name_fts",
+]
+
+# Django compiles `icontains` to `UPPER("column"::text) LIKE UPPER(...)` on PostgreSQL
+POSTGRESQL_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE INDEX customers_first_name_trgm
+    ON customers USING gin (UPPER(first_name::text) gin_trgm_ops)
+    """,
+    """
+    CREATE INDEX customers_last_name_trgm
+    ON customers USING gin (UPPER(last_name::text) gin_trgm_ops)
+    """,
+]
+
+POSTGRESQL_REVERSE = [
+    "DROP INDEX IF EXISTS customers_last_name_trgm",
+    "DROP INDEX IF EXISTS customers_first_name_trgm",
+]
+
+
+def run_statements(schema_editor, statements_by_vendor):
+    connection = schema_editor.connection
+
+    if connection.vendor == "sqlite":
+        # FTS5 with the trigram tokenizer was added in SQLite 3.34
+        if connection.Database.sqlite_version_info < (3, 34):
+            return
+
+    for statement in statements_by_vendor.get(connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    run_statements(
+        schema_editor,
+        {"sqlite": SQLITE_FORWARD, "postgresql": POSTGRESQL_FORWARD},
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    run_statements(
+        schema_editor,
+        {"sqlite": SQLITE_REVERSE, "postgresql": POSTGRESQL_REVERSE},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_tablestatistics"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
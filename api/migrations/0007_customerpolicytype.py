@@ -0,0 +1,61 @@
+# Generated by Django 5.0.3 on 2026-10-17 09:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_customer_policy_types(apps, schema_editor):
+    Policy = apps.get_model("api", "Policy")
+    CustomerPolicyType = apps.get_model("api", "CustomerPolicyType")
+
+    CustomerPolicyType.objects.bulk_create(
+        (
+            CustomerPolicyType(customer_id=customer_id, type=type)
+            for customer_id, type in Policy.objects.values_list(
+                "customer_id", "type"
+            ).distinct()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_customer_name_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CustomerPolicyType",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("personal-accident", "Personal Accident"),
+                            ("homeowner-insurance", "Homeowner Insurance"),
+                            ("auto", "Auto Insurance"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="api.customer"
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "customer_policy_types",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("type", "customer"), name="unique_customer_policy_type"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_customer_policy_types, migrations.RunPython.noop),
+    ]
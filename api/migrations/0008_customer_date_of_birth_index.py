@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_customerpolicytype"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(fields=["date_of_birth"], name="customers_dob_idx"),
+        ),
+    ]
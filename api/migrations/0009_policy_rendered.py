@@ -0,0 +1,87 @@
+# Generated by Django 5.0.3 on 2026-10-17 11:00
+
+import decimal
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+
+
+def as_stored_decimal(field, value):
+    return field.to_python(value).quantize(
+        decimal.Decimal(1).scaleb(-field.decimal_places), context=field.context
+    )
+
+
+def serialize_customer(customer):
+    return {
+        "id": customer.id,
+        "first_name": customer.first_name,
+        "last_name": customer.last_name,
+        "dob": customer.date_of_birth.strftime("%d-%m-%Y"),
+    }
+
+
+def render_policy(policy):
+    """A copy of :meth:`api.models.Policy.render` as of this migration"""
+
+    quote = policy.quote
+
+    return json.dumps(
+        {
+            "id": policy.id,
+            "type": policy.type,
+            "state": policy.state,
+            "premium": as_stored_decimal(
+                policy._meta.get_field("premium"), policy.premium
+            ),
+            "cover": as_stored_decimal(policy._meta.get_field("cover"), policy.cover),
+            "customer": serialize_customer(policy.customer),
+            "quote": {
+                "id": quote.id,
+                "status": quote.status,
+                "type": quote.type,
+                "premium": as_stored_decimal(
+                    quote._meta.get_field("premium"), quote.premium
+                ),
+                "cover": as_stored_decimal(quote._meta.get_field("cover"), quote.cover),
+                "customer": serialize_customer(quote.customer),
+            },
+        },
+        cls=DjangoJSONEncoder,
+    ).encode()
+
+
+def render_policies(apps, schema_editor):
+    Policy = apps.get_model("api", "Policy")
+
+    policies = Policy.objects.select_related(
+        "customer", "quote", "quote__customer"
+    ).order_by("id")
+    batch = []
+
+    for policy in policies.iterator(chunk_size=1000):
+        policy.rendered = render_policy(policy)
+        batch.append(policy)
+
+        if len(batch) == 1000:
+            Policy.objects.bulk_update(batch, ["rendered"])
+            batch = []
+
+    Policy.objects.bulk_update(batch, ["rendered"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_customer_date_of_birth_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="policy",
+            name="rendered",
+            field=models.BinaryField(null=True),
+        ),
+        migrations.RunPython(render_policies, migrations.RunPython.noop),
+    ]
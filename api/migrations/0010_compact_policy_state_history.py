@@ -0,0 +1,209 @@
+# Generated by Django 5.0.3 on 2026-10-17 12:00
+
+import json
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+# The format of the entries, as :mod:`api.history` read and wrote it when this migration
+# was written. It is copied here so that later changes to that module do not change what
+# this migration does.
+
+COMPACT_FORMAT = "compact"
+
+KEYFRAME_INTERVAL = 16
+
+_MISSING = object()
+
+
+def is_delta(as_json):
+    return as_json.get("format") == COMPACT_FORMAT and "previous" in as_json
+
+
+def keyframe_snapshot(as_json):
+    return as_json["snapshot"] if as_json.get("format") == COMPACT_FORMAT else as_json
+
+
+def depth(as_json):
+    return as_json.get("depth", 0) if as_json.get("format") == COMPACT_FORMAT else 0
+
+
+def flatten(snapshot):
+    snapshot = dict(snapshot)
+
+    if isinstance(snapshot.get("quote"), dict):
+        quote = dict(snapshot["quote"])
+
+        if quote.get("customer", _MISSING) == snapshot.get("customer"):
+            del quote["customer"]
+
+        snapshot["quote"] = quote
+
+    flat = {}
+
+    def visit(value, path):
+        if isinstance(value, dict) and value:
+            for key, item in value.items():
+                visit(item, f"{path}.{key}")
+        else:
+            flat[path] = value
+
+    for key, value in snapshot.items():
+        visit(value, key)
+
+    return flat
+
+
+def nest(flat):
+    snapshot = {}
+
+    for path, value in flat.items():
+        *parents, key = path.split(".")
+        node = snapshot
+
+        for parent in parents:
+            node = node.setdefault(parent, {})
+
+        node[key] = value
+
+    return snapshot
+
+
+def unflatten(flat):
+    snapshot = nest(flat)
+    quote = snapshot.get("quote")
+
+    if isinstance(quote, dict) and "customer" not in quote and "customer" in snapshot:
+        quote["customer"] = json.loads(json.dumps(snapshot["customer"]))
+
+    return snapshot
+
+
+def _same(a, b):
+    return type(a) is type(b) and a == b
+
+
+def compact(snapshot, previous_flat=None, previous_depth=0, previous_id=None):
+    flat = flatten(snapshot)
+
+    if previous_flat is None or previous_depth + 1 >= KEYFRAME_INTERVAL:
+        return {"format": COMPACT_FORMAT, "depth": 0, "snapshot": nest(flat)}
+
+    return {
+        "format": COMPACT_FORMAT,
+        "depth": previous_depth + 1,
+        "previous": previous_id,
+        "changes": {
+            path: value
+            for path, value in flat.items()
+            if not _same(previous_flat.get(path, _MISSING), value)
+        },
+        "removed": [path for path in previous_flat if path not in flat],
+    }
+
+
+def resolve(as_json_by_id, entry_ids):
+    flat_by_id = {}
+
+    for entry_id in entry_ids:
+        chain = []
+
+        while entry_id not in flat_by_id:
+            as_json = as_json_by_id[entry_id]
+
+            if not is_delta(as_json):
+                flat_by_id[entry_id] = flatten(keyframe_snapshot(as_json))
+                break
+
+            chain.append(entry_id)
+            entry_id = as_json["previous"]
+
+        for delta_id in reversed(chain):
+            delta = as_json_by_id[delta_id]
+            flat = dict(flat_by_id[delta["previous"]])
+
+            for path in delta["removed"]:
+                flat.pop(path, None)
+
+            flat.update(delta["changes"])
+            flat_by_id[delta_id] = flat
+
+    return flat_by_id
+
+
+def batches_of_policy_ids(PolicyStateHistory):
+    policy_ids = list(
+        PolicyStateHistory.objects.order_by("policy_id")
+        .values_list("policy_id", flat=True)
+        .distinct()
+    )
+
+    for start in range(0, len(policy_ids), BATCH_SIZE):
+        yield policy_ids[start : start + BATCH_SIZE]
+
+
+def compact_history(apps, schema_editor):
+    """Stores the entries as keyframes and deltas, a batch of policies at a time
+
+    Entries are compacted in order, each against the previous entry of its policy.
+    """
+
+    PolicyStateHistory = apps.get_model("api", "PolicyStateHistory")
+
+    for policy_ids in batches_of_policy_ids(PolicyStateHistory):
+        entries = list(
+            PolicyStateHistory.objects.filter(policy_id__in=policy_ids).order_by(
+                "policy_id", "id"
+            )
+        )
+        as_json_by_id = {entry.id: entry.as_json for entry in entries}
+        flat_by_id = resolve(as_json_by_id, as_json_by_id.keys())
+
+        previous = None
+
+        for entry in entries:
+            if previous is not None and previous.policy_id == entry.policy_id:
+                entry.as_json = compact(
+                    unflatten(flat_by_id[entry.id]),
+                    flat_by_id[previous.id],
+                    depth(previous.as_json),
+                    previous.id,
+                )
+            else:
+                entry.as_json = compact(unflatten(flat_by_id[entry.id]))
+
+            previous = entry
+
+        PolicyStateHistory.objects.bulk_update(
+            entries, ["as_json"], batch_size=BATCH_SIZE
+        )
+
+
+def expand_history(apps, schema_editor):
+    """Stores the full snapshot in every entry again"""
+
+    PolicyStateHistory = apps.get_model("api", "PolicyStateHistory")
+
+    for policy_ids in batches_of_policy_ids(PolicyStateHistory):
+        entries = list(PolicyStateHistory.objects.filter(policy_id__in=policy_ids))
+        as_json_by_id = {entry.id: entry.as_json for entry in entries}
+        flat_by_id = resolve(as_json_by_id, as_json_by_id.keys())
+
+        for entry in entries:
+            entry.as_json = unflatten(flat_by_id[entry.id])
+
+        PolicyStateHistory.objects.bulk_update(
+            entries, ["as_json"], batch_size=BATCH_SIZE
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_policy_rendered"),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_history, expand_history),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.3 on 2026-10-17 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_compact_policy_state_history"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PolicyStateHistoryArchive",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("first_id", models.BigIntegerField()),
+                ("last_id", models.BigIntegerField()),
+                ("data", models.BinaryField()),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "policy",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="api.policy"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "policy state history archive",
+                "db_table": "policy_state_history_archive",
+                "indexes": [
+                    models.Index(
+                        fields=["policy", "-last_id"], name="policy_history_archive_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.3 on 2026-10-17 14:00
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_policystatehistoryarchive"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PolicyEvent",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("destination", models.URLField(max_length=500)),
+                (
+                    "payload",
+                    models.JSONField(
+                        encoder=django.core.serializers.json.DjangoJSONEncoder
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("last_error", models.TextField(blank=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "policy_event_outbox",
+                "indexes": [
+                    models.Index(
+                        fields=["destination", "id"], name="policy_event_outbox_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_policyevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="policyevent",
+            name="failed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -6,8 +6,21 @@ different API versions.
 Therefore, if a model is changed in any API version, it will affect all others.
 """
 
+import datetime
+import decimal
+import json
+import zlib
+
+from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, RowNumber
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api import history
+from api.cache import invalidate_policies
 
 
 class Customer(models.Model):
@@ -21,10 +34,69 @@ class Customer(models.Model):
 
     class Meta:
         db_table = "customers"
+        indexes = [
+            # For the age range filters. See: :meth:`date_of_birth_lookups`
+            models.Index(fields=["date_of_birth"], name="customers_dob_idx"),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+    def save(self, *args, **kwargs):
+        """Save the current instance
+
+        If the customer already existed, the policies of the customer are rendered again
+        """
+
+        is_new_customer = self._state.adding
+
+        super().save(*args, **kwargs)
+
+        if not is_new_customer:
+            Policy.refresh_rendered(Policy.objects.filter(customer=self))
+
+    @staticmethod
+    def age_from_date_of_birth(date_of_birth, today=None) -> int:
+        """Returns the age in years of someone born on the given date
+
+        A year is counted as 365 days, which is the age quotes are priced with
+        """
+
+        if today is None:
+            today = datetime.date.today()
+
+        return (today - date_of_birth).days // 365
+
+    @staticmethod
+    def date_of_birth_lookups(min_age=None, max_age=None, today=None) -> dict:
+        """Converts an age range to lookups on the date of birth
+
+        The lookups select the same customers as filtering on
+        :meth:`age_from_date_of_birth` would, but as a range on the (indexed) date of birth.
+
+        :param min_age: The minimum age, inclusive
+        :param max_age: The maximum age, inclusive
+        """
+
+        if today is None:
+            today = datetime.date.today()
+
+        lookups = {}
+
+        # age >= min_age, when the customer is at least 365 * min_age days old
+        if min_age is not None:
+            lookups["date_of_birth__lte"] = today - datetime.timedelta(
+                days=365 * min_age
+            )
+
+        # age <= max_age, when the customer is less than 365 * (max_age + 1) days old
+        if max_age is not None:
+            lookups["date_of_birth__gt"] = today - datetime.timedelta(
+                days=365 * (max_age + 1)
+            )
+
+        return lookups
+
     def serialize(self):
         """Serializes the customer instance to dict
 
@@ -74,7 +146,8 @@ class Quote(models.Model):
         """Save the current instance
 
         If the current instance is new, a policy will be created for it.
-        Hence, for new quotes, this method behaves like an AFTER INSERT trigger
+        Hence, for new quotes, this method behaves like an AFTER INSERT trigger.
+        Otherwise, the policy of the quote is rendered again
         """
 
         is_new_quote = False
@@ -93,6 +166,8 @@ class Quote(models.Model):
                 cover=self.cover,
                 premium=self.premium,
             )
+        else:
+            Policy.refresh_rendered(Policy.objects.filter(quote=self))
 
     def serialize(self):
         """Serializes the quote instance to dict
@@ -135,18 +210,498 @@ class PolicyStateHistory(models.Model):
         db_table = "policy_state_history"
         verbose_name_plural = "policy state history"
 
+    @classmethod
+    def for_policies(cls, policies, first=False):
+        """Builds (without saving) the entries recording the current state of policies
+
+        Each entry only stores what changed since the previous entry of its policy.
+        See: :mod:`api.history`
+
+        :param policies: Policies fetched with :meth:`PolicyQuerySet.for_serialization`
+        :param first: Whether the policies have no entries yet (they are new), which saves
+            looking up their previous entries
+        """
+
+        previous = {} if first else cls.latest_snapshots(p.id for p in policies)
+        entries = []
+
+        for policy in policies:
+            previous_id, previous_depth, previous_flat = previous.get(
+                policy.id, (None, 0, None)
+            )
+            snapshot = history.to_json_value(policy.serialize())
+            entry = cls(
+                policy=policy,
+                state=policy.state,
+                as_json=history.compact(
+                    snapshot, previous_flat, previous_depth, previous_id
+                ),
+            )
+            entry._snapshot = snapshot
+            entries.append(entry)
+
+        return entries
+
+    @classmethod
+    def record(cls, entries, batch_size=500):
+        """Inserts state history entries, with the events notifying them (if any) in the same
+        transaction
+
+        See: :class:`PolicyEvent`
+        """
+
+        # Joins the caller's transaction, if any, without the round trips of a savepoint
+        with transaction.atomic(savepoint=False):
+            cls.objects.bulk_create(entries, batch_size=batch_size)
+            PolicyEvent.enqueue(entries)
+
+    @classmethod
+    def latest_snapshots(cls, policy_ids):
+        """Returns the newest entry of each policy as (id, depth, flattened snapshot), by policy id
+
+        The entries a delta is based on are at most :data:`api.history.KEYFRAME_INTERVAL`
+        entries older than it, so they are all fetched with a single query.
+        """
+
+        rows = (
+            cls.objects.filter(policy_id__in=list(policy_ids))
+            .annotate(
+                rank=models.Window(
+                    RowNumber(),
+                    partition_by=models.F("policy_id"),
+                    order_by=models.F("id").desc(),
+                )
+            )
+            .filter(rank__lte=history.KEYFRAME_INTERVAL)
+            .values_list("id", "policy_id", "as_json")
+        )
+
+        as_json_by_id = {}
+        latest_ids = {}
+
+        for entry_id, policy_id, as_json in rows:
+            as_json_by_id[entry_id] = as_json
+            latest_ids[policy_id] = max(entry_id, latest_ids.get(policy_id, entry_id))
+
+        flat_by_id = cls._resolve(as_json_by_id, latest_ids.values())
+
+        return {
+            policy_id: (
+                entry_id,
+                history.depth(as_json_by_id[entry_id]),
+                flat_by_id[entry_id],
+            )
+            for policy_id, entry_id in latest_ids.items()
+        }
+
+    @classmethod
+    def load_snapshots(cls, entries):
+        """Reconstructs the snapshots of the given entries, fetching the entries they are based
+        on if they are not among them
+
+        See: :attr:`snapshot`
+        """
+
+        as_json_by_id = {entry.id: entry.as_json for entry in entries}
+        flat_by_id = cls._resolve(as_json_by_id, as_json_by_id.keys())
+
+        for entry in entries:
+            entry._snapshot = history.unflatten(flat_by_id[entry.id])
+
+    @classmethod
+    async def aload_snapshots(cls, entries):
+        """Async version of :meth:`load_snapshots`"""
+
+        as_json_by_id = {entry.id: entry.as_json for entry in entries}
+        entry_ids = list(as_json_by_id)
+
+        while missing := history.missing_bases(as_json_by_id):
+            async for entry_id, as_json in cls.objects.filter(
+                id__in=missing
+            ).values_list("id", "as_json"):
+                as_json_by_id[entry_id] = as_json
+
+        flat_by_id = history.resolve(as_json_by_id, entry_ids)
+
+        for entry in entries:
+            entry._snapshot = history.unflatten(flat_by_id[entry.id])
+
+    @classmethod
+    def _resolve(cls, as_json_by_id, entry_ids):
+        while missing := history.missing_bases(as_json_by_id):
+            as_json_by_id.update(
+                cls.objects.filter(id__in=missing).values_list("id", "as_json")
+            )
+
+        return history.resolve(as_json_by_id, list(entry_ids))
+
+    @property
+    def snapshot(self):
+        """The policy (serialized) as it was when this entry was recorded"""
+
+        if not hasattr(self, "_snapshot"):
+            self.load_snapshots([self])
+
+        return self._snapshot
+
+    @classmethod
+    def changes_after(cls, after, limit):
+        """Returns the entries recorded after an entry, oldest first, as a feed of state changes
+
+        The ids only ever increase, so this is a range scan of the primary key.
+
+        :param after: The id of the last entry already read, or 0
+        :param limit: The maximum number of entries to return
+        :returns: Dicts of the id, policy id, state and creation time of the entries
+        """
+
+        fields = ("id", "policy_id", "state", "created")
+
+        return [
+            dict(zip(fields, row))
+            for row in cls.objects.filter(id__gt=after)
+            .order_by("id")
+            .values_list(*fields)[:limit]
+        ]
+
+    @classmethod
+    async def achanges_after(cls, after, limit):
+        """Async version of :meth:`changes_after`"""
+
+        fields = ("id", "policy_id", "state", "created")
+
+        return [
+            dict(zip(fields, row))
+            async for row in cls.objects.filter(id__gt=after)
+            .order_by("id")
+            .values_list(*fields)[:limit]
+        ]
+
     def serialize(self):
         """Serialize the policy history as a dict"""
 
         return {
             "id": self.id,
             "state": self.state,
-            "object_json_dump": self.as_json,
+            "object_json_dump": self.snapshot,
             "policy": self.policy.serialize(),
             "created": self.created,
         }
 
 
+class PolicyStateHistoryArchive(models.Model):
+    """Old state history entries of a policy, moved out of :class:`PolicyStateHistory`
+
+    The history of a policy is only ever read from its newest entries, so the old ones are
+    moved here, compressed, to keep the ``policy_state_history`` table small.
+    Each row holds the entries of a policy that were archived together, with their full
+    snapshots, so that they can be read without the entries they were based on.
+    See: the ``archive_policy_history`` management command
+    """
+
+    id = models.BigAutoField(primary_key=True)
+
+    policy = models.ForeignKey("Policy", on_delete=models.CASCADE)
+
+    # The range of the ids of the archived entries
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+
+    # The entries, as zlib-compressed JSON. See: :meth:`archive`
+    data = models.BinaryField()
+
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "policy_state_history_archive"
+        verbose_name_plural = "policy state history archive"
+        indexes = [
+            models.Index(
+                fields=["policy", "-last_id"], name="policy_history_archive_idx"
+            )
+        ]
+
+    @classmethod
+    def archive(cls, policy_id, entries):
+        """Builds (without saving) the archive of state history entries of a policy
+
+        :param entries: The entries, ordered by id, with their snapshots loaded.
+            See: :meth:`PolicyStateHistory.load_snapshots`
+        """
+
+        data = [
+            {
+                "id": entry.id,
+                "state": entry.state,
+                "snapshot": entry.snapshot,
+                "created": entry.created.isoformat(),
+            }
+            for entry in entries
+        ]
+
+        return cls(
+            policy_id=policy_id,
+            first_id=entries[0].id,
+            last_id=entries[-1].id,
+            data=zlib.compress(json.dumps(data, cls=DjangoJSONEncoder).encode()),
+        )
+
+    @classmethod
+    @transaction.atomic
+    def archive_older_than(cls, policy_ids, cutoff):
+        """Moves the state history entries of policies that were recorded before a date here
+
+        The newer entries that were stored as deltas of archived ones are stored as keyframes
+        instead, so that the entries left behind can be read on their own.
+
+        :param policy_ids: The ids of the policies, which are locked until this is done
+        :param cutoff: The entries recorded before this datetime are archived
+        :returns: The number of entries archived
+        """
+
+        # A transition of a policy reads its newest entries after updating it, so it waits
+        # for the archived entries to be gone
+        list(Policy.objects.select_for_update().filter(id__in=policy_ids).values("id"))
+
+        entries = list(
+            PolicyStateHistory.objects.filter(policy_id__in=policy_ids).order_by("id")
+        )
+        PolicyStateHistory.load_snapshots(entries)
+
+        old_entries = {}
+        archived_ids = set()
+        rebased = []
+
+        for entry in entries:
+            if entry.created < cutoff:
+                old_entries.setdefault(entry.policy_id, []).append(entry)
+                archived_ids.add(entry.id)
+            elif (
+                history.is_delta(entry.as_json)
+                and entry.as_json["previous"] in archived_ids
+            ):
+                entry.as_json = history.compact(entry.snapshot)
+                rebased.append(entry)
+
+        cls.objects.bulk_create(
+            [
+                cls.archive(policy_id, policy_entries)
+                for policy_id, policy_entries in old_entries.items()
+            ]
+        )
+        PolicyStateHistory.objects.filter(
+            policy_id__in=policy_ids, created__lt=cutoff
+        ).delete()
+        PolicyStateHistory.objects.bulk_update(rebased, ["as_json"], batch_size=500)
+
+        return len(archived_ids)
+
+    @classmethod
+    def entries_for(cls, policy, before_id=None, limit=None):
+        """Returns the archived state history entries of a policy, newest first
+
+        The entries are not saved, but they serialize as they did before being archived.
+
+        :param before_id: Only return the entries with this id or an older one
+        :param limit: The maximum number of entries to return
+        """
+
+        archives = cls.objects.filter(policy=policy).order_by("-last_id")
+
+        if before_id is not None:
+            archives = archives.filter(first_id__lte=before_id)
+
+        entries = []
+
+        for archive in archives:
+            for data in reversed(json.loads(zlib.decompress(archive.data))):
+                if before_id is not None and data["id"] > before_id:
+                    continue
+
+                entry = PolicyStateHistory(
+                    id=data["id"],
+                    policy=policy,
+                    state=data["state"],
+                    created=datetime.datetime.fromisoformat(data["created"]),
+                )
+                entry._snapshot = data["snapshot"]
+                entries.append(entry)
+
+                if len(entries) == limit:
+                    return entries
+
+        return entries
+
+
+class PolicyEvent(models.Model):
+    """An outbox of the policy state changes to notify the webhooks in
+    ``settings.POLICY_EVENT_WEBHOOKS`` of
+
+    The events are inserted in the same transaction as the state history entries they notify
+    (see: :meth:`PolicyStateHistory.record`), so that none is lost or sent for a change that
+    was rolled back, and the requests do not wait for the webhooks.
+    They are delivered, then deleted, by the ``deliver_policy_events`` management command.
+    The events that keep failing are kept as dead letters, with ``failed_at`` set, and are
+    no longer delivered.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+
+    # The URL of the webhook
+    destination = models.URLField(max_length=500)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+
+    # The number of failed deliveries, and when to try again
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    # When the event was given up on, after too many failed deliveries
+    failed_at = models.DateTimeField(null=True, blank=True)
+
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "policy_event_outbox"
+        indexes = [
+            # The events of a destination are delivered in order of id
+            models.Index(fields=["destination", "id"], name="policy_event_outbox_idx")
+        ]
+
+    @classmethod
+    def enqueue(cls, entries):
+        """Inserts the events notifying state history entries, for every webhook, in a
+        single INSERT
+
+        :param entries: Saved entries, built by :meth:`PolicyStateHistory.for_policies`
+        """
+
+        destinations = settings.POLICY_EVENT_WEBHOOKS
+
+        if not destinations:
+            return
+
+        cls.objects.bulk_create(
+            [
+                cls(destination=destination, payload=cls.payload_for(entry))
+                for entry in entries
+                for destination in destinations
+            ],
+            batch_size=500,
+        )
+
+    @staticmethod
+    def payload_for(entry):
+        return {
+            "id": entry.id,
+            "type": "policy.state_changed",
+            "policy_id": entry.policy_id,
+            "state": entry.state,
+            "policy": entry.snapshot,
+            "created": entry.created,
+        }
+
+
+class PolicyQuerySet(models.QuerySet):
+    def for_serialization(self):
+        """Joins the relations read by :meth:`Policy.serialize`
+
+        The customer of each quote is not joined because it is the policy's customer.
+        Call :func:`share_customers` on the fetched policies to point the quotes at it.
+        """
+
+        return self.select_related("customer", "quote")
+
+    def with_latest_history_id(self):
+        """Annotates each policy with the id of its newest state history entry, archived or not"""
+
+        return self.annotate(
+            latest_history_id=Coalesce(
+                models.Subquery(
+                    PolicyStateHistory.objects.filter(policy=models.OuterRef("pk"))
+                    .order_by("-id")
+                    .values("id")[:1]
+                ),
+                models.Subquery(
+                    PolicyStateHistoryArchive.objects.filter(
+                        policy=models.OuterRef("pk")
+                    )
+                    .order_by("-last_id")
+                    .values("last_id")[:1]
+                ),
+            )
+        )
+
+    def with_archived_history(self):
+        """Annotates whether each policy has archived state history entries"""
+
+        return self.annotate(
+            has_archived_history=models.Exists(
+                PolicyStateHistoryArchive.objects.filter(policy=models.OuterRef("pk"))
+            )
+        )
+
+
+def share_customers(policies, identity_map=None):
+    """Makes the policies and their quotes share one customer instance per customer id
+
+    This is an identity map for customers, so that serializing a page of policies
+    does not lazily load ``quote.customer`` once per row.
+    A quote whose customer is not already in the map (which should not happen, since the
+    policy is issued to the customer of the quote) is resolved with a single extra query.
+
+    :param policies: Policies fetched with :meth:`PolicyQuerySet.for_serialization`
+    :param identity_map: A dict of customer id to customer, shared across calls in a request
+    :returns: The identity map
+    """
+
+    if identity_map is None:
+        identity_map = {}
+
+    for policy in policies:
+        identity_map.setdefault(policy.customer_id, policy.customer)
+
+    missing_ids = {
+        policy.quote.customer_id
+        for policy in policies
+        if policy.quote.customer_id not in identity_map
+    }
+
+    if missing_ids:
+        identity_map.update(Customer.objects.in_bulk(missing_ids))
+
+    for policy in policies:
+        policy.customer = identity_map[policy.customer_id]
+        policy.quote.customer = identity_map[policy.quote.customer_id]
+
+    return identity_map
+
+
+async def ashare_customers(policies, identity_map=None):
+    """Async version of :func:`share_customers`"""
+
+    if identity_map is None:
+        identity_map = {}
+
+    for policy in policies:
+        identity_map.setdefault(policy.customer_id, policy.customer)
+
+    missing_ids = {
+        policy.quote.customer_id
+        for policy in policies
+        if policy.quote.customer_id not in identity_map
+    }
+
+    if missing_ids:
+        identity_map.update(await Customer.objects.ain_bulk(missing_ids))
+
+    for policy in policies:
+        policy.customer = identity_map[policy.customer_id]
+        policy.quote.customer = identity_map[policy.quote.customer_id]
+
+    return identity_map
+
+
 class Policy(models.Model):
     class PolicyState(models.TextChoices):
         QUOTED = "quoted"
@@ -173,28 +728,115 @@ class Policy(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     quote = models.ForeignKey(Quote, on_delete=models.RESTRICT)
 
+    # The policy rendered as JSON (a read model), so that it can be served without
+    # loading and serializing the policy, its customer and its quote.
+    # It is refreshed whenever any of them is saved. See: :meth:`render`
+    rendered = models.BinaryField(null=True, editable=False)
+
     created = models.DateTimeField(auto_now_add=True)
     last_modified = models.DateTimeField(auto_now=True)
 
+    objects = PolicyQuerySet.as_manager()
+
     class Meta:
         db_table = "policies"
         verbose_name_plural = "policies"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        policy = super().from_db(db, field_names, values)
+
+        # The customer and type as loaded (unknown if deferred), so that :meth:`save` can
+        # tell whether they changed
+        loaded = dict(zip(field_names, values))
+        policy._loaded_membership = (loaded.get("customer_id"), loaded.get("type"))
+
+        return policy
+
     def save(self, *args, **kwargs):
         """Save the current instance
 
         This method inserts a new PolicyStateHistory every time it is called (by design).
-        As such, only call it when the state of the policy changed, such as is
-        done by :class:`api.v1.forms.QuoteUpdateForm`
+        As such, only call it when the state of the policy changed.
+        To change the state of many policies at once, see :meth:`save_state_changes`
         """
 
+        is_new_policy = self._state.adding
+
+        # A new policy has no id to render yet
+        if not is_new_policy:
+            self.rendered = self.render()
+
         super().save(*args, **kwargs)
 
-        PolicyStateHistory.objects.create(
-            policy=self,
-            state=self.state,
-            as_json=self.serialize(),
+        if is_new_policy:
+            self.rendered = self.render()
+            Policy.objects.filter(pk=self.pk).update(rendered=self.rendered)
+
+            CustomerPolicyType.add_for_policies([self])
+        else:
+            loaded_customer_id, loaded_type = getattr(
+                self, "_loaded_membership", (None, None)
+            )
+
+            # A policy moved to another customer leaves its previous customer too
+            if (self.customer_id, self.type) != (loaded_customer_id, loaded_type):
+                CustomerPolicyType.refresh_for_customers(
+                    {self.customer_id, loaded_customer_id} - {None}
+                )
+
+            invalidate_policies([self.id])
+
+        self._loaded_membership = (self.customer_id, self.type)
+
+        PolicyStateHistory.record(
+            PolicyStateHistory.for_policies([self], first=is_new_policy)
+        )
+
+    @classmethod
+    def save_state_changes(cls, policies, fields=("state",)):
+        """Saves the new state of the given policies, in bulk
+
+        This does what :meth:`save` does for a policy whose state changed, for all the
+        policies at once: they are updated with a single UPDATE, and their state history
+        entries are inserted with a single INSERT (after a single SELECT of the entries
+        they follow, see :meth:`PolicyStateHistory.for_policies`).
+
+        :param policies: Policies fetched with :meth:`PolicyQuerySet.for_serialization`,
+            with their new state assigned
+        :param fields: The fields that changed, such as the cover and premium when
+            policies are repriced
+        """
+
+        now = timezone.now()
+
+        for policy in policies:
+            policy.last_modified = now
+            policy.rendered = policy.render()
+
+        cls.objects.bulk_update(
+            policies, [*fields, "last_modified", "rendered"], batch_size=500
         )
+        PolicyStateHistory.record(PolicyStateHistory.for_policies(policies))
+
+        invalidate_policies(policy.id for policy in policies)
+
+    @classmethod
+    def refresh_rendered(cls, policies):
+        """Renders the given policies again, such as after their customer or quote changed
+
+        :param policies: A queryset of policies
+        """
+
+        policies = list(policies.for_serialization())
+        share_customers(policies)
+
+        for policy in policies:
+            policy.rendered = policy.render()
+
+        cls.objects.bulk_update(policies, ["rendered"], batch_size=500)
+
+        invalidate_policies(policy.id for policy in policies)
 
     def serialize(self):
         return {
@@ -206,3 +848,150 @@ class Policy(models.Model):
             "customer": self.customer.serialize(),
             "quote": self.quote.serialize(),
         }
+
+    def render(self) -> bytes:
+        """Renders the policy as JSON, byte for byte as the policy endpoints respond with it
+
+        The cover and premium are rendered as they are read back from the database, even if
+        a number of another type (such as a float) was just assigned to them.
+        """
+
+        payload = self.serialize()
+
+        for data, instance in ((payload, self), (payload["quote"], self.quote)):
+            for name in ("premium", "cover"):
+                data[name] = _as_stored_decimal(
+                    instance._meta.get_field(name), data[name]
+                )
+
+        return json.dumps(payload, cls=DjangoJSONEncoder).encode()
+
+
+def _as_stored_decimal(field, value):
+    """Converts a number to the Decimal a DecimalField would read back from the database"""
+
+    if value is None:
+        return None
+
+    return field.to_python(value).quantize(
+        decimal.Decimal(1).scaleb(-field.decimal_places), context=field.context
+    )
+
+
+class CustomerPolicyType(models.Model):
+    """This class represents the set of policy types each customer has at least one policy of
+
+    It is a summary of the policies table, maintained whenever a policy is created, saved or
+    deleted (simulating triggers), so that customers can be filtered by policy type with an
+    indexed lookup, instead of joining their policies and removing the duplicates.
+    See: :meth:`Policy.save`
+    """
+
+    id = models.BigAutoField(primary_key=True)
+
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    type = models.CharField(max_length=20, choices=Quote.QuoteType)
+
+    class Meta:
+        db_table = "customer_policy_types"
+        constraints = [
+            # Also serves as the index for looking up the customers by type
+            models.UniqueConstraint(
+                fields=["type", "customer"], name="unique_customer_policy_type"
+            ),
+        ]
+
+    @classmethod
+    def add_for_policies(cls, policies):
+        """Records the types of the given policies for their customers, in a single INSERT
+
+        Types already recorded for a customer are ignored.
+        """
+
+        memberships = {(policy.customer_id, policy.type) for policy in policies}
+
+        cls.objects.bulk_create(
+            [
+                cls(customer_id=customer_id, type=type)
+                for customer_id, type in memberships
+            ],
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def refresh_for_customers(cls, customer_ids):
+        """Recomputes the policy types of the given customers from their policies"""
+
+        with transaction.atomic():
+            cls.objects.filter(customer__id__in=customer_ids).delete()
+            cls.objects.bulk_create(
+                [
+                    cls(customer_id=customer_id, type=type)
+                    for customer_id, type in Policy.objects.filter(
+                        customer__id__in=customer_ids
+                    )
+                    .values_list("customer_id", "type")
+                    .distinct()
+                ]
+            )
+
+    @classmethod
+    def customer_ids(cls, type):
+        """Returns a queryset of the ids of the customers with policies of the given type"""
+
+        return cls.objects.filter(type=type).values("customer_id")
+
+
+@receiver(post_delete, sender=Policy)
+def remove_customer_policy_type(sender, instance, origin=None, **kwargs):
+    """Keeps :class:`CustomerPolicyType` and the cache in sync when policies are deleted
+
+    When the policies are deleted with their customer, the policy types of the customer are
+    deleted with it too, so they are not recomputed for each policy.
+    """
+
+    deleting_customer = isinstance(origin, Customer) or (
+        isinstance(origin, models.QuerySet) and origin.model is Customer
+    )
+
+    if not deleting_customer:
+        CustomerPolicyType.refresh_for_customers([instance.customer_id])
+
+    invalidate_policies([instance.id])
+
+
+class TableStatistics(models.Model):
+    """Statistics about a table that are too expensive to compute on every request
+
+    The rows are refreshed out of band, by the ``refresh_table_statistics`` management
+    command, so they are estimates that may lag behind the table.
+    """
+
+    table = models.CharField(max_length=100, primary_key=True)
+    row_count = models.BigIntegerField()
+
+    refreshed = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "table_statistics"
+        verbose_name_plural = "table statistics"
+
+    @classmethod
+    def estimated_row_count(cls, model):
+        """Returns the last counted number of rows of a model's table, or None if never counted"""
+
+        return (
+            cls.objects.filter(table=model._meta.db_table)
+            .values_list("row_count", flat=True)
+            .first()
+        )
+
+    @classmethod
+    async def aestimated_row_count(cls, model):
+        """Async version of :meth:`estimated_row_count`"""
+
+        return (
+            await cls.objects.filter(table=model._meta.db_table)
+            .values_list("row_count", flat=True)
+            .afirst()
+        )
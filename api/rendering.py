@@ -0,0 +1,234 @@
+"""Rendering of API payloads as JSON
+
+``JsonResponse`` encodes with :class:`django.core.serializers.json.DjangoJSONEncoder`, which
+handles the Decimals (covers and premiums) and dates of the payloads in its ``default``
+hook: the C encoder of the json module calls back into Python for every such value, and
+the hook tries each type in turn. On a page of 100 policies, that is hundreds of calls.
+
+The encoders here build the payloads of the models with JSON types only, formatting each
+Decimal and date with code specialized for its field, so :func:`dumps` encodes them without
+a fallback. The output is byte for byte what ``JsonResponse`` would respond with for
+``serialize()``.
+
+List endpoints can skip the model instances altogether: they fetch the columns of
+:data:`CUSTOMER_COLUMNS` or :data:`POLICY_COLUMNS` with ``values_list()``, and encode the
+tuples with :func:`encode_customer_row` or :func:`encode_policy_row`, into the same payloads.
+
+If ``settings.API_FAST_JSON`` is set and `orjson <https://github.com/ijl/orjson>`_ is
+installed, it is used instead of the json module. Its output is the same JSON, but compact
+(no spaces after separators) and in UTF-8 rather than ASCII with escapes, so it is not
+byte for byte the same, and it is off by default.
+"""
+
+import json
+
+from django.conf import settings
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+_encode = json.JSONEncoder().encode
+
+
+def use_orjson() -> bool:
+    return orjson is not None and getattr(settings, "API_FAST_JSON", False)
+
+
+def dumps(payload) -> bytes:
+    """Encodes a payload made of JSON types only, such as those of the encoders below"""
+
+    if use_orjson():
+        return orjson.dumps(payload)
+
+    return _encode(payload).encode()
+
+
+def json_response(payload, status=200) -> HttpResponse:
+    """The same as ``JsonResponse(payload, status=status)``, for payloads of JSON types only"""
+
+    return HttpResponse(dumps(payload), content_type="application/json", status=status)
+
+
+def format_date(value) -> str:
+    """Formats a date as DD-MM-YYYY, the same as ``value.strftime("%d-%m-%Y")``"""
+
+    # strftime does not zero pad years before 1000 on every platform, so those go through it
+    if value.year < 1000:
+        return value.strftime("%d-%m-%Y")
+
+    return f"{value.day:02d}-{value.month:02d}-{value.year}"
+
+
+def format_datetime(value) -> str:
+    """Formats a datetime as :class:`DjangoJSONEncoder` does (ECMA-262, in milliseconds)"""
+
+    text = value.isoformat()
+
+    if value.microsecond:
+        text = text[:23] + text[26:]
+
+    if text.endswith("+00:00"):
+        text = text[:-6] + "Z"
+
+    return text
+
+
+def format_decimal(value) -> str:
+    """Formats a Decimal as :class:`DjangoJSONEncoder` does"""
+
+    return str(value)
+
+
+def encode_customer(customer) -> dict:
+    """See: :meth:`api.models.Customer.serialize`"""
+
+    return {
+        "id": customer.id,
+        "first_name": customer.first_name,
+        "last_name": customer.last_name,
+        "dob": format_date(customer.date_of_birth),
+    }
+
+
+def encode_quote(quote, customer=None) -> dict:
+    """See: :meth:`api.models.Quote.serialize`
+
+    :param customer: The encoded customer of the quote, if already encoded
+    """
+
+    return {
+        "id": quote.id,
+        "status": quote.status,
+        "type": quote.type,
+        "premium": format_decimal(quote.premium),
+        "cover": format_decimal(quote.cover),
+        "customer": customer or encode_customer(quote.customer),
+    }
+
+
+def encode_policy(policy) -> dict:
+    """See: :meth:`api.models.Policy.serialize`"""
+
+    customer = encode_customer(policy.customer)
+
+    return {
+        "id": policy.id,
+        "type": policy.type,
+        "state": policy.state,
+        "premium": format_decimal(policy.premium),
+        "cover": format_decimal(policy.cover),
+        "customer": customer,
+        "quote": encode_quote(
+            policy.quote,
+            # Shared, as it is the same customer. See: :func:`api.models.share_customers`
+            customer if policy.quote.customer is policy.customer else None,
+        ),
+    }
+
+
+def encode_history(entries, encoded_policy, encode_snapshot=None) -> list[dict]:
+    """Encodes state history entries of a policy. See: :meth:`api.models.PolicyStateHistory.serialize`
+
+    :param encoded_policy: The encoded policy, which is the same for every entry, such as
+        from :func:`encode_policy`
+    :param encode_snapshot: Encodes the snapshot of an entry, such as to prune it. By
+        default, snapshots are returned as stored
+    """
+
+    return [
+        {
+            "id": entry.id,
+            "state": entry.state,
+            # Snapshots are stored as JSON values already
+            "object_json_dump": (
+                encode_snapshot(entry.snapshot) if encode_snapshot else entry.snapshot
+            ),
+            "policy": encoded_policy,
+            "created": format_datetime(entry.created),
+        }
+        for entry in entries
+    ]
+
+
+# The columns of a customer row, in order. See: :func:`encode_customer_row`
+CUSTOMER_COLUMNS = ("id", "first_name", "last_name", "date_of_birth")
+
+# The columns of a policy row, in order, with those of its customer and quote.
+# The quote's customer is the policy's customer, so only its id is fetched.
+# See: :func:`encode_policy_row`
+POLICY_COLUMNS = (
+    "id",
+    "type",
+    "state",
+    "premium",
+    "cover",
+    *(f"customer__{column}" for column in CUSTOMER_COLUMNS),
+    "quote__id",
+    "quote__status",
+    "quote__type",
+    "quote__premium",
+    "quote__cover",
+    "quote__customer_id",
+)
+
+
+def encode_customer_row(row) -> dict:
+    """Encodes a row of :data:`CUSTOMER_COLUMNS`, the same as :func:`encode_customer`"""
+
+    id, first_name, last_name, date_of_birth = row
+
+    return {
+        "id": id,
+        "first_name": first_name,
+        "last_name": last_name,
+        "dob": format_date(date_of_birth),
+    }
+
+
+def encode_policy_row(row, customers=None) -> dict:
+    """Encodes a row of :data:`POLICY_COLUMNS`, the same as :func:`encode_policy`
+
+    :param customers: The encoded customers of the quotes that are not the customer of
+        their policy (which should not happen), by id
+    """
+
+    (
+        id,
+        type,
+        state,
+        premium,
+        cover,
+        *customer_row,
+        quote_id,
+        quote_status,
+        quote_type,
+        quote_premium,
+        quote_cover,
+        quote_customer_id,
+    ) = row
+
+    customer = encode_customer_row(customer_row)
+    quote_customer = customer
+
+    if quote_customer_id != customer["id"]:
+        quote_customer = customers[quote_customer_id]
+
+    return {
+        "id": id,
+        "type": type,
+        "state": state,
+        "premium": format_decimal(premium),
+        "cover": format_decimal(cover),
+        "customer": customer,
+        "quote": {
+            "id": quote_id,
+            "status": quote_status,
+            "type": quote_type,
+            "premium": format_decimal(quote_premium),
+            "cover": format_decimal(quote_cover),
+            "customer": quote_customer,
+        },
+    }
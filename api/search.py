@@ -0,0 +1,70 @@
+"""Substring search on customer names
+
+`icontains` filters compile to ``LIKE '%...%'``, which cannot use a B-tree index, so every
+search scans the whole customers table. Where the database supports it, the names are also
+kept in a trigram index (see migration ``0006_customer_name_search_index``):
+
+- SQLite (3.34+): an FTS5 table with the trigram tokenizer, external to `customers` and kept
+  in sync with it by triggers, so every write (including bulk inserts and raw SQL) updates it.
+- PostgreSQL: pg_trgm GIN indexes on the upper-cased names, which Django's `icontains`
+  lookups use as they are.
+
+Other databases fall back to plain `icontains`.
+
+Note that SQLite drops the triggers of a table along with it, and Django remakes tables for
+most schema changes on SQLite. A migration that remakes the customers table must create the
+triggers again.
+"""
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "customers_name_fts"
+
+# Columns of the customers table that are indexed
+INDEXED_FIELDS = ("first_name", "last_name")
+
+# A trigram index can only be used to match at least 3 characters
+MIN_INDEXED_QUERY_LENGTH = 3
+
+# FTS5 with the trigram tokenizer was added in SQLite 3.34
+MIN_SQLITE_VERSION = (3, 34)
+
+
+def has_fts_index(connection) -> bool:
+    """Returns whether the database has the FTS5 trigram index of customer names"""
+
+    if connection.vendor != "sqlite":
+        return False
+
+    return connection.Database.sqlite_version_info >= MIN_SQLITE_VERSION
+
+
+def filter_name_contains(customers, field: str, value: str):
+    """Filters customers by a case-insensitive substring of one of their names
+
+    This is equivalent to ``customers.filter(**{f"{field}__icontains": value})``, but uses
+    the trigram index if there is one.
+
+    :param customers: A queryset of :class:`api.models.Customer`
+    :param field: One of :data:`INDEXED_FIELDS`
+    :param value: The substring to search for
+    """
+
+    if field not in INDEXED_FIELDS:
+        raise ValueError(f"{field} is not indexed for search")
+
+    connection = connections[customers.db]
+
+    if len(value) < MIN_INDEXED_QUERY_LENGTH or not has_fts_index(connection):
+        return customers.filter(**{f"{field}__icontains": value})
+
+    # A phrase in a trigram index matches any row with the phrase as a substring
+    phrase = '"{}"'.format(value.replace('"', '""'))
+
+    return customers.filter(
+        id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            (f"{field} : {phrase}",),
+        )
+    )
@@ -0,0 +1,319 @@
+"""Async versions of the read endpoints and of the quote write paths
+
+Each view subclasses its sync counterpart in :mod:`api.v1.views`, sharing its parsing and
+rendering, and only does its I/O with Django's async ORM and cache APIs. They are routed
+instead of the sync views with ``settings.API_ASYNC_VIEWS`` (see :mod:`api.v1.urls`), and
+only pay off when the project is served with ASGI.
+
+Note that Django's async ORM (as of 5.x) still runs each query in a thread, as the database
+drivers are sync, so the views save the threads of a worker while they wait, not the queries.
+Writes are done in a single ``sync_to_async`` call, so that they keep their transaction.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.http import JsonResponse
+
+from api import cache as policy_cache
+from api import rendering
+from api.history import KEYFRAME_INTERVAL
+from api.models import (
+    Customer,
+    Policy,
+    PolicyStateHistory,
+    PolicyStateHistoryArchive,
+    Quote,
+    TableStatistics,
+    ashare_customers,
+)
+from api.v1 import schemas, services, views
+from api.v1.fieldsets import PolicyFieldset
+from api.v1.forms import create_quote, update_quote_status
+
+
+class CustomerView(views.CustomerView):
+    async def get(self, *args, **kwargs):
+        """See: :meth:`api.v1.views.CustomerView.get`"""
+
+        try:
+            customers, filters, per_page, after, by_cursor = self.parse_query()
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
+
+        if by_cursor:
+            return await self.get_keyset_page(customers, filters, after, per_page)
+
+        paginator = self.get_paginator(
+            customers,
+            per_page,
+            orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty(),
+        )
+        # Paginator.count is a cached property, so the count is done here instead
+        paginator.count = await customers.acount()
+
+        page_number = (
+            self.kwargs.get(self.page_kwarg)
+            or self.request.GET.get(self.page_kwarg)
+            or 1
+        )
+
+        try:
+            page_number = (
+                paginator.num_pages if page_number == "last" else int(page_number)
+            )
+            page = paginator.page(page_number)
+        except (ValueError, InvalidPage):
+            return JsonResponse(
+                {"detail": "page must be a positive integer"}, status=422
+            )
+
+        object_list = [customer async for customer in page.object_list]
+
+        return self.render_offset_page(paginator, page, object_list)
+
+    async def get_keyset_page(
+        self, customers, filters: dict, after: int, per_page: int
+    ):
+        customers = [
+            customer
+            async for customer in customers.filter(id__gt=after)[: per_page + 1]
+        ]
+
+        estimated_total = None
+
+        if self.include_total(filters):
+            estimated_total = await TableStatistics.aestimated_row_count(Customer)
+
+        return self.render_keyset_page(customers, filters, per_page, estimated_total)
+
+
+class PolicyListView(views.PolicyListView):
+    http_method_names = ["get", "head", "options"]
+
+    async def get(self, *args, **kwargs):
+        """See: :meth:`api.v1.views.PolicyListView.get`"""
+
+        customer_id = self.request.GET.get("customer_id", 0)
+
+        if not customer_id:
+            return JsonResponse({"detail": "customer not found"}, status=404)
+
+        try:
+            fieldset = PolicyFieldset.from_query(self.request.GET)
+            policies = self.get_page_queryset(customer_id)
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
+
+        policies = policies[: self.per_page + 1]
+
+        if not fieldset.is_default:
+            return self.render_fieldset_page(await fieldset.afetch(policies), fieldset)
+
+        policies = [policy async for policy in policies.values_list("id", "rendered")]
+
+        unrendered = {
+            policy_id
+            for policy_id, rendered in policies[: self.per_page]
+            if rendered is None
+        }
+        rendered_policies = {}
+
+        if unrendered:
+            rendered_policies = await sync_to_async(self.render_policies)(unrendered)
+
+        return self.render_page(policies, rendered_policies)
+
+
+class AsyncPolicyConditionalGetMixin(views.PolicyConditionalGetMixin):
+    async def get_not_modified_response(self):
+        if not self.is_conditional():
+            return None
+
+        return self.get_conditional_response(
+            await self.get_validator_queryset().afirst()
+        )
+
+
+class PolicyDetailView(AsyncPolicyConditionalGetMixin, views.PolicyDetailView):
+    async def get(self, *args, **kwargs):
+        """See: :meth:`api.v1.views.PolicyDetailView.get`"""
+
+        try:
+            self.parse_fieldset()
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
+
+        not_modified_response = await self.get_not_modified_response()
+
+        if not_modified_response is not None:
+            return not_modified_response
+
+        if not self.fieldset.is_default:
+            return self.render_fieldset(
+                await self.fieldset.afetch(Policy.objects.filter(pk=self.kwargs["pk"]))
+            )
+
+        entry = await policy_cache.aget_or_build(self.kwargs["pk"], self.render_policy)
+
+        return self.render_entry(entry)
+
+    async def render_policy(self):
+        values = (
+            await Policy.objects.filter(pk=self.kwargs["pk"])
+            .values_list("rendered", *self.validator_fields)
+            .afirst()
+        )
+
+        if values is None:
+            return None
+
+        rendered, *validator_values = values
+
+        if rendered is None:
+            policy = await self.get_queryset().filter(pk=self.kwargs["pk"]).afirst()
+
+            if policy is None:
+                return None
+
+            await ashare_customers([policy])
+            rendered = policy.render()
+
+        return (bytes(rendered), *self.make_validators(validator_values))
+
+
+class PolicyHistoryView(AsyncPolicyConditionalGetMixin, views.PolicyHistoryView):
+    http_method_names = ["get", "head", "options"]
+
+    async def get(self, *args, **kwargs):
+        """See: :meth:`api.v1.views.PolicyHistoryView.get`"""
+
+        try:
+            self.parse_fieldset()
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
+
+        not_modified_response = await self.get_not_modified_response()
+
+        if not_modified_response is not None:
+            return not_modified_response
+
+        policy = await self.get_queryset().filter(pk=self.kwargs["pk"]).afirst()
+
+        if policy is None:
+            return JsonResponse({"detail": "policy not found"}, status=404)
+
+        try:
+            per_page, next_cursor = self.parse_page()
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
+
+        await self.fieldset.aprepare([policy])
+
+        entries = [
+            entry
+            async for entry in self.get_history_queryset(policy, next_cursor)[
+                : per_page + KEYFRAME_INTERVAL
+            ]
+        ]
+        await PolicyStateHistory.aload_snapshots(entries)
+
+        history = entries[: per_page + 1]
+
+        if len(history) <= per_page and policy.has_archived_history:
+            history += await sync_to_async(PolicyStateHistoryArchive.entries_for)(
+                policy,
+                before_id=next_cursor,
+                limit=per_page + 1 - len(history),
+            )
+
+        return self.render_page(policy, history, per_page)
+
+
+class QuoteView(views.QuoteView):
+    http_method_names = ["post", "put", "options"]
+
+    async def post(self, *args, **kwargs):
+        """See: :meth:`api.v1.views.QuoteView.post`"""
+
+        try:
+            request_json = json.loads(self.request.body)
+        except json.decoder.JSONDecodeError:
+            return JsonResponse({"detail": "request body is malformed"}, status=422)
+
+        if not isinstance(request_json, dict):
+            return JsonResponse(
+                {"detail": "request body must be an object"}, status=422
+            )
+
+        cleaned_data, errors = schemas.QUOTE_CREATION.validate(request_json)
+
+        if errors:
+            return JsonResponse({"detail": errors}, status=422)
+
+        try:
+            quote = await sync_to_async(create_quote)(
+                cleaned_data["customer_id"], cleaned_data["type"]
+            )
+        except Customer.DoesNotExist:
+            return JsonResponse({"detail": "customer not found"}, status=404)
+
+        return rendering.json_response(rendering.encode_quote(quote), status=201)
+
+    async def put(self, *args, **kwargs):
+        """See: :meth:`api.v1.views.QuoteView.put`"""
+
+        try:
+            request_body_as_dict = json.loads(self.request.body)
+        except json.decoder.JSONDecodeError:
+            return JsonResponse({"detail": "request body is malformed"}, status=422)
+
+        if not isinstance(request_body_as_dict, dict):
+            return JsonResponse(
+                {"detail": "request body must be an object"}, status=422
+            )
+
+        cleaned_data, errors = schemas.QUOTE_UPDATE.validate(request_body_as_dict)
+
+        if errors:
+            return JsonResponse({"detail": errors}, status=422)
+
+        try:
+            quote = await sync_to_async(update_quote_status)(
+                cleaned_data["quote_id"], cleaned_data["status"]
+            )
+        except Quote.DoesNotExist:
+            return JsonResponse({"detail": "quote not found"}, status=404)
+
+        return rendering.json_response(rendering.encode_quote(quote), status=200)
+
+
+class QuoteBatchView(views.QuoteBatchView):
+    async def post(self, *args, **kwargs):
+        """See: :meth:`api.v1.views.QuoteBatchView.post`"""
+
+        try:
+            items = self.parse_items()
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
+
+        results = await sync_to_async(services.bulk_create_quotes)(items)
+
+        return rendering.json_response({"results": results}, status=200)
+
+    async def put(self, *args, **kwargs):
+        """See: :meth:`api.v1.views.QuoteBatchView.put`"""
+
+        try:
+            items = self.parse_items()
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
+
+        try:
+            results = await sync_to_async(services.bulk_update_quote_statuses)(items)
+        except services.ConcurrentUpdateError as err:
+            return JsonResponse({"detail": str(err)}, status=409)
+
+        return rendering.json_response({"results": results}, status=200)
@@ -0,0 +1,269 @@
+"""Sparse fieldsets and expansion of policy payloads
+
+The policy endpoints take two optional query parameters, which shape each policy:
+
+- ``fields``: The fields of the policy to return, comma separated, out of
+  :data:`POLICY_FIELDS`. By default, all of them.
+- ``expand``: The relations to embed, comma separated, out of :data:`EXPANSIONS`. The
+  relations that are not expanded are returned as their id. By default, all of them, and
+  ``expand=`` (empty) expands none. ``quote.customer`` implies ``quote``.
+
+For example, ``?fields=id,state`` returns ``{"id": 1, "state": "quoted"}``, and
+``?expand=quote`` returns the customer of the policy and of its quote as their id.
+
+The relations that are neither requested nor expanded are not joined, and only the columns
+of the requested fields are fetched. Without either parameter, the payload is the stored one
+(see :meth:`api.models.Policy.render`).
+
+The snapshots of the state history (``object_json_dump``) are pruned the same way, with
+:meth:`PolicyFieldset.prune_snapshot`. They are still read in full from the database, as they
+are stored as deltas of one another (see: :mod:`api.history`).
+"""
+
+from api import rendering
+from api.models import ashare_customers, share_customers
+
+# The fields of a policy payload, in order. See: :meth:`api.models.Policy.serialize`
+POLICY_FIELDS = ("id", "type", "state", "premium", "cover", "customer", "quote")
+
+# The relations of a policy payload that can be embedded
+EXPANSIONS = ("customer", "quote", "quote.customer")
+
+# The columns of a customer and a quote that their payloads are made of
+CUSTOMER_COLUMNS = (*rendering.CUSTOMER_COLUMNS, "last_modified")
+QUOTE_COLUMNS = ("id", "status", "type", "premium", "cover", "last_modified")
+
+
+def parse_list(value: str, allowed, name: str) -> list:
+    """Parses a comma separated query parameter
+
+    :raises ValueError: If an item is not allowed
+    """
+
+    items = [item.strip() for item in value.split(",") if item.strip()]
+
+    for item in items:
+        if item not in allowed:
+            raise ValueError(f"{name} must be a list of: {', '.join(allowed)}")
+
+    return items
+
+
+class PolicyFieldset:
+    """The fields and expanded relations of the policies of a request
+
+    :param fields: Some of :data:`POLICY_FIELDS`
+    :param expand: Some of :data:`EXPANSIONS`
+    """
+
+    def __init__(self, fields=POLICY_FIELDS, expand=EXPANSIONS):
+        self.fields = tuple(field for field in POLICY_FIELDS if field in fields)
+
+        expand = set(expand)
+
+        if "quote.customer" in expand:
+            expand.add("quote")
+
+        # A relation is only expanded if it is returned
+        self.expand = frozenset(
+            expansion for expansion in expand if expansion.split(".")[0] in self.fields
+        )
+
+        self.is_default = self.fields == POLICY_FIELDS and self.expand == set(
+            EXPANSIONS
+        )
+
+        # The quote's customer is the policy's customer, so when both are expanded it is
+        # shared rather than joined twice. See: :func:`api.models.share_customers`
+        self.shares_customer = {"customer", "quote.customer"} <= self.expand
+        self.joins_quote_customer = (
+            "quote.customer" in self.expand and not self.shares_customer
+        )
+
+    @classmethod
+    def from_query(cls, query_params) -> "PolicyFieldset":
+        """Parses the ``fields`` and ``expand`` query parameters
+
+        :raises ValueError: If a parameter is invalid
+        """
+
+        fields = query_params.get("fields")
+        expand = query_params.get("expand")
+
+        if fields is None:
+            fields = POLICY_FIELDS
+        else:
+            fields = parse_list(fields, POLICY_FIELDS, "fields")
+
+            if not fields:
+                raise ValueError("fields must not be empty")
+
+        if expand is None:
+            expand = EXPANSIONS
+        else:
+            expand = parse_list(expand, EXPANSIONS, "expand")
+
+        return cls(fields, expand)
+
+    @property
+    def key(self) -> str:
+        """Identifies the fieldset, such as to make the ETag of a payload"""
+
+        return f"{','.join(self.fields)};{','.join(sorted(self.expand))}"
+
+    @property
+    def validator_fields(self) -> tuple:
+        """The lookups of the last modification times of the rows in the payload"""
+
+        fields = ["last_modified"]
+
+        if "customer" in self.expand:
+            fields.append("customer__last_modified")
+
+        if "quote" in self.expand:
+            fields.append("quote__last_modified")
+
+        if self.joins_quote_customer:
+            fields.append("quote__customer__last_modified")
+
+        return tuple(fields)
+
+    def apply(self, policies):
+        """Joins and fetches only what the payload is made of
+
+        :param policies: A queryset of policies
+        """
+
+        relations = []
+        columns = [field for field in self.fields if field not in ("customer", "quote")]
+        columns += ["id", "last_modified"]
+
+        if "customer" in self.fields:
+            if "customer" in self.expand:
+                relations.append("customer")
+                columns += [f"customer__{column}" for column in CUSTOMER_COLUMNS]
+            else:
+                columns.append("customer")
+
+        if "quote" in self.fields:
+            if "quote" in self.expand:
+                relations.append("quote")
+                columns += [f"quote__{column}" for column in QUOTE_COLUMNS]
+                columns.append("quote__customer")
+            else:
+                columns.append("quote")
+
+        if self.joins_quote_customer:
+            relations.append("quote__customer")
+            columns += [f"quote__customer__{column}" for column in CUSTOMER_COLUMNS]
+
+        # select_related() without relations would join them all
+        policies = policies.select_related(None)
+
+        if relations:
+            policies = policies.select_related(*relations)
+
+        return policies.only(*columns)
+
+    def fetch(self, policies) -> list:
+        """Fetches the policies, ready to encode with :meth:`encode`
+
+        :param policies: A queryset of policies
+        """
+
+        policies = list(self.apply(policies))
+        self.prepare(policies)
+
+        return policies
+
+    def prepare(self, policies):
+        """Prepares policies fetched with :meth:`apply` to encode with :meth:`encode`"""
+
+        if self.shares_customer:
+            share_customers(policies)
+
+    async def afetch(self, policies) -> list:
+        """Async version of :meth:`fetch`"""
+
+        policies = [policy async for policy in self.apply(policies)]
+        await self.aprepare(policies)
+
+        return policies
+
+    async def aprepare(self, policies):
+        """Async version of :meth:`prepare`"""
+
+        if self.shares_customer:
+            await ashare_customers(policies)
+
+    def encode(self, policy) -> dict:
+        """Encodes a policy fetched with :meth:`fetch`"""
+
+        if self.is_default:
+            return rendering.encode_policy(policy)
+
+        payload = {}
+
+        for field in self.fields:
+            if field == "customer":
+                payload["customer"] = (
+                    rendering.encode_customer(policy.customer)
+                    if "customer" in self.expand
+                    else policy.customer_id
+                )
+            elif field == "quote":
+                payload["quote"] = (
+                    self.encode_quote(policy.quote)
+                    if "quote" in self.expand
+                    else policy.quote_id
+                )
+            elif field in ("premium", "cover"):
+                payload[field] = rendering.format_decimal(getattr(policy, field))
+            else:
+                payload[field] = getattr(policy, field)
+
+        return payload
+
+    def encode_quote(self, quote) -> dict:
+        return {
+            "id": quote.id,
+            "status": quote.status,
+            "type": quote.type,
+            "premium": rendering.format_decimal(quote.premium),
+            "cover": rendering.format_decimal(quote.cover),
+            "customer": (
+                rendering.encode_customer(quote.customer)
+                if "quote.customer" in self.expand
+                else quote.customer_id
+            ),
+        }
+
+    def prune_snapshot(self, snapshot) -> dict:
+        """Prunes a snapshot of the state history to the fieldset, the same as :meth:`encode`
+
+        :param snapshot: What :meth:`api.models.Policy.serialize` returned, as a JSON value
+        """
+
+        if self.is_default:
+            return snapshot
+
+        payload = {}
+
+        for field in self.fields:
+            # Snapshots are stored as they were, so they may lack newer fields
+            if field not in snapshot:
+                continue
+
+            value = snapshot[field]
+
+            if field == "customer" and "customer" not in self.expand:
+                value = value["id"]
+            elif field == "quote":
+                if "quote" not in self.expand:
+                    value = value["id"]
+                elif "quote.customer" not in self.expand:
+                    value = {**value, "customer": value["customer"]["id"]}
+
+            payload[field] = value
+
+        return payload
@@ -10,8 +10,98 @@ appropriate HTTP status code
 import datetime
 
 from django import forms
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import Customer, Policy, Quote, share_customers
+from api.v1 import rating
+
+# Maps the new status of a quote to the status the quote must currently be in,
+# and the state its policy changes to when the transition is made
+QUOTE_STATUS_TRANSITIONS = {
+    Quote.QuoteStatus.ACCEPTED: (Quote.QuoteStatus.NEW, Policy.PolicyState.NEW),
+    Quote.QuoteStatus.ACTIVE: (Quote.QuoteStatus.ACCEPTED, Policy.PolicyState.BOUND),
+}
+
+
+def calculate_quote_price(
+    quote_type: str,
+    date_of_birth: datetime.date,
+    rate_table: rating.RateTable | None = None,
+):
+    """Calculates the cover and premium of a quote for a customer
+
+    See: :mod:`api.v1.rating`
+
+    :param quote_type: One of :class:`api.models.Quote.QuoteType`
+    :param date_of_birth: The date of birth of the customer
+    :param rate_table: The rate tables to price with, when pricing many quotes. By default,
+        the current ones. See: :func:`api.v1.rating.get_rate_table`
+    :returns: A tuple of (cover, premium), as decimals
+    """
+
+    if rate_table is None:
+        rate_table = rating.get_rate_table()
+
+    return rate_table.price(quote_type, Customer.age_from_date_of_birth(date_of_birth))
+
+
+def create_quote(customer_id: int, quote_type: str) -> Quote:
+    """Prices and creates a quote for a customer (and so its policy)
+
+    :raises Customer.DoesNotExist: If the customer with specified ID does not exist
+    """
+
+    customer = Customer.objects.get(id=customer_id)
+
+    cover, premium = calculate_quote_price(quote_type, customer.date_of_birth)
+
+    return Quote.objects.create(
+        customer=customer,
+        cover=cover,
+        premium=premium,
+        type=quote_type,
+    )
+
+
+def update_quote_status(quote_id: int, new_status: str) -> Quote:
+    """Updates the status of a quote, if it follows a transition
+
+    See: :meth:`QuoteUpdateForm.save`
+
+    :raises Quote.DoesNotExist: If the quote with specified ID is not found
+    """
+
+    transition = QUOTE_STATUS_TRANSITIONS.get(new_status)
+
+    with transaction.atomic():
+        # The status the quote must be in is part of the WHERE clause, so of two
+        # concurrent requests making the same transition, only one updates the row
+        if transition is not None:
+            from_status, policy_state = transition
+            now = timezone.now()
+
+            transitioned = Quote.objects.filter(id=quote_id, status=from_status).update(
+                status=new_status, last_modified=now
+            )
+        else:
+            transitioned = False
 
-from api.models import Customer, Policy, Quote
+        if transitioned:
+            policy = Policy.objects.for_serialization().get(quote__id=quote_id)
+            share_customers([policy])
+
+            policy.state = policy_state
+            Policy.save_state_changes([policy])
+
+            return policy.quote
+
+    try:
+        quote = Quote.objects.select_related("customer").get(id=quote_id)
+    except Quote.DoesNotExist as err:
+        raise err
+
+    return quote
 
 
 class CustomerCreationForm(forms.ModelForm):
@@ -30,10 +120,17 @@ class CustomerCreationForm(forms.ModelForm):
         # Do not include date_of_birth because the request will contain the field 'dob' instead
         fields = ("first_name", "last_name")
 
-    def save(self, *args, **kwargs) -> Customer:
+    def save(self, commit=True) -> Customer:
+        """Saves the customer and returns it
+
+        With ``commit=False`` the customer is returned unsaved, such as for bulk inserts
+        """
+
         self.instance = super().save(commit=False)
         self.instance.date_of_birth = self.cleaned_data["dob"]
-        self.instance.save()
+
+        if commit:
+            self.instance.save()
 
         return self.instance
 
@@ -53,41 +150,8 @@ class QuoteCreationForm(forms.ModelForm):
         :raises Customer.DoesNotExist: If the customer with specified ID does not exist
         """
 
-        try:
-            customer = Customer.objects.get(id=self.cleaned_data["customer_id"])
-        except Customer.DoesNotExist as err:
-            raise err
-
-        # The cover, premium rate and quote band below are based solely on assumption
-        if self.cleaned_data["type"] == Quote.QuoteType.PERSONAL_ACCIDENT:
-            cover = 20000
-            premium = 200
-        elif self.cleaned_data["type"] == Quote.QuoteType.AUTO_INSURANCE:
-            cover = 30000
-            premium = 300
-        elif self.cleaned_data["type"] == Quote.QuoteType.HOMEOWNER_INSURANCE:
-            cover = 40000
-            premium = 400
-        else:
-            cover = 50000
-            premium = 500
-
-        customer_age = (datetime.date.today() - customer.date_of_birth).days // 365
-
-        if customer_age < 25:
-            cover *= 1.2
-            premium *= 2
-        elif 25 <= customer_age < 50:
-            cover *= 1.1
-            premium *= 1.5
-        else:
-            cover *= 0.7
-
-        self.instance = Quote.objects.create(
-            customer=customer,
-            cover=cover,
-            premium=premium,
-            type=self.cleaned_data["type"],
+        self.instance = create_quote(
+            self.cleaned_data["customer_id"], self.cleaned_data["type"]
         )
 
         return self.instance
@@ -111,38 +175,14 @@ class QuoteUpdateForm(forms.ModelForm):
         When a transition is made, the corresponding policy for this quote will change state as shown below:
             - `QuoteStatus.NEW -> QuoteStatus.ACCEPTED = PolicyState.NEW`
             - `QuoteStatus.ACCEPTED -> QuoteStatus.ACTIVE = PolicyState.BOUND`
+        See: :data:`QUOTE_STATUS_TRANSITIONS`
+
+        The transition is made with a conditional UPDATE, in the same transaction as the
+        policy update and its state history entry, so it is safe under concurrent requests.
 
         :raises Quote.DoesNotExist: If the quote with specified ID is not found
         """
 
-        try:
-            quote = Quote.objects.get(id=self.cleaned_data["quote_id"])
-        except Quote.DoesNotExist as err:
-            raise err
-
-        current_status = quote.status
-        new_status = self.cleaned_data["status"]
-
-        if current_status == new_status:
-            return quote
-
-        policy = Policy.objects.get(quote__id=quote.id)
-
-        if (
-            current_status == Quote.QuoteStatus.NEW
-            and new_status == Quote.QuoteStatus.ACCEPTED
-        ):
-            policy.state = Policy.PolicyState.NEW
-        elif (
-            current_status == Quote.QuoteStatus.ACCEPTED
-            and new_status == Quote.QuoteStatus.ACTIVE
-        ):
-            policy.state = Policy.PolicyState.BOUND
-        else:
-            return quote
-
-        quote.status = self.cleaned_data["status"]
-        quote.save()
-        policy.save()
-
-        return quote
+        return update_quote_status(
+            self.cleaned_data["quote_id"], self.cleaned_data["status"]
+        )
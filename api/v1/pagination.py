@@ -0,0 +1,40 @@
+"""This module defines helpers for keyset (cursor) pagination.
+
+A cursor is opaque to clients. It holds the position to continue from, and the filters the
+first page was requested with, so that following pages cannot drift from the original query.
+"""
+
+import base64
+import binascii
+import json
+
+
+def encode_cursor(after: int, filters: dict) -> str:
+    """Encodes the position and filters of the next page as an opaque cursor"""
+
+    payload = json.dumps({"after": after, "filters": filters}, separators=(",", ":"))
+
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[int, dict]:
+    """Decodes a cursor created by :func:`encode_cursor`
+
+    :returns: A tuple of (position, filters)
+    :raises ValueError: If the cursor was not created by :func:`encode_cursor`
+    """
+
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        after = payload["after"]
+        filters = payload["filters"]
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError) as err:
+        raise ValueError("invalid cursor") from err
+
+    if not isinstance(after, int) or not isinstance(filters, dict):
+        raise ValueError("invalid cursor")
+
+    if not all(isinstance(value, str) for value in filters.values()):
+        raise ValueError("invalid cursor")
+
+    return after, filters
@@ -0,0 +1,240 @@
+"""Rating engine: prices quotes from rate tables
+
+The rate tables are a JSON file (``settings.QUOTE_RATES_FILE``), with the base cover and
+premium of each quote type, and the factors they are multiplied by for each age band::
+
+    {
+        "types": {"auto": {"cover": "30000", "premium": "300"}, ...},
+        "age_bands": [
+            {"below": 25, "cover": "1.2", "premium": "2"},
+            ...
+            {"below": null, "cover": "0.7", "premium": "1"}
+        ]
+    }
+
+The bands are in ascending order of age, and the last one is for all the older ages.
+Amounts and factors are strings, so that they are read as exact decimals.
+
+The tables are loaded once per process, and every price (by quote type and age) is computed
+upfront, so pricing a quote is a lookup. The file is checked for changes at most every
+:data:`RELOAD_INTERVAL` seconds, and loaded again if it changed, without restarting. That
+check is done by :func:`get_rate_table`, which is called once per request (or batch of
+quotes), rather than for every quote priced.
+"""
+
+import decimal
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+# How often to check whether the rate tables changed, in seconds
+RELOAD_INTERVAL = 1
+
+# Prices are rounded to cents, as they are stored
+CENT = decimal.Decimal("0.01")
+
+
+class RateTable:
+    """The prices of quotes, by quote type and age"""
+
+    def __init__(self, rates: dict, quote_types=None):
+        """
+        :param rates: The rate tables, as in the file
+        :param quote_types: The quote types the tables must price, no more and no fewer.
+            By default, those of :class:`api.models.Quote.QuoteType` (which needs Django to
+            be set up)
+        :raises ValueError: If they are invalid
+        """
+
+        if quote_types is None:
+            from api.models import Quote
+
+            quote_types = Quote.QuoteType.values
+
+        try:
+            types = {
+                quote_type: (
+                    decimal.Decimal(base["cover"]),
+                    decimal.Decimal(base["premium"]),
+                )
+                for quote_type, base in rates["types"].items()
+            }
+            bands = [
+                (
+                    band["below"],
+                    decimal.Decimal(band["cover"]),
+                    decimal.Decimal(band["premium"]),
+                )
+                for band in rates["age_bands"]
+            ]
+        except (KeyError, TypeError, decimal.InvalidOperation) as err:
+            raise ValueError(f"invalid rate tables: {err!r}") from err
+
+        if types.keys() != set(quote_types):
+            raise ValueError(
+                f"invalid rate tables: the quote types must be {sorted(quote_types)}"
+            )
+
+        limits = [below for below, _, _ in bands]
+
+        if not bands or limits[-1] is not None:
+            raise ValueError(
+                "invalid rate tables: the last age band must have no limit"
+            )
+
+        if not all(isinstance(below, int) and below > 0 for below in limits[:-1]):
+            raise ValueError(
+                "invalid rate tables: age limits must be positive integers"
+            )
+
+        if limits[:-1] != sorted(set(limits[:-1])):
+            raise ValueError(
+                "invalid rate tables: age bands must be in ascending order"
+            )
+
+        # The factors of every age up to the last band, which all the older ages are in
+        factors = []
+
+        for below, cover_factor, premium_factor in bands:
+            count = 1 if below is None else below - len(factors)
+            factors += [(cover_factor, premium_factor)] * count
+
+        self.prices = {
+            quote_type: tuple(
+                (
+                    (cover * cover_factor).quantize(CENT),
+                    (premium * premium_factor).quantize(CENT),
+                )
+                for cover_factor, premium_factor in factors
+            )
+            for quote_type, (cover, premium) in types.items()
+        }
+
+        # The prices in cents, as NumPy arrays. See: :meth:`price_many`
+        self._cents = None
+
+    @classmethod
+    def from_file(cls, path, quote_types=None):
+        with open(path, "rb") as file:
+            return cls(json.load(file), quote_types)
+
+    def price(self, quote_type: str, age: int):
+        """Returns the cover and premium of a quote, as decimals
+
+        :param quote_type: One of :class:`api.models.Quote.QuoteType`
+        :param age: The age of the customer. See: :meth:`api.models.Customer.age_from_date_of_birth`
+        :raises KeyError: If the quote type is unknown
+        """
+
+        prices = self.prices[quote_type]
+
+        return prices[min(max(age, 0), len(prices) - 1)]
+
+    def price_many(self, quote_types, ages):
+        """Returns the covers and premiums of many quotes at once, in cents
+
+        The quotes are priced in a few vectorized operations with NumPy, if it is installed
+        (it is an optional dependency), or one at a time with :meth:`price` otherwise.
+
+        :param quote_types: The type of each quote. See: :meth:`price`
+        :param ages: The age of the customer of each quote
+        :returns: A tuple of (covers, premiums), as lists of integers
+        :raises KeyError: If a quote type is unknown
+        """
+
+        if numpy is None:
+            prices = [
+                self.price(quote_type, age)
+                for quote_type, age in zip(quote_types, ages)
+            ]
+
+            return (
+                [int(cover * 100) for cover, _ in prices],
+                [int(premium * 100) for _, premium in prices],
+            )
+
+        if self._cents is None:
+            self._cents = {
+                quote_type: numpy.array(
+                    [(cover * 100, premium * 100) for cover, premium in prices],
+                    dtype=numpy.int64,
+                )
+                for quote_type, prices in self.prices.items()
+            }
+
+        quote_types = numpy.asarray(quote_types, dtype=object)
+        ages = numpy.asarray(ages, dtype=numpy.int64)
+        cents = numpy.zeros((len(ages), 2), dtype=numpy.int64)
+        priced = numpy.zeros(len(ages), dtype=bool)
+
+        for quote_type, table in self._cents.items():
+            selected = quote_types == quote_type
+            cents[selected] = table[numpy.clip(ages[selected], 0, len(table) - 1)]
+            priced |= selected
+
+        if not priced.all():
+            raise KeyError(quote_types[~priced][0])
+
+        return cents[:, 0].tolist(), cents[:, 1].tolist()
+
+
+_lock = threading.Lock()
+_rate_table = None
+_path = None
+_mtime = None
+_checked_at = 0
+
+
+def get_rate_table() -> RateTable:
+    """Returns the rate tables, loading them again if their file changed
+
+    If the file changed but is invalid, the previous tables are kept (and the error logged).
+    This checks the clock (and the file, every :data:`RELOAD_INTERVAL` seconds), so call it
+    once per request or batch, and price every quote with the tables it returned.
+    """
+
+    global _rate_table, _path, _mtime, _checked_at
+
+    now = time.monotonic()
+
+    # Comparing paths by value is slower than the rest of the lookup, and the setting is
+    # only ever replaced (such as by override_settings in tests), never changed in place
+    if (
+        _rate_table is not None
+        and now - _checked_at < RELOAD_INTERVAL
+        and _path is settings.QUOTE_RATES_FILE
+    ):
+        return _rate_table
+
+    with _lock:
+        path = settings.QUOTE_RATES_FILE
+        mtime = os.stat(path).st_mtime_ns
+
+        if _rate_table is None or path != _path or mtime != _mtime:
+            try:
+                rate_table = RateTable.from_file(path)
+            except (OSError, ValueError):
+                if _rate_table is None or path != _path:
+                    raise
+
+                logger.exception("Could not reload the rate tables from %s", path)
+            else:
+                _rate_table = rate_table
+
+            _mtime = mtime
+
+        _path = path
+        _checked_at = now
+
+    return _rate_table
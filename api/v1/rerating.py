@@ -0,0 +1,43 @@
+"""The work done in the worker processes of the ``rerate_policies`` management command"""
+
+from api.v1.rating import RateTable
+
+# The rates used by a worker process. See: :func:`init_worker`
+_rate_table = None
+
+
+def init_worker(rates_file, quote_types):
+    """Sets up a worker process, with the rates the whole run prices with
+
+    The workers are spawned rather than forked, so that they do not inherit (and close)
+    the database connections. They only import this module, which does not need Django to
+    be set up, so they are given the quote types the rates must price.
+    """
+
+    global _rate_table
+
+    _rate_table = RateTable.from_file(rates_file, quote_types)
+
+
+def reprice(rows, today):
+    """Prices policies, and returns those whose price changed
+
+    This runs in the worker processes, so it does not use the database.
+
+    :param rows: Tuples of (policy id, type, cover, premium, date of birth of the customer)
+    :param today: The date the ages of the customers are computed on
+    :returns: Tuples of (policy id, old cover, new cover, old premium, new premium)
+    """
+
+    changes = []
+
+    for policy_id, quote_type, cover, premium, date_of_birth in rows:
+        # See: :meth:`api.models.Customer.age_from_date_of_birth`
+        new_cover, new_premium = _rate_table.price(
+            quote_type, (today - date_of_birth).days // 365
+        )
+
+        if (new_cover, new_premium) != (cover, premium):
+            changes.append((policy_id, cover, new_cover, premium, new_premium))
+
+    return changes
@@ -0,0 +1,467 @@
+"""This module defines services that create or update many rows at once.
+
+Views handling batch requests call these instead of saving a form per item. Each item is
+still validated with the same form as its single-item endpoint, but the rows are written
+with a few set-based statements inside one transaction.
+Results are returned per item, in the order the items were given, so the view can report
+which ones succeeded and why the others failed.
+"""
+
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from api import rendering
+from api.models import (
+    Customer,
+    CustomerPolicyType,
+    Policy,
+    PolicyStateHistory,
+    Quote,
+    share_customers,
+)
+from api.v1.forms import (
+    QUOTE_STATUS_TRANSITIONS,
+    CustomerCreationForm,
+    QuoteCreationForm,
+    QuoteUpdateForm,
+    calculate_quote_price,
+)
+from api.v1.rating import get_rate_table
+
+# Number of rows sent to the database per INSERT statement
+BULK_CREATE_BATCH_SIZE = 500
+
+# Maximum number of items accepted in a single batch request
+MAX_BATCH_ITEMS = 10_000
+
+# Building the values of a choices enum is slow, so they are built once
+QUOTE_TYPES = frozenset(Quote.QuoteType.values)
+
+
+class ConcurrentUpdateError(Exception):
+    """Raised when rows of a batch were changed by another transaction while it was applied
+
+    The batch is rolled back, so it can safely be retried.
+    """
+
+
+def bulk_create_customers(items: list) -> list[dict]:
+    """Validates and creates customers in bulk
+
+    Every item is validated with :class:`api.v1.forms.CustomerCreationForm`. The valid ones are
+    inserted with ``bulk_create`` in batches of :data:`BULK_CREATE_BATCH_SIZE`, in a single
+    transaction, while the invalid ones are skipped.
+
+    :param items: Request payloads, as accepted by the ``create_customer/`` endpoint
+    :returns: One result per item, with either the created customer (status 201) or the
+        validation errors (status 422)
+    """
+
+    results = [None] * len(items)
+    customers = []
+    indices = []
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {
+                "index": index,
+                "status": 422,
+                "detail": "item must be an object",
+            }
+            continue
+
+        form = CustomerCreationForm(item)
+
+        if not form.is_valid():
+            results[index] = {
+                "index": index,
+                "status": 422,
+                "detail": form.errors.get_json_data(),
+            }
+            continue
+
+        customers.append(form.save(commit=False))
+        indices.append(index)
+
+    with transaction.atomic():
+        Customer.objects.bulk_create(customers, batch_size=BULK_CREATE_BATCH_SIZE)
+
+    for index, customer in zip(indices, customers):
+        results[index] = {
+            "index": index,
+            "status": 201,
+            "customer": rendering.encode_customer(customer),
+        }
+
+    return results
+
+
+def bulk_create_quotes(items: list) -> list[dict]:
+    """Validates, prices and creates quotes in bulk
+
+    Every item is validated with :class:`api.v1.forms.QuoteCreationForm` and priced with
+    :func:`api.v1.forms.calculate_quote_price`. The customers are fetched with one query.
+
+    :meth:`api.models.Quote.save` and :meth:`api.models.Policy.save` are not called, so this
+    does what they would have done for each quote with one INSERT per table instead: every
+    quote gets a policy in the ``QUOTED`` state with the quote's type, cover and premium,
+    that policy gets its initial state history entry, and its type is recorded for its
+    customer in :class:`api.models.CustomerPolicyType`.
+
+    :param items: Request payloads, as accepted by the ``quote/`` endpoint
+    :returns: One result per item, with either the created quote (status 201), the
+        validation errors (status 422) or a missing customer (status 404)
+    """
+
+    results = [None] * len(items)
+    valid_items = []
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {
+                "index": index,
+                "status": 422,
+                "detail": "item must be an object",
+            }
+            continue
+
+        form = QuoteCreationForm(item)
+
+        if not form.is_valid():
+            results[index] = {
+                "index": index,
+                "status": 422,
+                "detail": form.errors.get_json_data(),
+            }
+            continue
+
+        valid_items.append((index, form.cleaned_data))
+
+    customers = Customer.objects.in_bulk(
+        {cleaned_data["customer_id"] for _, cleaned_data in valid_items}
+    )
+
+    quotes = []
+    indices = []
+    rate_table = get_rate_table()
+
+    for index, cleaned_data in valid_items:
+        customer = customers.get(cleaned_data["customer_id"])
+
+        if customer is None:
+            results[index] = {
+                "index": index,
+                "status": 404,
+                "detail": "customer not found",
+            }
+            continue
+
+        cover, premium = calculate_quote_price(
+            cleaned_data["type"], customer.date_of_birth, rate_table
+        )
+
+        quotes.append(
+            Quote(
+                customer=customer,
+                cover=cover,
+                premium=premium,
+                type=cleaned_data["type"],
+            )
+        )
+        indices.append(index)
+
+    with transaction.atomic():
+        Quote.objects.bulk_create(quotes, batch_size=BULK_CREATE_BATCH_SIZE)
+
+        policies = Policy.objects.bulk_create(
+            [
+                Policy(
+                    customer=quote.customer,
+                    quote=quote,
+                    state=Policy.PolicyState.QUOTED,
+                    type=quote.type,
+                    cover=quote.cover,
+                    premium=quote.premium,
+                )
+                for quote in quotes
+            ],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+
+        for policy in policies:
+            policy.rendered = policy.render()
+
+        # The ids of the policies are needed to render them, so they are rendered after
+        # they are inserted
+        Policy.objects.bulk_update(
+            policies, ["rendered"], batch_size=BULK_CREATE_BATCH_SIZE
+        )
+
+        PolicyStateHistory.record(
+            PolicyStateHistory.for_policies(policies, first=True),
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+
+        CustomerPolicyType.add_for_policies(policies)
+
+    for index, quote in zip(indices, quotes):
+        results[index] = {
+            "index": index,
+            "status": 201,
+            "quote": rendering.encode_quote(quote),
+        }
+
+    return results
+
+
+def bulk_update_quote_statuses(items: list) -> list[dict]:
+    """Validates and applies quote status updates in bulk
+
+    Every item is validated with :class:`api.v1.forms.QuoteUpdateForm` and goes through the
+    same transitions as :meth:`api.v1.forms.QuoteUpdateForm.save`, in the order given, so a
+    quote may be accepted and activated in the same batch.
+
+    The quotes are fetched (and locked, where the database supports it) with one query.
+    Then, for each transition, the quotes are updated with one conditional UPDATE, and the
+    policies are fetched and saved with :meth:`api.models.Policy.save_state_changes`.
+
+    :param items: Request payloads, as accepted by the ``quote/`` endpoint
+    :returns: One result per item, with its outcome (``applied``, ``no-op``,
+        ``invalid transition``, ``not found`` or ``invalid``) and the quote, if found
+    :raises ConcurrentUpdateError: If a quote's status was changed by another transaction
+    """
+
+    results = [None] * len(items)
+    valid_items = []
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {
+                "index": index,
+                "status": 422,
+                "outcome": "invalid",
+                "detail": "item must be an object",
+            }
+            continue
+
+        form = QuoteUpdateForm(item)
+
+        if not form.is_valid():
+            results[index] = {
+                "index": index,
+                "status": 422,
+                "outcome": "invalid",
+                "detail": form.errors.get_json_data(),
+            }
+            continue
+
+        valid_items.append((index, form.cleaned_data))
+
+    with transaction.atomic():
+        quotes = (
+            Quote.objects.select_for_update(of=("self",))
+            .select_related("customer")
+            .in_bulk({cleaned_data["quote_id"] for _, cleaned_data in valid_items})
+        )
+
+        # The status of each quote as the items are applied in order
+        statuses = {quote.id: quote.status for quote in quotes.values()}
+        outcomes = {}
+        quote_ids_by_status = defaultdict(list)
+
+        for index, cleaned_data in valid_items:
+            quote_id = cleaned_data["quote_id"]
+            new_status = cleaned_data["status"]
+            transition = QUOTE_STATUS_TRANSITIONS.get(new_status)
+
+            if quote_id not in statuses:
+                outcomes[index] = (404, "not found")
+            elif statuses[quote_id] == new_status:
+                outcomes[index] = (200, "no-op")
+            elif transition is None or transition[0] != statuses[quote_id]:
+                outcomes[index] = (409, "invalid transition")
+            else:
+                outcomes[index] = (200, "applied")
+                statuses[quote_id] = new_status
+                quote_ids_by_status[new_status].append(quote_id)
+
+        now = timezone.now()
+
+        # Transitions are applied in the order they are made, so that quotes going through
+        # more than one of them get a history entry for each, in order
+        for new_status, (from_status, policy_state) in QUOTE_STATUS_TRANSITIONS.items():
+            quote_ids = quote_ids_by_status[new_status]
+
+            if not quote_ids:
+                continue
+
+            transitioned = Quote.objects.filter(
+                id__in=quote_ids, status=from_status
+            ).update(status=new_status, last_modified=now)
+
+            if transitioned != len(quote_ids):
+                raise ConcurrentUpdateError(
+                    "the status of some quotes changed while the batch was applied"
+                )
+
+            policies = list(
+                Policy.objects.for_serialization().filter(quote__id__in=quote_ids)
+            )
+            share_customers(policies)
+
+            for policy in policies:
+                policy.state = policy_state
+
+            Policy.save_state_changes(policies)
+
+    for quote_id, status in statuses.items():
+        quotes[quote_id].status = status
+
+    for index, cleaned_data in valid_items:
+        status, outcome = outcomes[index]
+
+        if outcome == "not found":
+            results[index] = {
+                "index": index,
+                "status": status,
+                "outcome": outcome,
+                "detail": "quote not found",
+            }
+            continue
+
+        results[index] = {
+            "index": index,
+            "status": status,
+            "outcome": outcome,
+            "quote": rendering.encode_quote(quotes[cleaned_data["quote_id"]]),
+        }
+
+    return results
+
+
+def _field_error(message, code):
+    # The format of the errors of a form. See: :meth:`django.forms.Form.errors.get_json_data`
+    return [{"message": message, "code": code}]
+
+
+def _parse_dob(value):
+    """Parses a date of birth as accepted by :class:`api.v1.forms.CustomerCreationForm`
+
+    :raises ValueError: If the value is not a date in the DD-MM-YYYY format
+    """
+
+    if not isinstance(value, str) or len(value) != 10 or value[2] + value[5] != "--":
+        raise ValueError(value)
+
+    # fromisoformat is much faster than strptime
+    return datetime.date.fromisoformat(f"{value[6:]}-{value[3:5]}-{value[:2]}")
+
+
+def preview_quotes(items: list) -> list[dict]:
+    """Prices quotes in bulk, without creating them
+
+    Every item has a quote type, and either the id of a customer or a date of birth (in the
+    format accepted by the ``create_customer/`` endpoint). The quotes are priced with the
+    same rates as :func:`api.v1.forms.calculate_quote_price`, all at once.
+    See: :meth:`api.v1.rating.RateTable.price_many`
+
+    The items are validated by hand, instead of with a form, because a form costs more than
+    pricing its item. The customers are fetched with one query, and nothing is written.
+
+    :param items: Request payloads
+    :returns: One result per item, with either the cover and premium (status 200), the
+        validation errors (status 422) or a missing customer (status 404)
+    """
+
+    results = [None] * len(items)
+    valid_items = []
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {
+                "index": index,
+                "status": 422,
+                "detail": "item must be an object",
+            }
+            continue
+
+        errors = {}
+        quote_type = item.get("type")
+        customer_id = item.get("customer_id")
+        date_of_birth = item.get("dob")
+
+        if quote_type is None:
+            errors["type"] = _field_error("This field is required.", "required")
+        elif quote_type not in QUOTE_TYPES:
+            errors["type"] = _field_error(
+                f"Select a valid choice. {quote_type} is not one of the available choices.",
+                "invalid_choice",
+            )
+
+        if customer_id is not None:
+            if not isinstance(customer_id, int) or isinstance(customer_id, bool):
+                errors["customer_id"] = _field_error("Enter a whole number.", "invalid")
+        elif date_of_birth is not None:
+            try:
+                date_of_birth = _parse_dob(date_of_birth)
+            except ValueError:
+                errors["dob"] = _field_error("Enter a valid date.", "invalid")
+        else:
+            errors["__all__"] = _field_error(
+                "Either customer_id or dob is required.", "required"
+            )
+
+        if errors:
+            results[index] = {"index": index, "status": 422, "detail": errors}
+            continue
+
+        valid_items.append((index, quote_type, customer_id, date_of_birth))
+
+    customer_ids = {item[2] for item in valid_items if item[2] is not None}
+    dates_of_birth = (
+        dict(
+            Customer.objects.filter(id__in=customer_ids).values_list(
+                "id", "date_of_birth"
+            )
+        )
+        if customer_ids
+        else {}
+    )
+
+    today = datetime.date.today().toordinal()
+    priced_items = []
+    quote_types = []
+    ages = []
+
+    for index, quote_type, customer_id, date_of_birth in valid_items:
+        if customer_id is not None:
+            date_of_birth = dates_of_birth.get(customer_id)
+
+            if date_of_birth is None:
+                results[index] = {
+                    "index": index,
+                    "status": 404,
+                    "detail": "customer not found",
+                }
+                continue
+
+        # See: :meth:`api.models.Customer.age_from_date_of_birth`
+        priced_items.append((index, quote_type))
+        quote_types.append(quote_type)
+        ages.append((today - date_of_birth.toordinal()) // 365)
+
+    covers, premiums = get_rate_table().price_many(quote_types, ages)
+
+    for (index, quote_type), cover, premium in zip(priced_items, covers, premiums):
+        results[index] = {
+            "index": index,
+            "status": 200,
+            "type": quote_type,
+            "cover": f"{cover // 100}.{cover % 100:02d}",
+            "premium": f"{premium // 100}.{premium % 100:02d}",
+        }
+
+    return results
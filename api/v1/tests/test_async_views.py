@@ -0,0 +1,271 @@
+import datetime
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+
+from api.models import (
+    Customer,
+    Policy,
+    PolicyStateHistory,
+    PolicyStateHistoryArchive,
+    Quote,
+)
+from api.v1 import async_views, views
+
+
+class AsyncViewsTestCase(TestCase):
+    """The async views respond byte for byte as the sync views"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+        self.customer = Customer.objects.create(
+            first_name="John",
+            last_name="Doe",
+            date_of_birth=datetime.date(year=2000, month=1, day=1),
+        )
+
+        for quote_type in Quote.QuoteType.values:
+            Quote.objects.create(
+                customer=self.customer,
+                cover=20000,
+                premium=200,
+                type=quote_type,
+            )
+
+        self.policy = Policy.objects.filter(customer=self.customer).first()
+
+    async def assertSameResponse(self, name, request, **kwargs):
+        sync_response = await self.get_sync_response(name, request, **kwargs)
+        async_response = await getattr(async_views, name).as_view()(request, **kwargs)
+
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.content, sync_response.content)
+
+        for header in ("ETag", "Last-Modified"):
+            self.assertEqual(
+                async_response.headers.get(header), sync_response.headers.get(header)
+            )
+
+        return async_response
+
+    async def get_sync_response(self, name, request, **kwargs):
+        return await sync_to_async(getattr(views, name).as_view())(request, **kwargs)
+
+    async def test_customers(self):
+        for query in (
+            {},
+            {"per_page": 1, "page": 2},
+            {"per_page": 1, "page": "last"},
+            {"page": 5},
+            {"page": "first"},
+            {"per_page": "x"},
+            {"first_name": "oh"},
+            {"pagination": "cursor", "per_page": 1, "include_total": "true"},
+        ):
+            with self.subTest(query=query):
+                await self.assertSameResponse(
+                    "CustomerView", self.factory.get("/", query)
+                )
+
+    async def test_policies(self):
+        for query in (
+            {"customer_id": self.customer.id},
+            {"customer_id": self.customer.id, "per_page": 1},
+            {"customer_id": self.customer.id, "per_page": "x"},
+            {},
+        ):
+            with self.subTest(query=query):
+                await self.assertSameResponse(
+                    "PolicyListView", self.factory.get("/", query)
+                )
+
+    async def test_unrendered_policies(self):
+        await Policy.objects.filter(id=self.policy.id).aupdate(rendered=None)
+
+        await self.assertSameResponse(
+            "PolicyListView", self.factory.get("/", {"customer_id": self.customer.id})
+        )
+        await self.assertSameResponse(
+            "PolicyDetailView", self.factory.get("/"), pk=self.policy.id
+        )
+
+    async def test_policy_details(self):
+        response = await self.assertSameResponse(
+            "PolicyDetailView", self.factory.get("/"), pk=self.policy.id
+        )
+        self.assertEqual(response.status_code, 200)
+
+        # Served from the cache
+        await self.assertSameResponse(
+            "PolicyDetailView", self.factory.get("/"), pk=self.policy.id
+        )
+
+        response = await self.assertSameResponse(
+            "PolicyDetailView",
+            self.factory.get("/", HTTP_IF_NONE_MATCH=response.headers["ETag"]),
+            pk=self.policy.id,
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.assertSameResponse(
+            "PolicyDetailView", self.factory.get("/"), pk=0
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_policy_history(self):
+        for status in (Quote.QuoteStatus.ACCEPTED, Quote.QuoteStatus.ACTIVE):
+            await async_views.QuoteView.as_view()(
+                self.factory.put(
+                    "/",
+                    {"quote_id": self.policy.quote_id, "status": status},
+                    content_type="application/json",
+                )
+            )
+
+        response = await self.assertSameResponse(
+            "PolicyHistoryView", self.factory.get("/"), pk=self.policy.id
+        )
+        self.assertEqual(len(json.loads(response.content)["history"]), 3)
+
+        response = await self.assertSameResponse(
+            "PolicyHistoryView",
+            self.factory.get("/", {"per_page": 1}),
+            pk=self.policy.id,
+        )
+        next_cursor = json.loads(response.content)["next_cursor"]
+
+        await self.assertSameResponse(
+            "PolicyHistoryView",
+            self.factory.get("/", {"per_page": 1, "next_cursor": next_cursor}),
+            pk=self.policy.id,
+        )
+        await self.assertSameResponse(
+            "PolicyHistoryView",
+            self.factory.get("/", HTTP_IF_NONE_MATCH=response.headers["ETag"]),
+            pk=self.policy.id,
+        )
+        await self.assertSameResponse(
+            "PolicyHistoryView", self.factory.get("/", {"per_page": "x"}), pk=0
+        )
+
+    async def test_archived_policy_history(self):
+        entries = [entry async for entry in self.policy.policystatehistory_set.all()]
+        await PolicyStateHistory.aload_snapshots(entries)
+        await PolicyStateHistoryArchive.archive(self.policy.id, entries).asave()
+        await self.policy.policystatehistory_set.all().adelete()
+
+        response = await self.assertSameResponse(
+            "PolicyHistoryView", self.factory.get("/"), pk=self.policy.id
+        )
+        self.assertEqual(len(json.loads(response.content)["history"]), 1)
+
+    async def test_fields(self):
+        for query in (
+            {"fields": "id,state"},
+            {"expand": ""},
+            {"fields": "quote", "expand": "quote.customer"},
+            {"fields": "owner"},
+        ):
+            with self.subTest(query=query):
+                await self.assertSameResponse(
+                    "PolicyListView",
+                    self.factory.get("/", {"customer_id": self.customer.id, **query}),
+                )
+                await self.assertSameResponse(
+                    "PolicyDetailView", self.factory.get("/", query), pk=self.policy.id
+                )
+                await self.assertSameResponse(
+                    "PolicyHistoryView", self.factory.get("/", query), pk=self.policy.id
+                )
+
+    async def test_malformed_quote_bodies(self):
+        for method in ("post", "put"):
+            with self.subTest(method=method):
+                response = await self.assertSameResponse(
+                    "QuoteView",
+                    getattr(self.factory, method)(
+                        "/", "{", content_type="application/json"
+                    ),
+                )
+
+                self.assertEqual(response.status_code, 422)
+                self.assertEqual(
+                    json.loads(response.content)["detail"],
+                    "request body is malformed",
+                )
+
+    async def test_create_and_update_quotes(self):
+        response = await async_views.QuoteView.as_view()(
+            self.factory.post(
+                "/",
+                {
+                    "customer_id": self.customer.id,
+                    "type": Quote.QuoteType.AUTO_INSURANCE,
+                },
+                content_type="application/json",
+            )
+        )
+        self.assertEqual(response.status_code, 201)
+        quote_id = json.loads(response.content)["id"]
+
+        response = await async_views.QuoteView.as_view()(
+            self.factory.put(
+                "/",
+                {"quote_id": quote_id, "status": Quote.QuoteStatus.ACCEPTED},
+                content_type="application/json",
+            )
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            await Policy.objects.filter(quote_id=quote_id)
+            .values_list("state", flat=True)
+            .aget(),
+            Policy.PolicyState.NEW,
+        )
+
+        response = await async_views.QuoteView.as_view()(
+            self.factory.post(
+                "/",
+                {"customer_id": 0, "type": "auto"},
+                content_type="application/json",
+            )
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_quote_batches(self):
+        response = await async_views.QuoteBatchView.as_view()(
+            self.factory.post(
+                "/",
+                [
+                    {
+                        "customer_id": self.customer.id,
+                        "type": Quote.QuoteType.AUTO_INSURANCE,
+                    }
+                ],
+                content_type="application/json",
+            )
+        )
+        self.assertEqual(response.status_code, 200)
+        result = json.loads(response.content)["results"][0]
+        self.assertEqual(result["status"], 201)
+
+        response = await async_views.QuoteBatchView.as_view()(
+            self.factory.put(
+                "/",
+                [
+                    {
+                        "quote_id": result["quote"]["id"],
+                        "status": Quote.QuoteStatus.ACCEPTED,
+                    }
+                ],
+                content_type="application/json",
+            )
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content)["results"][0]["outcome"], "applied"
+        )
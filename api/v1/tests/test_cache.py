@@ -0,0 +1,128 @@
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+
+from api import cache as policy_cache
+from api.models import Customer, Policy, Quote
+
+
+class PolicyCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.client = Client()
+        self.customer = Customer.objects.create(
+            first_name="Ben",
+            last_name="Stokes",
+            date_of_birth=datetime.date(year=1991, month=6, day=25),
+        )
+        self.quote = Quote.objects.create(
+            customer=self.customer,
+            cover=20000,
+            premium=200,
+            type=Quote.QuoteType.PERSONAL_ACCIDENT,
+        )
+        self.policy = Policy.objects.get(quote=self.quote)
+        self.url = f"/api/v1/policies/{self.policy.id}/"
+
+    def get_policy(self, num_queries):
+        with self.assertNumQueries(num_queries):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+
+        return response
+
+    def test_policy_is_cached(self):
+        response = self.get_policy(1)
+        cached_response = self.get_policy(0)
+
+        self.assertEqual(cached_response.content, response.content)
+        self.assertEqual(cached_response.headers["ETag"], response.headers["ETag"])
+        self.assertEqual(
+            cached_response.headers["Content-Type"], response.headers["Content-Type"]
+        )
+
+    def test_nonexistent_policy_is_not_cached(self):
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                response = self.client.get("/api/v1/policies/9999/")
+
+            self.assertEqual(response.status_code, 404)
+
+    def test_policy_is_invalidated_on_writes(self):
+        self.get_policy(1)
+
+        self.policy.state = Policy.PolicyState.NEW
+        self.policy.save()
+
+        self.assertEqual(self.get_policy(1).json()["state"], "new")
+
+        self.quote.status = Quote.QuoteStatus.ACCEPTED
+        self.quote.save()
+
+        self.assertEqual(self.get_policy(1).json()["quote"]["status"], "accepted")
+
+        self.customer.first_name = "Benjamin"
+        self.customer.save()
+
+        self.assertEqual(
+            self.get_policy(1).json()["customer"]["first_name"], "Benjamin"
+        )
+
+    def test_policy_is_invalidated_on_status_updates(self):
+        self.get_policy(1)
+
+        self.client.put(
+            "/api/v1/quote/",
+            {"quote_id": self.quote.id, "status": "accepted"},
+            content_type="application/json",
+        )
+
+        self.assertEqual(self.get_policy(1).json()["state"], "new")
+
+        self.client.put(
+            "/api/v1/quote/batch/",
+            [{"quote_id": self.quote.id, "status": "active"}],
+            content_type="application/json",
+        )
+
+        self.assertEqual(self.get_policy(1).json()["state"], "bound")
+
+
+class SingleFlightTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_misses_build_once(self):
+        builds = []
+        barrier = threading.Barrier(8)
+
+        def build():
+            builds.append(1)
+            time.sleep(0.1)
+
+            return b"built"
+
+        def get():
+            barrier.wait()
+
+            return policy_cache.get_or_build(1, build)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: get(), range(8)))
+
+        self.assertEqual(results, [b"built"] * 8)
+        self.assertEqual(len(builds), 1)
+
+    def test_invalidated_entry_is_rebuilt(self):
+        self.assertEqual(policy_cache.get_or_build(1, lambda: b"first"), b"first")
+        self.assertEqual(policy_cache.get_or_build(1, lambda: b"second"), b"first")
+
+        policy_cache.invalidate_policies([1])
+
+        self.assertEqual(policy_cache.get_or_build(1, lambda: b"second"), b"second")
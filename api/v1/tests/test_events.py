@@ -0,0 +1,209 @@
+import datetime
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.utils import timezone
+
+from api.management.commands.deliver_policy_events import Command
+from api.models import Customer, PolicyEvent, Quote
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+
+        if self.server.failing:
+            self.send_response(500)
+        else:
+            self.server.received.append(json.loads(body)["events"])
+            self.send_response(204)
+
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class PolicyEventTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+        # A local stand-in for the webhooks
+        self.servers = []
+
+        for _ in range(2):
+            server = ThreadingHTTPServer(("127.0.0.1", 0), WebhookHandler)
+            server.received = []
+            server.failing = False
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.addCleanup(server.server_close)
+            self.addCleanup(server.shutdown)
+            self.servers.append(server)
+
+        self.webhooks = [
+            f"http://127.0.0.1:{server.server_address[1]}/" for server in self.servers
+        ]
+
+        self.customer = Customer.objects.create(
+            first_name="Ben",
+            last_name="Stokes",
+            date_of_birth=datetime.date(year=1991, month=6, day=25),
+        )
+
+    def create_and_accept_quote(self):
+        quote = Quote.objects.create(
+            customer=self.customer,
+            cover=20000,
+            premium=200,
+            type=Quote.QuoteType.PERSONAL_ACCIDENT,
+        )
+        self.client.put(
+            "/api/v1/quote/",
+            {"quote_id": quote.id, "status": "accepted"},
+            content_type="application/json",
+        )
+
+        return quote
+
+    def deliver(self):
+        call_command(
+            "deliver_policy_events",
+            "--once",
+            "--batch-size=3",
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+
+    def test_no_events_without_webhooks(self):
+        self.create_and_accept_quote()
+
+        self.assertFalse(PolicyEvent.objects.exists())
+
+    def test_events_are_delivered_in_order(self):
+        with self.settings(POLICY_EVENT_WEBHOOKS=self.webhooks):
+            # The state change takes a single extra INSERT, for both webhooks
+            quote = self.create_and_accept_quote()
+
+            with self.assertNumQueries(8):
+                self.client.put(
+                    "/api/v1/quote/",
+                    {"quote_id": quote.id, "status": "active"},
+                    content_type="application/json",
+                )
+
+            self.create_and_accept_quote()
+
+        self.assertEqual(PolicyEvent.objects.count(), 10)
+
+        # The second webhook is down, so its events wait to be retried
+        self.servers[1].failing = True
+        self.deliver()
+
+        received = [event for batch in self.servers[0].received for event in batch]
+
+        self.assertEqual(len(self.servers[0].received), 2)
+        self.assertEqual(
+            [event["state"] for event in received],
+            ["quoted", "new", "bound", "quoted", "new"],
+        )
+        self.assertEqual(received[2]["policy"]["quote"]["status"], "active")
+        self.assertEqual(
+            [event["id"] for event in received], sorted(e["id"] for e in received)
+        )
+
+        head = PolicyEvent.objects.order_by("id").first()
+
+        self.assertEqual(PolicyEvent.objects.count(), 5)
+        self.assertEqual(head.destination, self.webhooks[1])
+        self.assertEqual(head.attempts, 1)
+        self.assertGreater(head.next_attempt_at, timezone.now())
+
+        # Nothing is sent before the retry is due
+        self.servers[1].failing = False
+        self.deliver()
+
+        self.assertEqual(self.servers[1].received, [])
+
+        PolicyEvent.objects.update(next_attempt_at=timezone.now())
+        self.deliver()
+
+        self.assertEqual(
+            [event for batch in self.servers[1].received for event in batch], received
+        )
+        self.assertFalse(PolicyEvent.objects.exists())
+
+    def test_invalid_destination_does_not_stop_delivery(self):
+        with self.settings(POLICY_EVENT_WEBHOOKS=["not a url", self.webhooks[0]]):
+            self.create_and_accept_quote()
+
+        self.deliver()
+
+        # ValueError: unknown url type
+        head = PolicyEvent.objects.order_by("id").first()
+
+        self.assertEqual(len(self.servers[0].received), 1)
+        self.assertEqual(PolicyEvent.objects.count(), 2)
+        self.assertEqual(head.destination, "not a url")
+        self.assertEqual(head.attempts, 1)
+        self.assertIn("unknown url type", head.last_error)
+
+    def test_batches_are_claimed_once(self):
+        with self.settings(POLICY_EVENT_WEBHOOKS=self.webhooks[:1]):
+            self.create_and_accept_quote()
+
+        now = timezone.now()
+
+        # Two workers that read the same head event
+        heads = [PolicyEvent.objects.order_by("id").first() for _ in range(2)]
+
+        self.assertTrue(Command().claim(heads[0], now))
+        self.assertFalse(Command().claim(heads[1], now))
+
+        # Nor is the claimed batch delivered until the claim expires
+        self.deliver()
+
+        self.assertEqual(self.servers[0].received, [])
+
+    def test_failing_batches_are_given_up_on(self):
+        with self.settings(POLICY_EVENT_WEBHOOKS=self.webhooks[:1]):
+            self.create_and_accept_quote()
+            self.create_and_accept_quote()
+
+        self.servers[0].failing = True
+
+        for _ in range(3):
+            PolicyEvent.objects.update(next_attempt_at=timezone.now())
+            call_command(
+                "deliver_policy_events",
+                "--once",
+                "--batch-size=3",
+                "--max-attempts=3",
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+
+        failed = PolicyEvent.objects.filter(failed_at__isnull=False).order_by("id")
+
+        self.assertEqual(failed.count(), 3)
+        self.assertEqual(failed[0].attempts, 3)
+        self.assertIn("500", failed[0].last_error)
+
+        # The next events of the webhook are delivered, and the failed ones are kept
+        self.servers[0].failing = False
+        self.deliver()
+
+        self.assertEqual([len(batch) for batch in self.servers[0].received], [1])
+        self.assertEqual(PolicyEvent.objects.count(), 3)
+
+    def test_destinations_emptied_by_another_worker(self):
+        command = Command(stdout=StringIO(), stderr=StringIO())
+
+        with mock.patch.object(
+            command, "get_destinations", return_value=[self.webhooks[0]]
+        ):
+            self.assertEqual(command.deliver(mock.Mock(), 3, 10), 0)
@@ -0,0 +1,129 @@
+import datetime
+
+from django.http import QueryDict
+from django.test import TestCase
+
+from api import history, rendering
+from api.models import Customer, Policy, Quote
+from api.v1.fieldsets import PolicyFieldset
+
+
+class PolicyFieldsetTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name="Ben",
+            last_name="Stokes",
+            date_of_birth=datetime.date(year=1991, month=6, day=25),
+        )
+        Quote.objects.create(
+            customer=self.customer,
+            cover=20000,
+            premium=200,
+            type=Quote.QuoteType.AUTO_INSURANCE,
+        )
+        self.policies = Policy.objects.filter(customer=self.customer)
+
+    def parse(self, query) -> PolicyFieldset:
+        return PolicyFieldset.from_query(QueryDict(query))
+
+    def test_from_query(self):
+        self.assertTrue(self.parse("").is_default)
+        self.assertTrue(
+            self.parse("fields=id,type,state,premium,cover,customer,quote").is_default
+        )
+
+        fieldset = self.parse("fields=state, id&expand=quote.customer")
+
+        # In payload order, and quote.customer implies quote
+        self.assertEqual(fieldset.fields, ("id", "state"))
+        self.assertEqual(fieldset.expand, frozenset())
+
+        fieldset = self.parse("expand=quote.customer")
+
+        self.assertEqual(fieldset.expand, {"quote", "quote.customer"})
+        self.assertTrue(fieldset.joins_quote_customer)
+
+        for query in ("fields=", "fields=id,owner", "expand=policy"):
+            with self.subTest(query=query):
+                with self.assertRaises(ValueError):
+                    self.parse(query)
+
+    def test_default_encoding(self):
+        fieldset = self.parse("")
+        policy = fieldset.fetch(self.policies)[0]
+
+        self.assertEqual(
+            rendering.dumps(fieldset.encode(policy)),
+            self.policies.get().render(),
+        )
+
+    def test_encoding(self):
+        policy = self.policies.get()
+
+        for query, payload in (
+            ("fields=id,state", {"id": policy.id, "state": policy.state}),
+            ("fields=premium", {"premium": "200.00"}),
+            (
+                "fields=customer,quote&expand=",
+                {"customer": self.customer.id, "quote": policy.quote_id},
+            ),
+            (
+                "fields=quote&expand=quote",
+                {
+                    "quote": {
+                        "id": policy.quote_id,
+                        "status": policy.quote.status,
+                        "type": policy.quote.type,
+                        "premium": "200.00",
+                        "cover": "20000.00",
+                        "customer": self.customer.id,
+                    }
+                },
+            ),
+        ):
+            with self.subTest(query=query):
+                fieldset = self.parse(query)
+
+                self.assertEqual(
+                    fieldset.encode(fieldset.fetch(self.policies)[0]), payload
+                )
+
+    def test_prune_snapshot(self):
+        snapshot = history.to_json_value(self.policies.get().serialize())
+
+        for query in (
+            "",
+            "fields=id,state",
+            "fields=premium,customer&expand=",
+            "fields=quote&expand=quote",
+            "expand=customer,quote.customer",
+        ):
+            with self.subTest(query=query):
+                fieldset = self.parse(query)
+
+                # The same as the policy is encoded
+                self.assertEqual(
+                    fieldset.prune_snapshot(snapshot),
+                    fieldset.encode(fieldset.fetch(self.policies)[0]),
+                )
+
+    def test_joins(self):
+        for query, joins in (
+            ("", 2),
+            ("fields=id,state", 0),
+            ("expand=", 0),
+            ("expand=customer", 1),
+            ("fields=quote&expand=quote.customer", 2),
+        ):
+            with self.subTest(query=query):
+                sql = str(self.parse(query).apply(self.policies).query)
+
+                self.assertEqual(sql.count(" JOIN "), joins)
+
+    def test_fetch_query_count(self):
+        for query in ("", "fields=id", "expand=", "fields=quote&expand=quote.customer"):
+            with self.subTest(query=query):
+                fieldset = self.parse(query)
+
+                with self.assertNumQueries(1):
+                    fieldset.encode(fieldset.fetch(self.policies)[0])
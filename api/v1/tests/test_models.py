@@ -1,8 +1,29 @@
 import datetime
+import importlib
+import io
+import json
+import os
+import tempfile
 
-from django.test import TestCase
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import JsonResponse
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 
-from api.models import Customer
+from api import history
+from api.models import (
+    Customer,
+    CustomerPolicyType,
+    Policy,
+    PolicyStateHistory,
+    PolicyStateHistoryArchive,
+    Quote,
+)
+from api.search import FTS_TABLE, filter_name_contains, has_fts_index
 
 
 class TestModels(TestCase):
@@ -16,3 +37,593 @@ class TestModels(TestCase):
         self.assertEqual(customer.id, 1)
         self.assertIsNotNone(customer.created)
         self.assertIsNotNone(customer.last_modified)
+
+
+class CustomerNameSearchTestCase(TestCase):
+    def setUp(self):
+        names = [
+            ("Ben", "Stokes"),
+            ("Joe", "Root"),
+            ("Jos", "Buttler"),
+            ("Jonny", "Bairstow"),
+            ('Quo"te', "O'Brien"),
+            ("Émile", "Zola"),
+        ]
+
+        Customer.objects.bulk_create(
+            Customer(
+                first_name=first_name,
+                last_name=last_name,
+                date_of_birth=datetime.date(year=1990, month=1, day=1),
+            )
+            for first_name, last_name in names
+        )
+
+    def assertSameAsIcontains(self, field, value):
+        customers = Customer.objects.order_by("id")
+
+        self.assertEqual(
+            list(filter_name_contains(customers, field, value)),
+            list(customers.filter(**{f"{field}__icontains": value})),
+        )
+
+    def test_search_index_is_used(self):
+        if not has_fts_index(connection):
+            self.skipTest("the database has no FTS5 trigram index")
+
+        with CaptureQueriesContext(connection) as queries:
+            list(filter_name_contains(Customer.objects.all(), "last_name", "sto"))
+
+        self.assertIn(FTS_TABLE, queries[0]["sql"])
+
+    def test_search_names(self):
+        for field, value in [
+            ("first_name", "jo"),
+            ("first_name", "JON"),
+            ("first_name", "onny"),
+            ("first_name", 'o"t'),
+            ("first_name", "%"),
+            ("last_name", "sto"),
+            ("last_name", "'bri"),
+            ("last_name", "AIRST"),
+            ("last_name", "xyz"),
+        ]:
+            with self.subTest(field=field, value=value):
+                self.assertSameAsIcontains(field, value)
+
+    def test_search_index_follows_writes(self):
+        customer = Customer.objects.get(first_name="Ben")
+        customer.last_name = "Foakes"
+        customer.save()
+
+        Customer.objects.filter(first_name="Joe").delete()
+
+        for value in ("stokes", "foakes", "root"):
+            with self.subTest(value=value):
+                self.assertSameAsIcontains("last_name", value)
+
+
+class CustomerPolicyTypeTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name="Ben",
+            last_name="Stokes",
+            date_of_birth=datetime.date(year=1991, month=6, day=25),
+        )
+
+    def create_quote(self, type):
+        return Quote.objects.create(
+            customer=self.customer, cover=20000, premium=200, type=type
+        )
+
+    def assertPolicyTypes(self, types):
+        self.assertEqual(
+            set(
+                CustomerPolicyType.objects.filter(customer=self.customer).values_list(
+                    "type", flat=True
+                )
+            ),
+            set(types),
+        )
+
+    def test_policy_types_follow_policies(self):
+        self.assertPolicyTypes([])
+
+        auto_quote = self.create_quote(Quote.QuoteType.AUTO_INSURANCE)
+        self.create_quote(Quote.QuoteType.AUTO_INSURANCE)
+
+        self.assertPolicyTypes(["auto"])
+
+        home_quote = self.create_quote(Quote.QuoteType.HOMEOWNER_INSURANCE)
+
+        self.assertPolicyTypes(["auto", "homeowner-insurance"])
+
+        policy = Policy.objects.get(quote=home_quote)
+        policy.type = Quote.QuoteType.PERSONAL_ACCIDENT
+        policy.save()
+
+        self.assertPolicyTypes(["auto", "personal-accident"])
+
+        policy.delete()
+
+        self.assertPolicyTypes(["auto"])
+
+        # The customer still has another auto policy
+        Policy.objects.get(quote=auto_quote).delete()
+
+        self.assertPolicyTypes(["auto"])
+
+    def test_policy_types_follow_customer_changes(self):
+        other_customer = Customer.objects.create(
+            first_name="Joe",
+            last_name="Root",
+            date_of_birth=datetime.date(year=1990, month=12, day=30),
+        )
+        policy = Policy.objects.get(quote=self.create_quote("auto"))
+        policy.customer = other_customer
+        policy.save()
+
+        self.assertPolicyTypes([])
+        self.assertEqual(
+            list(CustomerPolicyType.objects.values_list("customer_id", "type")),
+            [(other_customer.id, "auto")],
+        )
+
+    def test_policy_types_are_only_refreshed_on_changes(self):
+        policy = Policy.objects.get(quote=self.create_quote("auto"))
+
+        for state in (Policy.PolicyState.NEW, Policy.PolicyState.BOUND):
+            policy.state = state
+
+            with CaptureQueriesContext(connection) as queries:
+                policy.save()
+
+            self.assertFalse(
+                [q for q in queries if CustomerPolicyType._meta.db_table in q["sql"]]
+            )
+
+        self.assertPolicyTypes(["auto"])
+
+    def test_policy_types_are_deleted_with_customer(self):
+        for _ in range(3):
+            self.create_quote(Quote.QuoteType.AUTO_INSURANCE)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.customer.delete()
+
+        self.assertFalse(CustomerPolicyType.objects.exists())
+
+        # They are not recomputed for each of the deleted policies
+        self.assertFalse([q for q in queries if q["sql"].startswith("SELECT DISTINCT")])
+
+
+class CustomerAgeTestCase(TestCase):
+    def test_date_of_birth_lookups(self):
+        today = datetime.date(year=2024, month=3, day=1)
+
+        customers = Customer.objects.bulk_create(
+            Customer(
+                first_name="Jane",
+                last_name="Doe",
+                date_of_birth=today - datetime.timedelta(days=days),
+            )
+            for days in range(0, 40 * 365, 73)
+        )
+
+        for min_age, max_age in [(None, 9), (10, None), (10, 19), (20, 20), (5, 34)]:
+            with self.subTest(min_age=min_age, max_age=max_age):
+                lookups = Customer.date_of_birth_lookups(min_age, max_age, today)
+
+                expected = [
+                    customer.id
+                    for customer in customers
+                    if (
+                        min_age is None
+                        or customer.age_from_date_of_birth(
+                            customer.date_of_birth, today
+                        )
+                        >= min_age
+                    )
+                    and (
+                        max_age is None
+                        or customer.age_from_date_of_birth(
+                            customer.date_of_birth, today
+                        )
+                        <= max_age
+                    )
+                ]
+
+                self.assertEqual(
+                    list(
+                        Customer.objects.filter(**lookups)
+                        .order_by("id")
+                        .values_list("id", flat=True)
+                    ),
+                    expected,
+                )
+
+
+class PolicyRenderTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.client = Client()
+        self.customer = Customer.objects.create(
+            first_name="Ben",
+            last_name="Stokes",
+            date_of_birth=datetime.date(year=1991, month=6, day=25),
+        )
+
+    def assertRenderedAsSerialized(self, policy_id):
+        """Asserts the stored JSON of a policy is what serializing it from scratch gives"""
+
+        policy = Policy.objects.get(id=policy_id)
+
+        self.assertEqual(
+            bytes(policy.rendered), JsonResponse(policy.serialize()).content
+        )
+
+    def test_policy_is_rendered_on_writes(self):
+        # Floats are rendered as the decimals they are stored as
+        quote = Quote.objects.create(
+            customer=self.customer,
+            cover=20000 * 1.1,
+            premium=200 * 1.5,
+            type=Quote.QuoteType.PERSONAL_ACCIDENT,
+        )
+        policy = Policy.objects.get(quote=quote)
+
+        self.assertRenderedAsSerialized(policy.id)
+
+        self.client.put(
+            "/api/v1/quote/",
+            {"quote_id": quote.id, "status": "accepted"},
+            content_type="application/json",
+        )
+        self.assertRenderedAsSerialized(policy.id)
+
+        self.client.put(
+            "/api/v1/quote/batch/",
+            [{"quote_id": quote.id, "status": "active"}],
+            content_type="application/json",
+        )
+        self.assertRenderedAsSerialized(policy.id)
+        self.assertEqual(
+            json.loads(bytes(Policy.objects.get(id=policy.id).rendered))["state"],
+            "bound",
+        )
+
+        self.customer.first_name = "Benjamin"
+        self.customer.save()
+        self.assertRenderedAsSerialized(policy.id)
+
+        quote.refresh_from_db()
+        quote.premium = 123.456
+        quote.save()
+        self.assertRenderedAsSerialized(policy.id)
+
+    def test_policies_issued_in_bulk_are_rendered(self):
+        response = self.client.post(
+            "/api/v1/quote/batch/",
+            [{"customer_id": self.customer.id, "type": "auto"}] * 3,
+            content_type="application/json",
+        )
+
+        for result in response.json()["results"]:
+            policy = Policy.objects.get(quote__id=result["quote"]["id"])
+
+            self.assertRenderedAsSerialized(policy.id)
+
+    def test_policies_are_served_as_rendered(self):
+        for type in Quote.QuoteType:
+            Quote.objects.create(
+                customer=self.customer, cover=30000 * 1.2, premium=300 * 2, type=type
+            )
+
+        # A policy saved without being rendered is rendered when read
+        Policy.objects.filter(id=2).update(rendered=None)
+
+        policies = list(Policy.objects.filter(customer=self.customer).order_by("id"))
+
+        response = self.client.get(
+            "/api/v1/policies/", data={"customer_id": self.customer.id, "per_page": 2}
+        )
+
+        self.assertEqual(
+            response.content,
+            JsonResponse(
+                {
+                    "next_cursor": policies[2].id,
+                    "policies": [policy.serialize() for policy in policies[:2]],
+                }
+            ).content,
+        )
+
+        for policy in policies:
+            response = self.client.get(f"/api/v1/policies/{policy.id}/")
+
+            self.assertEqual(response.content, JsonResponse(policy.serialize()).content)
+
+
+class PolicyStateHistoryTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.customer = Customer.objects.create(
+            first_name="Ben",
+            last_name="Stokes",
+            date_of_birth=datetime.date(year=1991, month=6, day=25),
+        )
+        quote = Quote.objects.create(
+            customer=self.customer,
+            cover=20000 * 1.1,
+            premium=200 * 1.5,
+            type=Quote.QuoteType.PERSONAL_ACCIDENT,
+        )
+        self.policy = Policy.objects.get(quote=quote)
+
+        # What the entries store in full. The first one records the floats the quote
+        # was priced with
+        self.snapshots = [history.to_json_value(quote.policy_set.get().serialize())]
+        self.snapshots[0]["premium"] = 300.0
+        self.snapshots[0]["cover"] = 22000.0
+        self.snapshots[0]["quote"]["premium"] = 300.0
+        self.snapshots[0]["quote"]["cover"] = 22000.0
+
+        states = [Policy.PolicyState.NEW, Policy.PolicyState.BOUND]
+
+        for number in range(2 * history.KEYFRAME_INTERVAL):
+            if number == history.KEYFRAME_INTERVAL // 2:
+                self.customer.first_name = "Benjamin"
+                self.customer.save()
+
+            policy = Policy.objects.for_serialization().get(id=self.policy.id)
+            policy.state = states[number % 2]
+
+            if number % 3:
+                policy.save()
+            else:
+                Policy.save_state_changes([policy])
+
+            self.snapshots.append(history.to_json_value(policy.serialize()))
+
+    def entries(self):
+        return list(self.policy.policystatehistory_set.order_by("id"))
+
+    def test_snapshots_are_reconstructed(self):
+        entries = self.entries()
+
+        self.assertEqual([entry.snapshot for entry in entries], self.snapshots)
+
+        # Every entry only stores what changed, but for the keyframes
+        for number, entry in enumerate(entries):
+            self.assertEqual(
+                history.is_delta(entry.as_json),
+                number % history.KEYFRAME_INTERVAL != 0,
+            )
+
+        self.assertEqual(entries[2].as_json["changes"], {"state": "bound"})
+
+        # Paging through the history reconstructs the same snapshots
+        dumps = []
+        next_cursor = None
+
+        while True:
+            response = self.client.get(
+                f"/api/v1/policies/{self.policy.id}/history/",
+                data={"per_page": 5, "next_cursor": next_cursor or ""},
+            )
+            dumps += [h["object_json_dump"] for h in response.json()["history"]]
+            next_cursor = response.json()["next_cursor"]
+
+            if next_cursor is None:
+                break
+
+        self.assertEqual(dumps, self.snapshots[::-1])
+
+    def test_migration_compacts_history(self):
+        migration = importlib.import_module(
+            "api.migrations.0010_compact_policy_state_history"
+        )
+        compacted = [entry.as_json for entry in self.entries()]
+
+        migration.expand_history(apps, None)
+
+        self.assertEqual([entry.as_json for entry in self.entries()], self.snapshots)
+
+        migration.compact_history(apps, None)
+
+        self.assertEqual([entry.as_json for entry in self.entries()], compacted)
+
+
+class PolicyStateHistoryArchiveTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.client = Client()
+        customer = Customer.objects.create(
+            first_name="Ben",
+            last_name="Stokes",
+            date_of_birth=datetime.date(year=1991, month=6, day=25),
+        )
+        quote = Quote.objects.create(
+            customer=customer,
+            cover=20000 * 1.1,
+            premium=200 * 1.5,
+            type=Quote.QuoteType.PERSONAL_ACCIDENT,
+        )
+        self.policy = Policy.objects.get(quote=quote)
+
+        for state in ["new", "bound", "new", "bound", "new"]:
+            policy = Policy.objects.for_serialization().get(id=self.policy.id)
+            policy.state = state
+            Policy.save_state_changes([policy])
+
+        # The first four entries are old enough to be archived
+        old = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        entry_ids = list(
+            self.policy.policystatehistory_set.order_by("id").values_list(
+                "id", flat=True
+            )
+        )
+
+        for days, entry_id in enumerate(entry_ids[:4]):
+            PolicyStateHistory.objects.filter(id=entry_id).update(
+                created=old + datetime.timedelta(days=days)
+            )
+
+    def get_history(self):
+        """Returns the pages of the policy's history, and the ETag of the first one"""
+
+        pages = []
+        etag = None
+        next_cursor = ""
+
+        while next_cursor is not None:
+            response = self.client.get(
+                f"/api/v1/policies/{self.policy.id}/history/",
+                data={"per_page": 2, "next_cursor": next_cursor},
+            )
+            etag = etag or response["ETag"]
+            pages.append(response.content)
+            next_cursor = response.json()["next_cursor"] or None
+
+        return pages, etag
+
+    def test_history_is_read_through_archive(self):
+        pages, etag = self.get_history()
+
+        stdout = io.StringIO()
+        call_command("archive_policy_history", stdout=stdout)
+
+        self.assertIn(
+            "Archived 4 state history entries of 1 policies", stdout.getvalue()
+        )
+        self.assertEqual(self.policy.policystatehistory_set.count(), 2)
+        self.assertEqual(PolicyStateHistoryArchive.objects.count(), 1)
+
+        # The entries left behind do not depend on archived ones
+        entries = list(self.policy.policystatehistory_set.order_by("id"))
+
+        self.assertFalse(history.is_delta(entries[0].as_json))
+        self.assertTrue(history.is_delta(entries[1].as_json))
+
+        # Paging through the history (archived entries included) gives the same responses
+        self.assertEqual(self.get_history(), (pages, etag))
+
+        # Entries keep being recorded after the archived ones
+        policy = Policy.objects.for_serialization().get(id=self.policy.id)
+        policy.state = "bound"
+        Policy.save_state_changes([policy])
+
+        response = self.client.get(f"/api/v1/policies/{self.policy.id}/history/")
+
+        self.assertEqual(len(response.json()["history"]), 7)
+        self.assertEqual(
+            response.json()["history"][0]["object_json_dump"],
+            history.to_json_value(policy.serialize()),
+        )
+
+
+class RerateTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.client = Client()
+        customer = Customer.objects.create(
+            first_name="Ben",
+            last_name="Stokes",
+            date_of_birth=datetime.date(year=1960, month=6, day=25),
+        )
+
+        for type in ["auto", "auto", "personal-accident", "homeowner-insurance"]:
+            self.client.post(
+                "/api/v1/quote/",
+                {"customer_id": customer.id, "type": type},
+                content_type="application/json",
+            )
+
+        self.policies = list(Policy.objects.order_by("id"))
+
+        for status in ["accepted", "active"]:
+            self.client.put(
+                "/api/v1/quote/",
+                {"quote_id": self.policies[-1].quote_id, "status": status},
+                content_type="application/json",
+            )
+
+        with open(settings.QUOTE_RATES_FILE) as file:
+            self.rates = json.load(file)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.rates_file = os.path.join(directory.name, "rates.json")
+        self.checkpoint = os.path.join(directory.name, "checkpoint.json")
+
+    def rerate(self, premium, *args):
+        """Reprices the policies with the auto premium changed"""
+
+        self.rates["types"]["auto"]["premium"] = premium
+
+        with open(self.rates_file, "w") as file:
+            json.dump(self.rates, file)
+
+        stdout = io.StringIO()
+
+        with self.settings(QUOTE_RATES_FILE=self.rates_file):
+            call_command(
+                "rerate_policies",
+                "--workers=2",
+                "--chunk-size=1",
+                f"--checkpoint={self.checkpoint}",
+                *args,
+                stdout=stdout,
+            )
+
+        return stdout.getvalue()
+
+    def test_rerate(self):
+        auto_ids = [self.policies[0].id, self.policies[1].id]
+
+        output = self.rerate("400", "--dry-run")
+
+        self.assertIn(
+            f"policy {auto_ids[0]}: cover 21000.00 -> 21000.00, "
+            "premium 300.00 -> 400.00",
+            output,
+        )
+        self.assertIn("Would reprice 2 of 3 open policies", output)
+        self.assertEqual(Policy.objects.get(id=auto_ids[0]).premium, 300)
+
+        output = self.rerate("400")
+
+        self.assertIn("Repriced 2 of 3 open policies", output)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        for policy in Policy.objects.filter(id__in=auto_ids):
+            self.assertEqual(policy.premium, 400)
+            self.assertEqual(policy.quote.premium, 400)
+            self.assertEqual(
+                json.loads(bytes(policy.rendered))["quote"]["premium"], "400.00"
+            )
+
+            entry = policy.policystatehistory_set.order_by("-id").first()
+
+            self.assertEqual(
+                entry.as_json["changes"],
+                {"premium": "400.00", "quote.premium": "400.00"},
+            )
+
+        # The bound policy keeps its price
+        self.assertEqual(Policy.objects.get(id=self.policies[-1].id).premium, 400)
+
+        # A run resumes after the last policy it checkpointed
+        with open(self.checkpoint, "w") as file:
+            json.dump({"after": auto_ids[0]}, file)
+
+        output = self.rerate("500")
+
+        self.assertIn(f"Resuming after policy {auto_ids[0]}", output)
+        self.assertIn("Repriced 1 of 2 open policies", output)
+        self.assertEqual(Policy.objects.get(id=auto_ids[0]).premium, 400)
+        self.assertEqual(Policy.objects.get(id=auto_ids[1]).premium, 500)
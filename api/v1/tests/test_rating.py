@@ -0,0 +1,166 @@
+import decimal
+import json
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from api.v1 import rating
+
+RATES = {
+    "types": {
+        "auto": {"cover": "30000", "premium": "300.10"},
+        "personal-accident": {"cover": "20000.05", "premium": "199.99"},
+        "homeowner-insurance": {"cover": "40000", "premium": "400"},
+    },
+    "age_bands": [
+        {"below": 25, "cover": "1.2", "premium": "2"},
+        {"below": 50, "cover": "1.1", "premium": "1.5"},
+        {"below": None, "cover": "0.7", "premium": "1"},
+    ],
+}
+
+
+class RateTableTestCase(SimpleTestCase):
+    def test_price(self):
+        rate_table = rating.RateTable(RATES)
+
+        for age, cover, premium in [
+            (-1, "36000.00", "600.20"),
+            (24, "36000.00", "600.20"),
+            (25, "33000.00", "450.15"),
+            (49, "33000.00", "450.15"),
+            (50, "21000.00", "300.10"),
+            (120, "21000.00", "300.10"),
+        ]:
+            self.assertEqual(
+                rate_table.price("auto", age),
+                (decimal.Decimal(cover), decimal.Decimal(premium)),
+            )
+
+        with self.assertRaises(KeyError):
+            rate_table.price("life", 30)
+
+    def assertPricedManyAsOne(self, rate_table):
+        rng = random.Random(42)
+        quote_types = [rng.choice(["auto", "personal-accident"]) for _ in range(500)]
+        ages = [rng.randrange(-5, 100) for _ in range(500)]
+
+        covers, premiums = rate_table.price_many(quote_types, ages)
+
+        self.assertEqual(
+            [
+                (decimal.Decimal(cover) / 100, decimal.Decimal(premium) / 100)
+                for cover, premium in zip(covers, premiums)
+            ],
+            [rate_table.price(*quote) for quote in zip(quote_types, ages)],
+        )
+
+        with self.assertRaises(KeyError):
+            rate_table.price_many(["auto", "life"], [30, 30])
+
+    @unittest.skipUnless(rating.numpy, "NumPy is not installed")
+    def test_price_many(self):
+        self.assertPricedManyAsOne(rating.RateTable(RATES))
+
+    def test_price_many_without_numpy(self):
+        with mock.patch.object(rating, "numpy", None):
+            self.assertPricedManyAsOne(rating.RateTable(RATES))
+
+    def test_invalid_rates(self):
+        for age_bands in [
+            [{"below": 25, "cover": "1", "premium": "1"}],
+            [
+                {"below": 50, "cover": "1", "premium": "1"},
+                {"below": 25, "cover": "1", "premium": "1"},
+                {"below": None, "cover": "1", "premium": "1"},
+            ],
+            [{"below": None, "cover": "one", "premium": "1"}],
+        ]:
+            with self.assertRaises(ValueError):
+                rating.RateTable({**RATES, "age_bands": age_bands})
+
+    def test_quote_types(self):
+        types = RATES["types"]
+
+        # Every quote type is priced, and only those
+        for rates_types in [
+            {"auto": types["auto"]},
+            {**types, "life": types["auto"]},
+        ]:
+            with self.assertRaises(ValueError):
+                rating.RateTable({**RATES, "types": rates_types})
+
+        rate_table = rating.RateTable(
+            {**RATES, "types": {"auto": types["auto"]}}, quote_types=["auto"]
+        )
+
+        self.assertEqual(rate_table.prices.keys(), {"auto"})
+
+
+class RateTableReloadTestCase(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.path = os.path.join(directory.name, "rates.json")
+        self.write_rates(RATES)
+
+        # Check for changes on every call
+        for name, value in [("RELOAD_INTERVAL", 0), ("_rate_table", None)]:
+            patcher = mock.patch.object(rating, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        settings_override = override_settings(QUOTE_RATES_FILE=self.path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write_rates(self, rates):
+        with open(self.path, "w") as file:
+            file.write(rates if isinstance(rates, str) else json.dumps(rates))
+
+        # Make the change visible even on filesystems with a coarse mtime
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_rates_are_reloaded(self):
+        rate_table = rating.get_rate_table()
+
+        self.assertIs(rating.get_rate_table(), rate_table)
+        self.assertEqual(rate_table.price("auto", 30)[1], decimal.Decimal("450.15"))
+
+        self.write_rates(
+            {
+                **RATES,
+                "types": {
+                    **RATES["types"],
+                    "auto": {"cover": "30000", "premium": "400"},
+                },
+            }
+        )
+
+        self.assertEqual(
+            rating.get_rate_table().price("auto", 30)[1], decimal.Decimal("600.00")
+        )
+
+        # An invalid file (such as one being written) keeps the rates loaded
+        with self.assertLogs(rating.logger, "ERROR"):
+            self.write_rates("{")
+
+            self.assertEqual(
+                rating.get_rate_table().price("auto", 30)[1], decimal.Decimal("600.00")
+            )
+
+        # As do tables missing a quote type
+        with self.assertLogs(rating.logger, "ERROR"):
+            self.write_rates(
+                {**RATES, "types": {"auto": {"cover": "30000", "premium": "500"}}}
+            )
+
+            self.assertEqual(
+                rating.get_rate_table().price("auto", 30)[1], decimal.Decimal("600.00")
+            )
@@ -0,0 +1,145 @@
+import datetime
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import TestCase, override_settings
+
+from api import rendering
+from api.models import Customer, Policy, Quote, share_customers
+
+
+def django_dumps(payload) -> bytes:
+    return json.dumps(payload, cls=DjangoJSONEncoder).encode()
+
+
+class RenderingTestCase(TestCase):
+    """The encoders render byte for byte as DjangoJSONEncoder does for serialize()"""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name="Zoë",
+            last_name="Doe",
+            date_of_birth=datetime.date(year=2000, month=1, day=1),
+        )
+        Quote.objects.create(
+            customer=self.customer,
+            cover=Decimal("20000.50"),
+            premium=Decimal("200.00"),
+            type=Quote.QuoteType.AUTO_INSURANCE,
+        )
+        self.policy = Policy.objects.for_serialization().get(customer=self.customer)
+        share_customers([self.policy])
+
+    def test_customer(self):
+        for date_of_birth in (
+            datetime.date(2000, 1, 1),
+            datetime.date(1999, 12, 31),
+            datetime.date(999, 3, 4),
+        ):
+            self.customer.date_of_birth = date_of_birth
+
+            self.assertEqual(
+                rendering.dumps(rendering.encode_customer(self.customer)),
+                django_dumps(self.customer.serialize()),
+            )
+
+    def test_quote(self):
+        self.assertEqual(
+            rendering.dumps(rendering.encode_quote(self.policy.quote)),
+            django_dumps(self.policy.quote.serialize()),
+        )
+
+    def test_policy(self):
+        self.assertEqual(
+            rendering.dumps(rendering.encode_policy(self.policy)),
+            django_dumps(self.policy.serialize()),
+        )
+
+        # The quote's customer is not shared
+        self.policy.quote.customer = Customer.objects.get(id=self.customer.id)
+
+        self.assertEqual(
+            rendering.dumps(rendering.encode_policy(self.policy)),
+            django_dumps(self.policy.serialize()),
+        )
+
+    def test_history(self):
+        entries = list(self.policy.policystatehistory_set.order_by("-id"))
+
+        utc = datetime.timezone.utc
+        est = datetime.timezone(-datetime.timedelta(hours=5))
+
+        for created in (
+            datetime.datetime(2024, 5, 6, 7, 8, 9, tzinfo=utc),
+            datetime.datetime(2024, 5, 6, 7, 8, 9, 123456, tzinfo=utc),
+            datetime.datetime(2024, 5, 6, 7, 8, 9, 1000, tzinfo=est),
+        ):
+            entries[0].created = created
+
+            self.assertEqual(
+                rendering.dumps(
+                    rendering.encode_history(
+                        entries, rendering.encode_policy(self.policy)
+                    )
+                ),
+                django_dumps([entry.serialize() for entry in entries]),
+            )
+
+    def test_rows(self):
+        self.assertEqual(
+            rendering.encode_customer_row(
+                Customer.objects.values_list(*rendering.CUSTOMER_COLUMNS).get(
+                    id=self.customer.id
+                )
+            ),
+            rendering.encode_customer(self.customer),
+        )
+
+        row = Policy.objects.values_list(*rendering.POLICY_COLUMNS).get(
+            id=self.policy.id
+        )
+
+        self.assertEqual(
+            rendering.dumps(rendering.encode_policy_row(row)), self.policy.render()
+        )
+
+    def test_row_with_another_quote_customer(self):
+        other = Customer.objects.create(
+            first_name="Jane", last_name="Doe", date_of_birth=datetime.date(1990, 1, 1)
+        )
+        Quote.objects.filter(id=self.policy.quote_id).update(customer=other)
+        policy = Policy.objects.for_serialization().get(id=self.policy.id)
+
+        row = Policy.objects.values_list(*rendering.POLICY_COLUMNS).get(
+            id=self.policy.id
+        )
+
+        self.assertEqual(
+            rendering.dumps(
+                rendering.encode_policy_row(
+                    row, {other.id: rendering.encode_customer(other)}
+                )
+            ),
+            policy.render(),
+        )
+
+    def test_json_response(self):
+        response = rendering.json_response({"a": 1}, status=201)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.content, b'{"a": 1}')
+
+    @override_settings(API_FAST_JSON=True)
+    def test_orjson(self):
+        payload = rendering.encode_policy(self.policy)
+
+        if rendering.orjson is not None:
+            self.assertNotEqual(rendering.dumps(payload), django_dumps(payload))
+            self.assertEqual(json.loads(rendering.dumps(payload)), payload)
+
+        # Without orjson, the setting has no effect
+        with mock.patch.object(rendering, "orjson", None):
+            self.assertEqual(rendering.dumps(payload), django_dumps(payload))
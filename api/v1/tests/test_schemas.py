@@ -0,0 +1,96 @@
+from django.test import SimpleTestCase
+
+from api.v1 import schemas
+from api.v1.forms import CustomerCreationForm, QuoteCreationForm, QuoteUpdateForm
+
+
+class SchemaTestCase(SimpleTestCase):
+    """The schemas clean and reject payloads as the forms they stand in for"""
+
+    def assertSameAsForm(self, schema, form_class, payloads):
+        for payload in payloads:
+            with self.subTest(payload=payload):
+                form = form_class(payload)
+                cleaned_data, errors = schema.validate(payload)
+
+                self.assertEqual(errors, form.errors.get_json_data())
+
+                if not errors:
+                    self.assertEqual(
+                        cleaned_data,
+                        {name: form.cleaned_data[name] for name in cleaned_data},
+                    )
+
+    def test_customer_creation(self):
+        valid = {"first_name": "Ben", "last_name": "Stokes", "dob": "25-06-1991"}
+
+        self.assertSameAsForm(
+            schemas.CUSTOMER_CREATION,
+            CustomerCreationForm,
+            [
+                valid,
+                {},
+                {**valid, "extra": 1},
+                {**valid, "first_name": "  Ben  "},
+                {**valid, "first_name": "   "},
+                {**valid, "first_name": None},
+                {**valid, "first_name": []},
+                {**valid, "first_name": 12},
+                {**valid, "last_name": "x" * 50},
+                {**valid, "last_name": "x" * 51},
+                {**valid, "last_name": "x" * 51 + "\x00"},
+                {**valid, "dob": "1-6-1991"},
+                {**valid, "dob": " 25-06-1991 "},
+                {**valid, "dob": "31-02-1991"},
+                {**valid, "dob": "1991-06-25"},
+                {**valid, "dob": "25/06/1991"},
+                {**valid, "dob": ""},
+            ],
+        )
+
+    def test_non_string_date_of_birth(self):
+        # The form raises an AttributeError for these
+        for dob in (19910625, ["25-06-1991"]):
+            _, errors = schemas.CUSTOMER_CREATION.validate(
+                {"first_name": "Ben", "last_name": "Stokes", "dob": dob}
+            )
+
+            self.assertEqual(
+                errors, {"dob": [{"message": "Enter a valid date.", "code": "invalid"}]}
+            )
+
+    def test_quote_creation(self):
+        self.assertSameAsForm(
+            schemas.QUOTE_CREATION,
+            QuoteCreationForm,
+            [
+                {"customer_id": 1, "type": "auto"},
+                {},
+                {"customer_id": "1", "type": "auto"},
+                {"customer_id": " 7 ", "type": "auto"},
+                {"customer_id": 1.0, "type": "auto"},
+                {"customer_id": "2.00", "type": "auto"},
+                {"customer_id": 1.5, "type": "auto"},
+                {"customer_id": True, "type": "auto"},
+                {"customer_id": "one", "type": "auto"},
+                {"customer_id": [1], "type": "auto"},
+                {"customer_id": 1, "type": "boat"},
+                {"customer_id": 1, "type": 3},
+                {"customer_id": 1, "type": ""},
+                {"customer_id": 1, "type": None},
+            ],
+        )
+
+    def test_quote_update(self):
+        self.assertSameAsForm(
+            schemas.QUOTE_UPDATE,
+            QuoteUpdateForm,
+            [
+                {"quote_id": 1, "status": "accepted"},
+                {"quote_id": 1, "status": "rejected"},
+                {"quote_id": 1, "status": "paid"},
+                {"quote_id": 1},
+                {"status": "active"},
+                {"quote_id": "x", "status": "x"},
+            ],
+        )
@@ -1,9 +1,23 @@
 import datetime
-
-from django.test import Client, TestCase
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse_lazy
+from django.utils import timezone
 
+from api import exports
 from api.models import Customer, Policy, Quote
+from api.v1 import rating, services
+from api.v1.forms import calculate_quote_price
 
 
 class CustomerTestCase(TestCase):
@@ -62,6 +76,82 @@ class CustomerTestCase(TestCase):
         self.assertEqual(response.status_code, 422)
         self.assertEqual(response.json()["detail"]["dob"][0]["code"], "invalid")
 
+        # Not an object
+        response = self.client.post(
+            self.create_customer_url,
+            [{"first_name": "Ben", "last_name": "Stokes", "dob": "25-06-1991"}],
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()["detail"], "request body must be an object")
+
+    def test_create_customers_in_bulk(self):
+        items = [
+            {"first_name": "Ben", "last_name": "Stokes", "dob": "25-06-1991"},
+            {"first_name": "", "last_name": "Stokes", "dob": "25-06-1991"},
+            {"first_name": "Joe", "last_name": "Root", "dob": "1990/12/30"},
+            {"first_name": "Jos", "last_name": "Buttler", "dob": "08-09-1990"},
+        ]
+
+        response = self.client.post(
+            reverse_lazy("api:v1:create-customer-batch"),
+            items,
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+        results = response.json()["results"]
+
+        self.assertEqual([result["index"] for result in results], [0, 1, 2, 3])
+        self.assertEqual([result["status"] for result in results], [201, 422, 422, 201])
+        self.assertEqual(results[1]["detail"]["first_name"][0]["code"], "required")
+        self.assertEqual(results[2]["detail"]["dob"][0]["code"], "invalid")
+
+        for index in (0, 3):
+            customer = results[index]["customer"]
+
+            self.assertTrue(Customer.objects.filter(id=customer["id"]).exists())
+
+            for key in items[index]:
+                self.assertEqual(customer[key], items[index][key])
+
+    def test_create_customers_in_bulk_from_ndjson(self):
+        items = [
+            {"first_name": f"Customer {i}", "last_name": "Doe", "dob": "01-01-1990"}
+            for i in range(25)
+        ]
+
+        # Validation is done per item, but the inserts are not
+        with self.assertNumQueries(3):
+            response = self.client.post(
+                reverse_lazy("api:v1:create-customer-batch"),
+                "\n".join(json.dumps(item) for item in items),
+                content_type="application/x-ndjson",
+            )
+
+        self.assertEqual(response.status_code, 200)
+
+        results = response.json()["results"]
+
+        self.assertEqual(len(results), 25)
+        self.assertTrue(all(result["status"] == 201 for result in results))
+        self.assertEqual(Customer.objects.filter(last_name="Doe").count(), 26)
+
+    def test_create_customers_in_bulk_with_malformed_body(self):
+        url = reverse_lazy("api:v1:create-customer-batch")
+
+        response = self.client.post(url, {"first_name": "Ben"}, "application/json")
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()["detail"], "request body must be an array")
+
+        response = self.client.post(url, '{"a": 1}\n{', "application/x-ndjson")
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(
+            response.json()["detail"], "line 2 of the request body is malformed"
+        )
+
     def test_search_customers(self):
         response = self.client.get("/api/v1/customers/?first_name=John&last_name=Doe")
 
@@ -104,6 +194,161 @@ class CustomerTestCase(TestCase):
         response = self.client.get("/api/v1/customers/?policy_type=something")
         self.assertEqual(response.status_code, 422)
 
+    def test_search_customers_by_policy_type_without_join(self):
+        # Customers with many policies of the same type are found once
+        for _ in range(3):
+            Quote.objects.create(
+                customer=self.customer,
+                cover=20000,
+                premium=200,
+                type=Quote.QuoteType.AUTO_INSURANCE,
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/api/v1/customers/", data={"policy_type": "auto", "per_page": 100}
+            )
+
+        self.assertEqual(
+            [customer["id"] for customer in response.json()["customers"]],
+            [self.customer.id],
+        )
+
+        for query in queries:
+            self.assertNotIn("DISTINCT", query["sql"])
+            self.assertNotIn('"policies"', query["sql"])
+
+    def test_search_customers_by_age(self):
+        today = datetime.date.today()
+
+        # Customers born around the boundaries of 25 and 49 years old
+        for days in (24 * 365, 25 * 365 - 1, 25 * 365, 50 * 365 - 1, 50 * 365):
+            Customer.objects.create(
+                first_name="Jane",
+                last_name="Doe",
+                date_of_birth=today - datetime.timedelta(days=days),
+            )
+
+        def ages(response):
+            return sorted(
+                Customer.age_from_date_of_birth(
+                    datetime.datetime.strptime(customer["dob"], "%d-%m-%Y").date()
+                )
+                for customer in response.json()["customers"]
+            )
+
+        response = self.client.get(
+            "/api/v1/customers/",
+            data={"min_age": 25, "max_age": 49, "first_name": "Jane"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ages(response), [25, 49])
+
+        response = self.client.get(
+            "/api/v1/customers/", data={"max_age": 24, "first_name": "Jane"}
+        )
+        self.assertEqual(ages(response), [24, 24])
+
+        response = self.client.get(
+            "/api/v1/customers/", data={"min_age": 50, "first_name": "Jane"}
+        )
+        self.assertEqual(ages(response), [50])
+
+        for query, detail in [
+            ({"min_age": "a"}, "min_age must be a non-negative integer"),
+            ({"max_age": "-1"}, "max_age must be a non-negative integer"),
+            ({"min_age": "10000"}, "min_age must not be greater than 150"),
+            ({"max_age": "99999999999"}, "max_age must not be greater than 150"),
+            (
+                {"min_age": 30, "max_age": 20},
+                "min_age must not be greater than max_age",
+            ),
+        ]:
+            response = self.client.get("/api/v1/customers/", data=query)
+
+            self.assertEqual(response.status_code, 422)
+            self.assertEqual(response.json()["detail"], detail)
+
+    def test_search_customers_by_cursor(self):
+        for i in range(4):
+            Customer.objects.create(
+                first_name=f"John {i}",
+                last_name="Smith",
+                date_of_birth=datetime.date(year=1990, month=1, day=1),
+            )
+
+        response = self.client.get(
+            "/api/v1/customers/",
+            data={"pagination": "cursor", "per_page": 2, "first_name": "John"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["customers"]), 2)
+        self.assertIsNotNone(response.json()["next_cursor"])
+
+        ids = [customer["id"] for customer in response.json()["customers"]]
+        next_cursor = response.json()["next_cursor"]
+
+        while next_cursor is not None:
+            with CaptureQueriesContext(connection) as queries:
+                # The filters come from the cursor, not from the query parameters
+                response = self.client.get(
+                    "/api/v1/customers/",
+                    data={"cursor": next_cursor, "per_page": 2, "first_name": "Ben"},
+                )
+
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+
+            ids += [customer["id"] for customer in response.json()["customers"]]
+            next_cursor = response.json()["next_cursor"]
+
+        self.assertEqual(
+            ids,
+            list(
+                Customer.objects.filter(first_name__startswith="John")
+                .order_by("id")
+                .values_list("id", flat=True)
+            ),
+        )
+
+    def test_search_customers_by_cursor_with_estimated_total(self):
+        url = "/api/v1/customers/"
+        query = {"pagination": "cursor", "include_total": "true"}
+
+        response = self.client.get(url, data=query)
+        self.assertIsNone(response.json()["estimated_total"])
+
+        call_command("refresh_table_statistics", stdout=StringIO())
+
+        response = self.client.get(url, data=query)
+        self.assertEqual(response.json()["estimated_total"], 1)
+
+        # The estimate is for the whole table, so it is not given for filtered results
+        response = self.client.get(url, data={**query, "last_name": "Doe"})
+        self.assertIsNone(response.json()["estimated_total"])
+
+    def test_search_customers_with_invalid_cursor(self):
+        for cursor in ("not-a-cursor", "eyJhZnRlciI6ICIxIn0="):
+            response = self.client.get("/api/v1/customers/", data={"cursor": cursor})
+
+            self.assertEqual(response.status_code, 422)
+            self.assertEqual(response.json()["detail"], "invalid cursor")
+
+    def test_search_customers_total_pages(self):
+        for i in range(4):
+            Customer.objects.create(
+                first_name=f"John {i}",
+                last_name="Smith",
+                date_of_birth=datetime.date(year=1990, month=1, day=1),
+            )
+
+        response = self.client.get("/api/v1/customers/", data={"per_page": 2})
+
+        self.assertEqual(response.json()["total_pages"], 3)
+        self.assertEqual(response.json()["next_page"], 2)
+
 
 class QuoteTestCase(TestCase):
     def setUp(self):
@@ -140,15 +385,15 @@ class QuoteTestCase(TestCase):
         self.assertEqual(response.json()["customer"]["id"], self.customer.id)
 
         # According to the assumption made, people within the ages of 25 and 50 get their
-        # cover multiplied by 1.1 and premium by 1.5
-        # See :method:`api.v1.forms.QuoteCreationForm.save`
-        self.assertEqual(response.json()["cover"], 20000 * 1.1)
-        self.assertEqual(response.json()["premium"], 200 * 1.5)
+        # cover multiplied by 1.1 and premium by 1.5. Amounts are exact decimals
+        # See: api/v1/rates.json
+        self.assertEqual(response.json()["cover"], "22000.00")
+        self.assertEqual(response.json()["premium"], "300.00")
 
         customer_under_25 = Customer.objects.create(
             first_name="John",
             last_name="Doe",
-            date_of_birth=datetime.date(year=2000, month=1, day=1),
+            date_of_birth=datetime.date.today() - datetime.timedelta(days=20 * 365),
         )
 
         response = self.client.post(
@@ -161,8 +406,8 @@ class QuoteTestCase(TestCase):
         )
 
         # People below age 25 get their cover multiplied by 1.2 and premium by 2
-        self.assertEqual(response.json()["cover"], 30000 * 1.2)
-        self.assertEqual(response.json()["premium"], 300 * 2)
+        self.assertEqual(response.json()["cover"], "36000.00")
+        self.assertEqual(response.json()["premium"], "600.00")
 
         customer_over_50 = Customer.objects.create(
             first_name="John",
@@ -180,8 +425,222 @@ class QuoteTestCase(TestCase):
         )
 
         # People above age 50 get their cover multiplied by 0.7 and premium does not change
-        self.assertEqual(response.json()["cover"], 40000 * 0.7)
-        self.assertEqual(response.json()["premium"], 400)
+        self.assertEqual(response.json()["cover"], "28000.00")
+        self.assertEqual(response.json()["premium"], "400.00")
+
+    def test_preview_quotes(self):
+        quote_count = Quote.objects.count()
+        items = [
+            {"customer_id": self.customer.id, "type": "auto"},
+            {"dob": "01-01-1950", "type": "personal-accident"},
+            {"dob": "1950-01-01", "type": "auto"},
+            {"customer_id": 9999, "type": "auto"},
+            {"type": "something-something", "customer_id": "1"},
+            {"type": "auto"},
+        ]
+
+        # Only the customers are read
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                reverse_lazy("api:v1:quotes-preview"),
+                items,
+                content_type="application/json",
+            )
+
+        results = response.json()["results"]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result["status"] for result in results], [200, 200, 422, 404, 422, 422]
+        )
+
+        cover, premium = calculate_quote_price("auto", self.customer.date_of_birth)
+
+        self.assertEqual(results[0]["cover"], str(cover))
+        self.assertEqual(results[0]["premium"], str(premium))
+        self.assertEqual(results[1]["cover"], "14000.00")
+        self.assertEqual(results[1]["premium"], "200.00")
+        self.assertEqual(results[2]["detail"]["dob"][0]["code"], "invalid")
+        self.assertEqual(
+            set(results[4]["detail"]), {"type", "customer_id"}, results[4]["detail"]
+        )
+        self.assertEqual(results[5]["detail"]["__all__"][0]["code"], "required")
+
+        # Nothing is created
+        self.assertEqual(Quote.objects.count(), quote_count)
+
+    def test_create_quotes_in_bulk(self):
+        items = [
+            {"customer_id": self.customer.id, "type": "auto"},
+            {"customer_id": self.customer.id, "type": "something-something"},
+            {"customer_id": 9999, "type": "auto"},
+            {"customer_id": self.customer.id, "type": "homeowner-insurance"},
+        ]
+
+        response = self.client.post(
+            "/api/v1/quote/batch/", items, content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+        results = response.json()["results"]
+
+        self.assertEqual([result["status"] for result in results], [201, 422, 404, 201])
+        self.assertEqual(results[1]["detail"]["type"][0]["code"], "invalid_choice")
+        self.assertEqual(results[2]["detail"], "customer not found")
+
+        single_response = self.client.post(
+            "/api/v1/quote/",
+            {"customer_id": self.customer.id, "type": "auto"},
+            content_type="application/json",
+        )
+
+        # Quotes issued in bulk are priced the same way as a single quote
+        bulk_quote = results[0]["quote"]
+        single_quote = single_response.json()
+
+        for key in ("type", "status", "cover", "premium", "customer"):
+            self.assertEqual(bulk_quote[key], single_quote[key])
+
+        # and get the same policy and state history
+        bulk_policy = Policy.objects.get(quote__id=bulk_quote["id"])
+        single_policy = Policy.objects.get(quote__id=single_quote["id"])
+
+        for policy in (bulk_policy, single_policy):
+            self.assertEqual(policy.state, Policy.PolicyState.QUOTED)
+            self.assertEqual(policy.customer_id, self.customer.id)
+
+            history = list(policy.policystatehistory_set.all())
+
+            self.assertEqual(len(history), 1)
+            self.assertEqual(history[0].state, Policy.PolicyState.QUOTED)
+
+        bulk_json = bulk_policy.policystatehistory_set.get().snapshot
+        single_json = single_policy.policystatehistory_set.get().snapshot
+
+        self.assertEqual(bulk_json["quote"]["id"], bulk_quote["id"])
+
+        for key in ("type", "state", "cover", "premium", "customer"):
+            self.assertEqual(bulk_json[key], single_json[key])
+
+    def test_create_quotes_in_bulk_query_count(self):
+        for size in (1, 50):
+            items = [
+                {"customer_id": self.customer.id, "type": "auto"} for _ in range(size)
+            ]
+
+            # A customer lookup, an insert per table (quotes, policies, history and
+            # customer policy types) and an update of the rendered policies, wrapped in
+            # a savepoint
+            with self.assertNumQueries(8):
+                response = self.client.post(
+                    "/api/v1/quote/batch/", items, content_type="application/json"
+                )
+
+            self.assertEqual(len(response.json()["results"]), size)
+
+    def test_create_quotes_in_bulk_gets_the_rates_once(self):
+        items = [{"customer_id": self.customer.id, "type": "auto"} for _ in range(10)]
+        get_rate_table = mock.Mock(wraps=rating.get_rate_table)
+
+        with (
+            mock.patch.object(rating, "get_rate_table", get_rate_table),
+            mock.patch.object(services, "get_rate_table", get_rate_table),
+        ):
+            response = self.client.post(
+                "/api/v1/quote/batch/", items, content_type="application/json"
+            )
+
+        self.assertEqual(len(response.json()["results"]), 10)
+        get_rate_table.assert_called_once_with()
+
+    def test_update_quotes_in_bulk(self):
+        accepted_quote = Quote.objects.create(
+            customer=self.customer,
+            cover=30000,
+            premium=300,
+            status=Quote.QuoteStatus.ACCEPTED,
+            type=Quote.QuoteType.AUTO_INSURANCE,
+        )
+
+        items = [
+            {"quote_id": self.quote.id, "status": "accepted"},
+            {"quote_id": accepted_quote.id, "status": "active"},
+            {"quote_id": self.quote.id, "status": "accepted"},
+            {"quote_id": self.quote.id, "status": "new"},
+            {"quote_id": 99999, "status": "accepted"},
+            {"quote_id": self.quote.id, "status": "something"},
+            {"quote_id": self.quote.id, "status": "active"},
+        ]
+
+        response = self.client.put(
+            "/api/v1/quote/batch/", items, content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+        results = response.json()["results"]
+
+        self.assertEqual(
+            [result["outcome"] for result in results],
+            [
+                "applied",
+                "applied",
+                "no-op",
+                "invalid transition",
+                "not found",
+                "invalid",
+                "applied",
+            ],
+        )
+        self.assertEqual(results[5]["detail"]["status"][0]["code"], "invalid_choice")
+        self.assertEqual(results[0]["quote"]["status"], "active")
+        self.assertEqual(results[1]["quote"]["status"], "active")
+
+        self.quote.refresh_from_db()
+        self.assertEqual(self.quote.status, Quote.QuoteStatus.ACTIVE)
+
+        # Every transition of the policy is recorded once, in order
+        policy = Policy.objects.get(quote__id=self.quote.id)
+        history = list(policy.policystatehistory_set.order_by("id"))
+
+        self.assertEqual(policy.state, Policy.PolicyState.BOUND)
+        self.assertEqual([h.state for h in history], ["quoted", "new", "bound"])
+        self.assertEqual(history[1].snapshot["quote"]["status"], "accepted")
+        self.assertEqual(history[2].snapshot["quote"]["status"], "active")
+
+        policy = Policy.objects.get(quote__id=accepted_quote.id)
+
+        self.assertEqual(policy.state, Policy.PolicyState.BOUND)
+        self.assertEqual(
+            list(policy.policystatehistory_set.values_list("state", flat=True)),
+            ["quoted", "bound"],
+        )
+
+    def test_update_quotes_in_bulk_query_count(self):
+        quotes = [
+            Quote.objects.create(
+                customer=self.customer,
+                cover=30000,
+                premium=300,
+                type=Quote.QuoteType.AUTO_INSURANCE,
+            )
+            for _ in range(20)
+        ]
+
+        items = [{"quote_id": quote.id, "status": "accepted"} for quote in quotes]
+        items += [{"quote_id": quote.id, "status": "active"} for quote in quotes]
+
+        # The quotes are fetched once, then each transition takes five statements
+        # (including the history entries the new ones follow), wrapped in a savepoint
+        with self.assertNumQueries(13):
+            response = self.client.put(
+                "/api/v1/quote/batch/", items, content_type="application/json"
+            )
+
+        self.assertTrue(
+            all(result["outcome"] == "applied" for result in response.json()["results"])
+        )
 
     def test_create_quote_with_invalid_type(self):
         response = self.client.post(
@@ -235,6 +694,30 @@ class QuoteTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()["status"], "active")
 
+    def test_update_quote_query_count(self):
+        # The conditional updates of the quote and policy, the policy (with its quote and
+        # customer) for the response, and the previous and new history entries, wrapped
+        # in a savepoint
+        with self.assertNumQueries(7):
+            response = self.client.put(
+                "/api/v1/quote/",
+                {"quote_id": self.quote.id, "status": "accepted"},
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.json()["status"], "accepted")
+        self.assertEqual(response.json()["customer"]["id"], self.customer.id)
+
+        # There is no transition to the new status, so only the quote is fetched
+        with self.assertNumQueries(3):
+            response = self.client.put(
+                "/api/v1/quote/",
+                {"quote_id": self.quote.id, "status": "new"},
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.json()["status"], "accepted")
+
     def test_update_nonexistent_quote(self):
         response = self.client.put(
             f"/api/v1/quote/",
@@ -259,10 +742,76 @@ class QuoteTestCase(TestCase):
         )
 
 
+class QuoteConcurrencyTestCase(TransactionTestCase):
+    threads = 8
+    rounds = 10
+
+    def put_concurrently(self, quote, status):
+        """Sends the same status update from many threads at once"""
+
+        barrier = threading.Barrier(self.threads)
+
+        def put():
+            barrier.wait()
+
+            try:
+                return Client().put(
+                    "/api/v1/quote/",
+                    {"quote_id": quote.id, "status": status},
+                    content_type="application/json",
+                )
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            futures = [executor.submit(put) for _ in range(self.threads)]
+
+        return [future.result() for future in futures]
+
+    def test_concurrent_status_updates(self):
+        customer = Customer.objects.create(
+            first_name="Ben",
+            last_name="Stokes",
+            date_of_birth=datetime.date(year=1991, month=6, day=25),
+        )
+
+        for _ in range(self.rounds):
+            quote = Quote.objects.create(
+                customer=customer,
+                cover=20000,
+                premium=200,
+                type=Quote.QuoteType.PERSONAL_ACCIDENT,
+            )
+
+            for status in ("accepted", "active"):
+                responses = self.put_concurrently(quote, status)
+
+                for response in responses:
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.json()["status"], status)
+
+            policy = Policy.objects.get(quote__id=quote.id)
+
+            self.assertEqual(policy.state, Policy.PolicyState.BOUND)
+
+            # Each transition is recorded exactly once, no matter how many requests raced
+            self.assertEqual(
+                list(
+                    policy.policystatehistory_set.order_by("id").values_list(
+                        "state", flat=True
+                    )
+                ),
+                ["quoted", "new", "bound"],
+            )
+
+
 class PolicyTestCase(TestCase):
     def setUp(self):
         self.client = Client()
 
+        # Ids are reused between tests, so cached policies would leak from one to another
+        cache.clear()
+
         self.customer = Customer.objects.create(
             first_name="Ben",
             last_name="Stokes",
@@ -442,9 +991,473 @@ class PolicyTestCase(TestCase):
         self.assertNotEqual(newer, third)
         self.assertNotEqual(older, third)
 
+    def test_get_customer_policies_query_count(self):
+        for _ in range(5):
+            Quote.objects.create(
+                customer=self.customer,
+                cover=30000,
+                premium=300,
+                type=Quote.QuoteType.AUTO_INSURANCE,
+            )
+
+        # The number of queries should not depend on the page size
+        for per_page in (1, 3, 100):
+            with self.assertNumQueries(1):
+                response = self.client.get(
+                    "/api/v1/policies/",
+                    data={"customer_id": self.customer.id, "per_page": per_page},
+                )
+
+            self.assertEqual(response.status_code, 200)
+
+            for policy in response.json()["policies"]:
+                self.assertEqual(policy["customer"]["id"], self.customer.id)
+                self.assertEqual(policy["quote"]["customer"]["id"], self.customer.id)
+
+    def test_get_policy_details_query_count(self):
+        policy = Policy.objects.get(quote__id=self.quote.id)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/v1/policies/{policy.id}/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["quote"]["id"], self.quote.id)
+
+    def test_get_policy_history_query_count(self):
+        policy = Policy.objects.get(quote__id=self.quote.id)
+
+        for state in (Policy.PolicyState.NEW, Policy.PolicyState.BOUND):
+            policy.state = state
+            policy.save()
+
+        for per_page in (1, 3):
+            with self.assertNumQueries(2):
+                response = self.client.get(
+                    f"/api/v1/policies/{policy.id}/history/",
+                    data={"per_page": per_page},
+                )
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()["history"]), per_page)
+
+    def test_get_policy_details_conditionally(self):
+        policy = Policy.objects.get(quote__id=self.quote.id)
+        url = f"/api/v1/policies/{policy.id}/"
+
+        response = self.client.get(url)
+        etag = response.headers["ETag"]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Last-Modified", response.headers)
+
+        # A single query, and no body
+        with self.assertNumQueries(1):
+            response = self.client.get(url, headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response.headers["ETag"], etag)
+
+        response = self.client.get(
+            url, headers={"If-Modified-Since": response.headers["Last-Modified"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        self.client.put(
+            "/api/v1/quote/",
+            {"quote_id": self.quote.id, "status": "accepted"},
+            content_type="application/json",
+        )
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["state"], "new")
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+        # A customer update changes the policy's representation too
+        etag = response.headers["ETag"]
+        self.customer.last_name = "Foakes"
+        self.customer.save()
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["customer"]["last_name"], "Foakes")
+
+        response = self.client.get(
+            "/api/v1/policies/9999/", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_get_policy_history_conditionally(self):
+        policy = Policy.objects.get(quote__id=self.quote.id)
+        url = f"/api/v1/policies/{policy.id}/history/"
+
+        response = self.client.get(url)
+        etag = response.headers["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 304)
+
+        # A new history entry changes the ETag, even within the same second
+        policy.save()
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["history"]), 2)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_get_customer_policies_with_fields(self):
+        policy = Policy.objects.get(quote__id=self.quote.id)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/api/v1/policies/",
+                data={"customer_id": self.customer.id, "fields": "id,state"},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {"next_cursor": None, "policies": [{"id": policy.id, "state": "quoted"}]},
+        )
+
+        response = self.client.get(
+            "/api/v1/policies/",
+            data={"customer_id": self.customer.id, "expand": "customer"},
+        )
+
+        self.assertEqual(response.json()["policies"][0]["quote"], self.quote.id)
+        self.assertEqual(
+            response.json()["policies"][0]["customer"]["id"], self.customer.id
+        )
+
+        for query in ({"fields": "id,owner"}, {"fields": ""}, {"expand": "policy"}):
+            response = self.client.get(
+                "/api/v1/policies/", data={"customer_id": self.customer.id, **query}
+            )
+            self.assertEqual(response.status_code, 422)
+
+    def test_get_paginated_customer_policies_with_fields(self):
+        for _ in range(2):
+            Quote.objects.create(
+                customer=self.customer,
+                cover=30000,
+                premium=300,
+                type=Quote.QuoteType.AUTO_INSURANCE,
+            )
+
+        ids = list(
+            Policy.objects.filter(customer=self.customer)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+
+        response = self.client.get(
+            "/api/v1/policies/",
+            data={"customer_id": self.customer.id, "per_page": 2, "fields": "id"},
+        )
+
+        self.assertEqual(response.json()["next_cursor"], ids[2])
+        self.assertEqual(response.json()["policies"], [{"id": ids[0]}, {"id": ids[1]}])
+
+    def test_get_policy_details_with_fields(self):
+        policy = Policy.objects.get(quote__id=self.quote.id)
+        url = f"/api/v1/policies/{policy.id}/"
+
+        etag = self.client.get(url).headers["ETag"]
+
+        # Neither the customer nor the quote are joined
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                url, data={"fields": "id,premium,customer", "expand": ""}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {"id": policy.id, "premium": "200.00", "customer": self.customer.id},
+        )
+
+        # The payload differs, so the ETag does too
+        self.assertNotEqual(response.headers["ETag"], etag)
+        etag = response.headers["ETag"]
+
+        response = self.client.get(
+            url,
+            data={"fields": "id,premium,customer", "expand": ""},
+            headers={"If-None-Match": etag},
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # The customer is not in the payload, so its changes do not change the ETag
+        self.customer.last_name = "Foakes"
+        self.customer.save()
+
+        response = self.client.get(
+            url,
+            data={"fields": "id,premium,customer", "expand": ""},
+            headers={"If-None-Match": etag},
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(url, data={"expand": "customer"})
+        self.assertEqual(response.json()["customer"]["last_name"], "Foakes")
+
+        response = self.client.get(url, data={"fields": "owner"})
+        self.assertEqual(response.status_code, 422)
+
+        response = self.client.get("/api/v1/policies/9999/", data={"fields": "id"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_get_policy_history_with_fields(self):
+        policy = Policy.objects.get(quote__id=self.quote.id)
+        url = f"/api/v1/policies/{policy.id}/history/"
+
+        policy.state = Policy.PolicyState.NEW
+        policy.save()
+
+        with self.assertNumQueries(2):
+            response = self.client.get(url, data={"fields": "id,state"})
+
+        self.assertEqual(response.status_code, 200)
+
+        history = response.json()["history"]
+
+        self.assertEqual(len(history), 2)
+
+        for entry in history:
+            self.assertEqual(entry["policy"], {"id": policy.id, "state": "new"})
+
+        # The snapshots are pruned too
+        self.assertEqual(
+            [entry["object_json_dump"] for entry in history],
+            [{"id": policy.id, "state": "new"}, {"id": policy.id, "state": "quoted"}],
+        )
+
+        response = self.client.get(url, data={"fields": "quote", "expand": "quote"})
+
+        for entry in response.json()["history"]:
+            self.assertEqual(
+                entry["object_json_dump"]["quote"]["customer"], self.customer.id
+            )
+
+        response = self.client.get(url, data={"expand": "policy"})
+        self.assertEqual(response.status_code, 422)
+
     def test_get_nonexistent_policy_history(self):
         response = self.client.get("/api/v1/policies/9999/history/")
 
         self.assertEqual(response.status_code, 404)
 
         self.assertEqual(response.json()["detail"], "policy not found")
+
+
+class ExportTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+        self.customers = [
+            Customer.objects.create(
+                first_name=f"Ben{number}",
+                last_name="Stokes",
+                date_of_birth=datetime.date(year=1991, month=6, day=25),
+            )
+            for number in range(5)
+        ]
+
+        for customer in self.customers:
+            Quote.objects.create(
+                customer=customer,
+                cover=20000,
+                premium=200,
+                type=Quote.QuoteType.PERSONAL_ACCIDENT,
+            )
+
+    def get_rows(self, url, **params):
+        response = self.client.get(url, data=params)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+
+        return [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+
+    def test_export(self):
+        rows = self.get_rows(reverse_lazy("api:v1:export-customers"))
+
+        self.assertEqual([row["id"] for row in rows], [c.id for c in self.customers])
+        self.assertEqual(rows[0]["first_name"], "Ben0")
+        self.assertEqual(rows[0]["date_of_birth"], "1991-06-25")
+
+        quotes = self.get_rows(reverse_lazy("api:v1:export-quotes"))
+        policies = self.get_rows(reverse_lazy("api:v1:export-policies"))
+
+        self.assertEqual(len(quotes), 5)
+        self.assertEqual(policies[0]["quote_id"], quotes[0]["id"])
+        self.assertEqual(policies[0]["premium"], "200.00")
+
+    def test_export_updated_since(self):
+        updated_since = datetime.datetime.now(datetime.timezone.utc)
+
+        self.customers[3].last_name = "Smith"
+        self.customers[3].save()
+
+        rows = self.get_rows(
+            reverse_lazy("api:v1:export-customers"),
+            updated_since=updated_since.isoformat(),
+        )
+
+        self.assertEqual([row["id"] for row in rows], [self.customers[3].id])
+
+        # A date includes the whole day
+        rows = self.get_rows(
+            reverse_lazy("api:v1:export-customers"),
+            updated_since=timezone.localdate().isoformat(),
+        )
+
+        self.assertEqual(len(rows), 5)
+
+        response = self.client.get(
+            reverse_lazy("api:v1:export-customers"), data={"updated_since": "yesterday"}
+        )
+
+        self.assertEqual(response.status_code, 422)
+
+    async def test_export_under_asgi(self):
+        response = await self.async_client.get(reverse_lazy("api:v1:export-customers"))
+
+        # Streamed a chunk at a time rather than consumed whole first
+        self.assertTrue(response.is_async)
+
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        sync_content = await sync_to_async(
+            lambda: b"".join(
+                self.client.get(
+                    reverse_lazy("api:v1:export-customers")
+                ).streaming_content
+            )
+        )()
+
+        self.assertEqual(content, sync_content)
+
+    def test_export_chunks(self):
+        chunks = list(exports.export_ndjson("customers", chunk_size=2))
+
+        self.assertEqual([chunk.count(b"\n") for chunk in chunks], [2, 2, 1])
+
+    def test_export_command(self):
+        stdout = StringIO()
+        call_command("export_ndjson", "policies", stdout=stdout)
+
+        rows = [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+        self.assertEqual(
+            [row["customer_id"] for row in rows], [c.id for c in self.customers]
+        )
+
+
+class PolicyChangeFeedTestCase(TestCase):
+    url = reverse_lazy("api:v1:policy-changes")
+
+    def setUp(self):
+        self.client = Client()
+
+        customer = Customer.objects.create(
+            first_name="Ben",
+            last_name="Stokes",
+            date_of_birth=datetime.date(year=1991, month=6, day=25),
+        )
+        self.quotes = [
+            Quote.objects.create(
+                customer=customer,
+                cover=20000,
+                premium=200,
+                type=Quote.QuoteType.PERSONAL_ACCIDENT,
+            )
+            for _ in range(3)
+        ]
+        self.client.put(
+            "/api/v1/quote/",
+            {"quote_id": self.quotes[0].id, "status": "accepted"},
+            content_type="application/json",
+        )
+
+    def test_feed(self):
+        response = self.client.get(self.url, data={"limit": 2})
+        changes = response.json()["changes"]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([change["state"] for change in changes], ["quoted", "quoted"])
+        self.assertEqual(response.json()["next_after"], changes[-1]["id"])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                self.url, data={"after": response.json()["next_after"]}
+            )
+
+        changes = response.json()["changes"]
+
+        self.assertEqual([change["state"] for change in changes], ["quoted", "new"])
+        self.assertEqual(
+            changes[-1]["policy_id"], Policy.objects.get(quote=self.quotes[0]).id
+        )
+
+        # Nothing new, even after waiting for it
+        after = changes[-1]["id"]
+        response = self.client.get(self.url, data={"after": after, "wait": 0.1})
+
+        self.assertEqual(response.json(), {"changes": [], "next_after": after})
+
+        response = self.client.get(self.url, data={"after": -1})
+
+        self.assertEqual(response.status_code, 422)
+
+        # A nan deadline would never be reached
+        for wait in ("nan", "inf", "-inf"):
+            response = self.client.get(self.url, data={"wait": wait})
+
+            self.assertEqual(response.status_code, 422)
+
+    def test_feed_events(self):
+        first_id = self.client.get(self.url).json()["changes"][0]["id"]
+
+        response = self.client.get(
+            self.url,
+            HTTP_ACCEPT="text/event-stream",
+            HTTP_LAST_EVENT_ID=str(first_id),
+        )
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        events = b"".join(response.streaming_content).decode().split("\n\n")[:-1]
+
+        self.assertEqual(len(events), 3)
+
+        event_id, data = events[-1].split("\n")
+
+        self.assertEqual(event_id, f"id: {first_id + 3}")
+        self.assertEqual(json.loads(data.removeprefix("data: "))["state"], "new")
+
+    async def test_feed_events_under_asgi(self):
+        first_id = (await self.async_client.get(self.url)).json()["changes"][0]["id"]
+
+        response = await self.async_client.get(
+            self.url,
+            headers={"Accept": "text/event-stream", "Last-Event-ID": str(first_id)},
+        )
+
+        # Streamed as it goes rather than consumed whole first
+        self.assertTrue(response.is_async)
+
+        events = [event async for event in response.streaming_content]
+
+        self.assertEqual(len(events), 3)
+        self.assertTrue(events[-1].startswith(f"id: {first_id + 3}\n".encode()))
@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
+
+# The views that have an async version. See: :mod:`api.v1.async_views`
+dual_views = async_views if settings.API_ASYNC_VIEWS else views
 
 v1_patterns = (
     [
@@ -9,19 +13,46 @@ v1_patterns = (
             views.CustomerCreateView.as_view(),
             name="create-customer",
         ),
-        path("customers/", views.CustomerView.as_view(), name="customers"),
-        path("quote/", views.QuoteView.as_view(), name="quotes"),
-        path("policies/", views.PolicyListView.as_view(), name="list-policies"),
+        path(
+            "create_customer/batch/",
+            views.CustomerBulkCreateView.as_view(),
+            name="create-customer-batch",
+        ),
+        path("customers/", dual_views.CustomerView.as_view(), name="customers"),
+        path("quote/", dual_views.QuoteView.as_view(), name="quotes"),
+        path("quote/batch/", dual_views.QuoteBatchView.as_view(), name="quotes-batch"),
+        path("quote/preview/", views.QuotePreviewView.as_view(), name="quotes-preview"),
+        path("policies/", dual_views.PolicyListView.as_view(), name="list-policies"),
+        path(
+            "policies/changes/",
+            views.PolicyChangeFeedView.as_view(),
+            name="policy-changes",
+        ),
         path(
             "policies/<int:pk>/",
-            views.PolicyDetailView.as_view(),
+            dual_views.PolicyDetailView.as_view(),
             name="policy-details",
         ),
         path(
             "policies/<int:pk>/history/",
-            views.PolicyHistoryView.as_view(),
+            dual_views.PolicyHistoryView.as_view(),
             name="policy-history",
         ),
+        path(
+            "export/customers/",
+            views.ExportView.as_view(export_name="customers"),
+            name="export-customers",
+        ),
+        path(
+            "export/quotes/",
+            views.ExportView.as_view(export_name="quotes"),
+            name="export-quotes",
+        ),
+        path(
+            "export/policies/",
+            views.ExportView.as_view(export_name="policies"),
+            name="export-policies",
+        ),
     ],
     "v1",
 )
@@ -1,14 +1,74 @@
+import asyncio
 import datetime
+import hashlib
 import json
-
-from django.http import Http404, JsonResponse
+import math
+import operator
+import time
+
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date, quote_etag
 from django.views import View
 from django.views.generic.detail import BaseDetailView, SingleObjectMixin
 from django.views.generic.edit import ModelFormMixin, ProcessFormView
 from django.views.generic.list import MultipleObjectMixin
 
-from api.models import Customer, Policy, PolicyStateHistory, Quote
-from api.v1.forms import CustomerCreationForm, QuoteCreationForm, QuoteUpdateForm
+from api import cache as policy_cache
+from api import rendering
+from api.exports import aexport_ndjson, export_ndjson, parse_updated_since
+from api.history import KEYFRAME_INTERVAL
+from api.models import (
+    Customer,
+    CustomerPolicyType,
+    Policy,
+    PolicyStateHistory,
+    PolicyStateHistoryArchive,
+    Quote,
+    TableStatistics,
+    share_customers,
+)
+from api.search import filter_name_contains
+from api.v1 import schemas, services
+from api.v1.fieldsets import PolicyFieldset
+from api.v1.forms import CustomerCreationForm, create_quote, update_quote_status
+from api.v1.pagination import decode_cursor, encode_cursor
+
+
+def parse_batch_body(request):
+    """Parses the items of a batch request
+
+    The body is either a JSON array, or NDJSON (one JSON value per line) if the
+    content type is ``application/x-ndjson``.
+
+    :raises ValueError: If the body is malformed or is not a list of items
+    """
+
+    if request.content_type == "application/x-ndjson":
+        items = []
+
+        for line_number, line in enumerate(request.body.splitlines(), start=1):
+            if not line.strip():
+                continue
+
+            try:
+                items.append(json.loads(line))
+            except json.decoder.JSONDecodeError:
+                raise ValueError(f"line {line_number} of the request body is malformed")
+
+        return items
+
+    try:
+        items = json.loads(request.body)
+    except json.decoder.JSONDecodeError:
+        raise ValueError("request body is malformed")
+
+    if not isinstance(items, list):
+        raise ValueError("request body must be an array")
+
+    return items
 
 
 class CustomerCreateView(ModelFormMixin, ProcessFormView):
@@ -26,29 +86,83 @@ class CustomerCreateView(ModelFormMixin, ProcessFormView):
         try:
             request_json = json.loads(self.request.body)
         except json.decoder.JSONDecodeError:
-            return JsonResponse({"detail": {"request body is malformed"}}, status=422)
+            return JsonResponse({"detail": "request body is malformed"}, status=422)
+
+        if not isinstance(request_json, dict):
+            return JsonResponse(
+                {"detail": "request body must be an object"}, status=422
+            )
+
+        cleaned_data, errors = schemas.CUSTOMER_CREATION.validate(request_json)
+
+        if errors:
+            return JsonResponse({"detail": errors}, status=422)
 
-        form = self.form_class(request_json)
+        customer = Customer.objects.create(
+            first_name=cleaned_data["first_name"],
+            last_name=cleaned_data["last_name"],
+            date_of_birth=cleaned_data["dob"],
+        )
+
+        return rendering.json_response(rendering.encode_customer(customer), status=201)
+
+
+class CustomerBulkCreateView(View):
+    def post(self, *args, **kwargs):
+        """Creates customers in bulk
+
+        The body is a JSON array (or NDJSON) of items in the format accepted by
+        :class:`CustomerCreateView`. Valid items are created even if others fail validation.
+        See: :func:`api.v1.services.bulk_create_customers`
+
+        HTTP Response Codes
+        --------------------
+        - 200 OK: The batch was processed. The status of each item is in its result
+        - 422 Validation Error: The request body is malformed or has too many items
+        """
+
+        try:
+            items = parse_batch_body(self.request)
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
 
-        if not form.is_valid():
+        if len(items) > services.MAX_BATCH_ITEMS:
             return JsonResponse(
-                {"detail": json.loads(form.errors.as_json())},
+                {
+                    "detail": f"a batch must have at most {services.MAX_BATCH_ITEMS} items"
+                },
                 status=422,
             )
 
-        customer = form.save()
+        results = services.bulk_create_customers(items)
 
-        return JsonResponse(customer.serialize(), status=201)
+        return rendering.json_response({"results": results}, status=200)
 
 
 class CustomerView(MultipleObjectMixin, View):
     model = Customer
     paginate_by = 10
 
+    # Query parameters used to filter customers
+    filter_params = (
+        "first_name",
+        "last_name",
+        "dob",
+        "policy_type",
+        "min_age",
+        "max_age",
+    )
+
+    # The maximum min_age and max_age
+    age_limit = 150
+
     def get(self, *args, **kwargs):
         """Fetch all customers, with some optional filters
 
-        The result set is offset paginated.
+        The result set is offset paginated by default. Offset pagination counts the matching
+        customers on every request, and gets slower the deeper the page, so for large result
+        sets, use cursor pagination instead: request the first page with `pagination=cursor`,
+        then follow `next_cursor` until it is null.
 
         Query parameters
         ----------------
@@ -58,8 +172,19 @@ class CustomerView(MultipleObjectMixin, View):
             - last_name (Optional): Last name of the customer
             - dob (Optional): Date of birth of the customer
             - policy_type (Optional): Policy type. Must be one of :class:`api.models.Quote.QuoteType`
+            - min_age (Optional): Minimum age of the customer, inclusive
+            - max_age (Optional): Maximum age of the customer, inclusive. Both ages are at most 150
 
             Note that, if more than one filter is provided, they are ANDed together, not ORed.
+            Ages are computed the same way as when pricing quotes.
+            See: :meth:`api.models.Customer.age_from_date_of_birth`
+
+            - pagination (Optional): Set to `cursor` to get the first page by cursor
+            - cursor (Optional): The `next_cursor` of the previous page. It carries the filters
+              of the first page, so the filter parameters are ignored. This should not be guessed.
+            - include_total (Optional): Set to `true` to get an `estimated_total` of customers
+              with cursor pagination. It is refreshed out of band, so it may be stale, and it is
+              null if any filter is applied.
 
 
         HTTP Response Codes
@@ -68,6 +193,34 @@ class CustomerView(MultipleObjectMixin, View):
             - 422 Validation Error: One of the query parameters is invalid
         """
 
+        try:
+            customers, filters, per_page, after, by_cursor = self.parse_query()
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
+
+        if by_cursor:
+            return self.get_keyset_page(customers, filters, after, per_page)
+
+        try:
+            (paginator, page, object_list, _) = self.paginate_queryset(
+                customers, per_page
+            )
+        except Http404:
+            return JsonResponse(
+                {"detail": "page must be a positive integer"}, status=422
+            )
+
+        return self.render_offset_page(paginator, page, object_list)
+
+    def parse_query(self):
+        """Parses the query parameters of a request
+
+        :returns: A tuple of (customers, filters, per_page, after, by_cursor): the filtered
+            customers, the filters, the page size, the id to start after and whether the
+            page is by cursor
+        :raises ValueError: If a query parameter is invalid
+        """
+
         query_params = self.request.GET
 
         per_page = query_params.get("per_page", self.paginate_by)
@@ -75,66 +228,145 @@ class CustomerView(MultipleObjectMixin, View):
         try:
             per_page = int(per_page)
         except ValueError:
-            return JsonResponse(
-                {"detail": "per_page must be positive integer"},
-                status=422,
-            )
+            raise ValueError("per_page must be positive integer")
 
         # Force per_page ot a maximum of 100
         per_page = min(per_page, 100)
 
-        first_name = query_params.get("first_name")
-        last_name = query_params.get("last_name")
+        cursor = query_params.get("cursor")
+        after = 0
+
+        if cursor is not None:
+            after, filters = decode_cursor(cursor)
+        else:
+            filters = {
+                name: query_params[name]
+                for name in self.filter_params
+                if name in query_params
+            }
 
-        customers = super().get_queryset()
+        customers = self.filter_queryset(super().get_queryset(), filters)
+
+        # Only the columns of the response are fetched, as tuples rather than customers
+        customers = customers.order_by("id").values_list(*rendering.CUSTOMER_COLUMNS)
+
+        by_cursor = cursor is not None or query_params.get("pagination") == "cursor"
+
+        if by_cursor and per_page < 1:
+            raise ValueError("per_page must be positive integer")
+
+        return customers, filters, per_page, after, by_cursor
+
+    def render_offset_page(self, paginator, page, object_list):
+        return rendering.json_response(
+            {
+                "customers": [
+                    rendering.encode_customer_row(row) for row in object_list
+                ],
+                "total_pages": paginator.num_pages,
+                "previous_page": (
+                    page.previous_page_number() if page.has_previous() else None
+                ),
+                "next_page": page.next_page_number() if page.has_next() else None,
+            },
+            status=200,
+        )
+
+    def filter_queryset(self, customers, filters: dict):
+        """Applies the filters of a request to the customers
+
+        :param filters: The filter query parameters, by name
+        :raises ValueError: If a filter is invalid
+        """
+
+        first_name = filters.get("first_name")
+        last_name = filters.get("last_name")
 
         if first_name:
-            customers = customers.filter(first_name__icontains=first_name)
+            customers = filter_name_contains(customers, "first_name", first_name)
 
         if last_name:
-            customers = customers.filter(last_name__icontains=last_name)
+            customers = filter_name_contains(customers, "last_name", last_name)
 
-        dob = query_params.get("dob")
+        dob = filters.get("dob")
 
         if dob is not None:
             try:
                 dob = datetime.datetime.strptime(dob, "%d-%m-%Y")
             except ValueError:
-                return JsonResponse(
-                    {"detail": "invalid date format specified for field dob"},
-                    status=422,
-                )
+                raise ValueError("invalid date format specified for field dob")
+
             customers = customers.filter(date_of_birth=dob)
 
-        policy_type = query_params.get("policy_type")
+        policy_type = filters.get("policy_type")
 
         if policy_type is not None:
             if policy_type not in Quote.QuoteType:
-                return JsonResponse(
-                    {"detail": "invalid policy type specified"}, status=422
-                )
+                raise ValueError("invalid policy type specified")
 
-            customers = customers.filter(policy__type=policy_type)
+            customers = customers.filter(
+                id__in=CustomerPolicyType.customer_ids(policy_type)
+            )
 
-        customers = customers.distinct().order_by("id")
+        ages = {}
 
-        try:
-            (paginator, page, object_list, _) = self.paginate_queryset(
-                customers, per_page
-            )
-        except Http404:
-            return JsonResponse(
-                {"detail": "page must be a positive integer"}, status=422
-            )
+        for name in ("min_age", "max_age"):
+            if filters.get(name) is None:
+                continue
 
-        return JsonResponse(
+            try:
+                ages[name] = int(filters[name])
+            except ValueError:
+                raise ValueError(f"{name} must be a non-negative integer")
+
+            if ages[name] < 0:
+                raise ValueError(f"{name} must be a non-negative integer")
+
+            # Older ages would take the date of birth lookups out of the range of dates
+            if ages[name] > self.age_limit:
+                raise ValueError(f"{name} must not be greater than {self.age_limit}")
+
+        if len(ages) == 2 and ages["min_age"] > ages["max_age"]:
+            raise ValueError("min_age must not be greater than max_age")
+
+        if ages:
+            customers = customers.filter(**Customer.date_of_birth_lookups(**ages))
+
+        return customers
+
+    def get_keyset_page(self, customers, filters: dict, after: int, per_page: int):
+        """Returns the page of customers after the given id, without counting them"""
+
+        # Fetch one more than per_page, to know if there is a next page
+        customers = list(customers.filter(id__gt=after)[: per_page + 1])
+
+        estimated_total = None
+
+        if self.include_total(filters):
+            estimated_total = TableStatistics.estimated_row_count(Customer)
+
+        return self.render_keyset_page(customers, filters, per_page, estimated_total)
+
+    def include_total(self, filters: dict) -> bool:
+        return self.request.GET.get("include_total") == "true" and not filters
+
+    def render_keyset_page(self, customers, filters, per_page, estimated_total):
+        """
+        :param customers: The rows (of :data:`api.rendering.CUSTOMER_COLUMNS`) of the customers
+            of the page, and of the first one of the next page if any
+        """
+
+        next_cursor = None
+
+        if len(customers) > per_page:
+            customers.pop()
+            next_cursor = encode_cursor(customers[-1][0], filters)
+
+        return rendering.json_response(
             {
-                "customers": [customer.serialize() for customer in object_list],
-                "total_pages": paginator.count,
-                "previous_page": (
-                    page.previous_page_number() if page.has_previous() else None
-                ),
-                "next_page": page.next_page_number() if page.has_next() else None,
+                "customers": [rendering.encode_customer_row(row) for row in customers],
+                "next_cursor": next_cursor,
+                "estimated_total": estimated_total,
             },
             status=200,
         )
@@ -163,22 +395,24 @@ class QuoteView(ProcessFormView):
         try:
             request_json = json.loads(self.request.body)
         except json.decoder.JSONDecodeError:
-            return JsonResponse({"detail": {"request body is malformed"}}, status=422)
-
-        form = QuoteCreationForm(request_json)
+            return JsonResponse({"detail": "request body is malformed"}, status=422)
 
-        if not form.is_valid():
+        if not isinstance(request_json, dict):
             return JsonResponse(
-                {"detail": json.loads(form.errors.as_json())},
-                status=422,
+                {"detail": "request body must be an object"}, status=422
             )
 
+        cleaned_data, errors = schemas.QUOTE_CREATION.validate(request_json)
+
+        if errors:
+            return JsonResponse({"detail": errors}, status=422)
+
         try:
-            quote = form.save()
+            quote = create_quote(cleaned_data["customer_id"], cleaned_data["type"])
         except Customer.DoesNotExist:
             return JsonResponse({"detail": "customer not found"}, status=404)
 
-        return JsonResponse(quote.serialize(), status=201)
+        return rendering.json_response(rendering.encode_quote(quote), status=201)
 
     def put(self, *args, **kwargs):
         """Updates a quotes' status (:class:`api.models.Quote.QuoteStatus`)
@@ -205,21 +439,130 @@ class QuoteView(ProcessFormView):
         try:
             request_body_as_dict = json.loads(self.request.body)
         except json.decoder.JSONDecodeError:
-            return JsonResponse({"detail": {"request body is malformed"}}, status=422)
-
-        form = QuoteUpdateForm(request_body_as_dict)
+            return JsonResponse({"detail": "request body is malformed"}, status=422)
 
-        if not form.is_valid():
+        if not isinstance(request_body_as_dict, dict):
             return JsonResponse(
-                {"detail": json.loads(form.errors.as_json())}, status=422
+                {"detail": "request body must be an object"}, status=422
             )
 
+        cleaned_data, errors = schemas.QUOTE_UPDATE.validate(request_body_as_dict)
+
+        if errors:
+            return JsonResponse({"detail": errors}, status=422)
+
         try:
-            quote = form.save()
+            quote = update_quote_status(
+                cleaned_data["quote_id"], cleaned_data["status"]
+            )
         except Quote.DoesNotExist:
             return JsonResponse({"detail": "quote not found"}, status=404)
 
-        return JsonResponse(quote.serialize(), status=200)
+        return rendering.json_response(rendering.encode_quote(quote), status=200)
+
+
+class QuoteBatchView(View):
+    def post(self, *args, **kwargs):
+        """Creates quotes in bulk
+
+        The body is a JSON array (or NDJSON) of items in the format accepted by
+        :meth:`QuoteView.post`. Valid items are created even if others fail.
+        See: :func:`api.v1.services.bulk_create_quotes`
+
+        HTTP Response Codes
+        --------------------
+        - 200 OK: The batch was processed. The status of each item is in its result
+        - 422 Validation Error: The request body is malformed or has too many items
+        """
+
+        try:
+            items = self.parse_items()
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
+
+        results = services.bulk_create_quotes(items)
+
+        return rendering.json_response({"results": results}, status=200)
+
+    def put(self, *args, **kwargs):
+        """Updates quotes' statuses in bulk
+
+        The body is a JSON array (or NDJSON) of items in the format accepted by
+        :meth:`QuoteView.put`. They are applied in order, with the same transitions.
+        See: :func:`api.v1.services.bulk_update_quote_statuses`
+
+        The outcome of each item is one of:
+            - applied: The quote (and its policy) transitioned to the new status
+            - no-op: The quote already has the new status
+            - invalid transition: The quote cannot transition to the new status
+            - not found: Quote with specified ID does not exist
+            - invalid: The item failed validation
+
+        HTTP Response Codes
+        --------------------
+        - 200 OK: The batch was processed. The outcome of each item is in its result
+        - 409 Conflict: Some quotes were updated by another request meanwhile. Nothing was
+          updated, so the batch can be retried
+        - 422 Validation Error: The request body is malformed or has too many items
+        """
+
+        try:
+            items = self.parse_items()
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
+
+        try:
+            results = services.bulk_update_quote_statuses(items)
+        except services.ConcurrentUpdateError as err:
+            return JsonResponse({"detail": str(err)}, status=409)
+
+        return rendering.json_response({"results": results}, status=200)
+
+    def parse_items(self) -> list:
+        """Parses the items of the batch
+
+        :raises ValueError: If the request body is malformed or has too many items
+        """
+
+        items = parse_batch_body(self.request)
+
+        if len(items) > services.MAX_BATCH_ITEMS:
+            raise ValueError(
+                f"a batch must have at most {services.MAX_BATCH_ITEMS} items"
+            )
+
+        return items
+
+
+class QuotePreviewView(View):
+    def post(self, *args, **kwargs):
+        """Prices quotes in bulk, without creating them
+
+        The body is a JSON array (or NDJSON) of items, each with a quote ``type`` and either
+        a ``customer_id`` or a ``dob`` (DD-MM-YYYY). Each result has the ``cover`` and
+        ``premium`` the quote would have if it was created.
+        See: :func:`api.v1.services.preview_quotes`
+
+        HTTP Response Codes
+        --------------------
+        - 200 OK: The batch was processed. The status of each item is in its result
+        - 422 Validation Error: The request body is malformed or has too many items
+        """
+
+        try:
+            items = parse_batch_body(self.request)
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
+
+        if len(items) > services.MAX_BATCH_ITEMS:
+            return JsonResponse(
+                {
+                    "detail": f"a batch must have at most {services.MAX_BATCH_ITEMS} items"
+                },
+                status=422,
+            )
+
+        return JsonResponse({"results": services.preview_quotes(items)}, status=200)
 
 
 class PolicyListView(ProcessFormView):
@@ -227,6 +570,7 @@ class PolicyListView(ProcessFormView):
         """Get a list of a customer's policies
 
         The results are returned in ascending order of policy creation and are paginated by cursor.
+        The policies are served as stored when they were last saved. See: :meth:`api.models.Policy.render`
 
         Query parameters
         ----------------
@@ -235,6 +579,9 @@ class PolicyListView(ProcessFormView):
             - next_cursor (Optional): The next cursor to use for fetching the next set of policies.
               This should not be guessed.
 
+            - fields, expand (Optional): The fields of the policies to return and the relations
+              to embed. See: :mod:`api.v1.fieldsets`
+
         HTTP Response Codes
         --------------------
             - 20O OK: Success
@@ -248,15 +595,43 @@ class PolicyListView(ProcessFormView):
             return JsonResponse({"detail": "customer not found"}, status=404)
 
         try:
-            per_page = int(self.request.GET.get("per_page", 10))
+            fieldset = PolicyFieldset.from_query(self.request.GET)
+            policies = self.get_page_queryset(customer_id)
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
+
+        # Fetch one more than per_page, so that the extra item becomes the cursor
+        policies = policies[: self.per_page + 1]
+
+        # The stored JSON is of the full policies, so other fieldsets are encoded instead
+        if not fieldset.is_default:
+            return self.render_fieldset_page(fieldset.fetch(policies), fieldset)
+
+        policies = list(policies.values_list("id", "rendered"))
+
+        # Policies are rendered when saved, so this is only for policies saved otherwise
+        unrendered = {
+            policy_id
+            for policy_id, rendered in policies[: self.per_page]
+            if rendered is None
+        }
+        rendered_policies = self.render_policies(unrendered) if unrendered else {}
+
+        return self.render_page(policies, rendered_policies)
+
+    def get_page_queryset(self, customer_id):
+        """Returns the policies from the cursor, in order
+
+        :raises ValueError: If a query parameter is invalid
+        """
+
+        try:
+            self.per_page = int(self.request.GET.get("per_page", 10))
         except ValueError:
-            return JsonResponse(
-                {"detail": "query parameter per_page must be an integer"},
-                status=422,
-            )
+            raise ValueError("query parameter per_page must be an integer")
 
         # Force the maximum per page to be 100
-        per_page = min(per_page, 100)
+        self.per_page = min(self.per_page, 100)
 
         # If leaking internal IDs is undesired, we can make the cursor opaque using base64 or similar
         try:
@@ -271,51 +646,324 @@ class PolicyListView(ProcessFormView):
         if next_cursor is not None:
             policies = policies.filter(id__gte=next_cursor)
 
-        # Fetch one more than per_page, so that the extra item becomes the cursor
-        policies = list(policies[: per_page + 1])
+        return policies
+
+    def render_policies(self, policy_ids):
+        """Renders policies that were not rendered when saved, by id"""
+
+        rows = list(
+            Policy.objects.filter(id__in=policy_ids).values_list(
+                *rendering.POLICY_COLUMNS
+            )
+        )
+
+        # The customers of the quotes that are not the customer of their policy, if any.
+        # See: :func:`api.models.share_customers`
+        customer_id_index = rendering.POLICY_COLUMNS.index("customer__id")
+        missing_ids = {row[-1] for row in rows if row[-1] != row[customer_id_index]}
+        customers = {
+            row[0]: rendering.encode_customer_row(row)
+            for row in Customer.objects.filter(id__in=missing_ids).values_list(
+                *rendering.CUSTOMER_COLUMNS
+            )
+        }
+
+        return {
+            row[0]: rendering.dumps(rendering.encode_policy_row(row, customers))
+            for row in rows
+        }
+
+    def render_page(self, policies, rendered_policies):
+        """
+        :param policies: The ids and stored JSON of the policies of the page, and of the
+            first policy of the next page if any
+        :param rendered_policies: The JSON of the policies without stored JSON, by id
+        """
+
+        last_policy_id = None
+
+        if len(policies) > self.per_page:
+            last_policy_id = policies.pop()[0]
+
+        # The stored JSON of the policies is spliced into the response as is. This is the
+        # same as serializing {"next_cursor": ..., "policies": [...]} with JsonResponse
+        content = b"".join(
+            [
+                b'{"next_cursor": ',
+                json.dumps(last_policy_id).encode(),
+                b', "policies": [',
+                b", ".join(
+                    bytes(rendered) if rendered is not None else rendered_policies[id]
+                    for id, rendered in policies
+                ),
+                b"]}",
+            ]
+        )
+
+        return HttpResponse(content, content_type="application/json", status=200)
+
+    def render_fieldset_page(self, policies, fieldset):
+        """
+        :param policies: The policies of the page, and the first policy of the next page if
+            any, fetched with :meth:`api.v1.fieldsets.PolicyFieldset.fetch`
+        """
 
         last_policy_id = None
 
-        if len(policies) > per_page:
+        if len(policies) > self.per_page:
             last_policy_id = policies.pop().id
 
-        return JsonResponse(
+        return rendering.json_response(
             {
                 "next_cursor": last_policy_id,
-                "policies": [policy.serialize() for policy in policies],
+                "policies": [fieldset.encode(policy) for policy in policies],
             },
             status=200,
         )
 
 
-class PolicyDetailView(BaseDetailView):
+class PolicyConditionalGetMixin:
+    """Adds ETag and Last-Modified headers to a policy resource, and answers conditional GETs
+
+    The validators are derived from the last modification times of the policy, its customer
+    and its quote (and the newest state history entry, with ``include_history``).
+    If the request is conditional, they are fetched with a single query by primary key, and
+    if the client's copy is still current, a 304 is returned without loading the policy.
+
+    With ``fields`` or ``expand``, the validators are derived from the rows in the payload
+    only, and the ETag differs per fieldset. See: :mod:`api.v1.fieldsets`
+    """
+
+    include_history = False
+
+    # Set from the query parameters by the views, with :meth:`parse_fieldset`
+    fieldset = PolicyFieldset()
+
+    # Fields the validators are derived from, in order
+    validator_fields = (
+        "last_modified",
+        "customer__last_modified",
+        "quote__last_modified",
+    )
+
+    def parse_fieldset(self):
+        """Sets :attr:`fieldset` from the query parameters
+
+        :raises ValueError: If a query parameter is invalid
+        """
+
+        self.fieldset = PolicyFieldset.from_query(self.request.GET)
+
+    def get_validator_fields(self) -> list:
+        """Returns the fields the validators are derived from, in order"""
+
+        if self.fieldset.is_default:
+            fields = list(self.validator_fields)
+        else:
+            fields = list(self.fieldset.validator_fields)
+
+        if self.include_history:
+            fields.append("latest_history_id")
+
+        return fields
+
+    def get_validator_values(self, policy):
+        """Returns the values of :meth:`get_validator_fields` of a loaded policy"""
+
+        return [
+            operator.attrgetter(field.replace("__", "."))(policy)
+            for field in self.get_validator_fields()
+        ]
+
+    def make_validators(self, values):
+        """Returns the ETag and Last-Modified headers for the values of the validator fields"""
+
+        etag_values = values
+
+        # The payload differs per fieldset, so the ETag does too
+        if not self.fieldset.is_default:
+            etag_values = [*values, self.fieldset.key]
+
+        etag = hashlib.md5(
+            repr(etag_values).encode(), usedforsecurity=False
+        ).hexdigest()
+        last_modified = max(
+            value for value in values if isinstance(value, datetime.datetime)
+        )
+
+        return quote_etag(etag), http_date(last_modified.timestamp())
+
+    def get_not_modified_response(self):
+        """Returns a 304 (or 412) response if the request's conditions are met, else None"""
+
+        if not self.is_conditional():
+            return None
+
+        return self.get_conditional_response(self.get_validator_queryset().first())
+
+    def is_conditional(self) -> bool:
+        return bool(
+            self.request.headers.get("If-None-Match")
+            or self.request.headers.get("If-Modified-Since")
+            or self.request.headers.get("If-Match")
+            or self.request.headers.get("If-Unmodified-Since")
+        )
+
+    def get_validator_queryset(self):
+        """Returns the values of the validator fields of the policy, by primary key"""
+
+        policies = Policy.objects.filter(pk=self.kwargs["pk"])
+
+        if self.include_history:
+            policies = policies.with_latest_history_id()
+
+        return policies.values_list(*self.get_validator_fields())
+
+    def get_conditional_response(self, values):
+        """Returns a 304 (or 412) response if the request's conditions are met for the values
+        of the validator fields, else None
+        """
+
+        # The view will respond with a 404
+        if values is None:
+            return None
+
+        response = HttpResponse()
+        response.headers["ETag"], response.headers["Last-Modified"] = (
+            self.make_validators(list(values))
+        )
+
+        conditional_response = get_conditional_response(
+            self.request,
+            etag=response.headers["ETag"],
+            last_modified=parse_http_date(response.headers["Last-Modified"]),
+            response=response,
+        )
+
+        # The response passed in is returned as is if the conditions are not met
+        if conditional_response is response:
+            return None
+
+        return conditional_response
+
+    def set_validators(self, response, policy):
+        """Sets the ETag and Last-Modified headers of a response for a loaded policy"""
+
+        response.headers["ETag"], response.headers["Last-Modified"] = (
+            self.make_validators(self.get_validator_values(policy))
+        )
+
+        return response
+
+
+class PolicyDetailView(PolicyConditionalGetMixin, BaseDetailView):
     model = Policy
+    queryset = Policy.objects.for_serialization()
 
     def get(self, *args, **kwargs):
         """Get details about a policy
 
+        The rendered policy is cached until the policy, its quote or its customer change.
+        See: :mod:`api.cache`
+
+        Query parameters
+        ----------------
+            - fields, expand (Optional): The fields of the policy to return and the relations
+              to embed. These payloads are not cached. See: :mod:`api.v1.fieldsets`
+
         HTTP Response Codes
         --------------------
             - 20O OK: Success
+            - 304 Not Modified: The policy has not changed since the client fetched it
+            - 422 Validation Error: The query parameters are invalid
             - 404 Not Found: Policy with specified ID does not exist
+
+        See: :class:`PolicyConditionalGetMixin`
         """
 
         try:
-            policy = self.get_object()
-        except Http404:
+            self.parse_fieldset()
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
+
+        not_modified_response = self.get_not_modified_response()
+
+        if not_modified_response is not None:
+            return not_modified_response
+
+        if not self.fieldset.is_default:
+            return self.render_fieldset(
+                self.fieldset.fetch(Policy.objects.filter(pk=self.kwargs["pk"]))
+            )
+
+        entry = policy_cache.get_or_build(self.kwargs["pk"], self.render_policy)
+
+        return self.render_entry(entry)
+
+    def render_entry(self, entry):
+        """Returns the response for a cache entry of :meth:`render_policy`"""
+
+        if entry is None:
             return JsonResponse({"detail": "policy not found"}, status=404)
 
-        return JsonResponse(policy.serialize(), status=200)
+        content, etag, last_modified = entry
+
+        response = HttpResponse(content, content_type="application/json", status=200)
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = last_modified
 
+        return response
+
+    def render_fieldset(self, policies):
+        """Returns the response for the policy fetched with
+        :meth:`api.v1.fieldsets.PolicyFieldset.fetch`, as a list of zero or one policy
+        """
+
+        if not policies:
+            return JsonResponse({"detail": "policy not found"}, status=404)
+
+        response = rendering.json_response(
+            self.fieldset.encode(policies[0]), status=200
+        )
 
-class PolicyHistoryView(SingleObjectMixin, ProcessFormView):
+        return self.set_validators(response, policies[0])
+
+    def render_policy(self):
+        """Renders the policy for the cache
+
+        :returns: A tuple of (content, ETag, Last-Modified), or None if the policy does not exist
+        """
+
+        values = (
+            Policy.objects.filter(pk=self.kwargs["pk"])
+            .values_list("rendered", *self.validator_fields)
+            .first()
+        )
+
+        if values is None:
+            return None
+
+        rendered, *validator_values = values
+
+        # Policies are rendered when saved, so this is only for policies saved otherwise
+        if rendered is None:
+            policy = self.get_object()
+            share_customers([policy])
+            rendered = policy.render()
+
+        return (bytes(rendered), *self.make_validators(validator_values))
+
+
+class PolicyHistoryView(PolicyConditionalGetMixin, SingleObjectMixin, ProcessFormView):
     model = Policy
+    include_history = True
 
     def get(self, *args, **kwargs):
         """Get the state history of a policy
 
         If the policy exists, then it will have at least one state history entry.
-        The results are returned in descending order of state change time.
+        The results are returned in descending order of state change time, continuing with the
+        archived entries (see: the ``archive_policy_history`` management command).
 
         Query parameters
         ----------------
@@ -324,25 +972,83 @@ class PolicyHistoryView(SingleObjectMixin, ProcessFormView):
             - next_cursor (Optional): The next cursor to use for fetching the next set of state history entries.
               This should not be guessed.
 
+            - fields, expand (Optional): The fields of the policy of the entries, and of their
+              snapshots (``object_json_dump``), to return and the relations to embed.
+              See: :mod:`api.v1.fieldsets`
+
         HTTP Response Codes
         --------------------
             - 20O OK: Success
+            - 304 Not Modified: The policy and its history have not changed since the client
+              fetched them
             - 422 Validation Error: The query parameters are invalid
             - 404 Not Found: Customer with specified ID does not exist
+
+        See: :class:`PolicyConditionalGetMixin`
         """
 
+        try:
+            self.parse_fieldset()
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
+
+        not_modified_response = self.get_not_modified_response()
+
+        if not_modified_response is not None:
+            return not_modified_response
+
         try:
             policy = self.get_object()
         except Http404:
             return JsonResponse({"detail": "policy not found"}, status=404)
 
+        try:
+            per_page, next_cursor = self.parse_page()
+        except ValueError as err:
+            return JsonResponse({"detail": str(err)}, status=422)
+
+        self.fieldset.prepare([policy])
+
+        # Fetch one more than per_page, so that the extra item becomes the cursor,
+        # and the older entries the snapshots of the page may be stored as deltas of
+        entries = list(
+            self.get_history_queryset(policy, next_cursor)[
+                : per_page + KEYFRAME_INTERVAL
+            ]
+        )
+        PolicyStateHistory.load_snapshots(entries)
+
+        history = entries[: per_page + 1]
+
+        # The older entries may have been archived, in which case the walk continues there
+        if len(history) <= per_page and policy.has_archived_history:
+            history += PolicyStateHistoryArchive.entries_for(
+                policy,
+                before_id=next_cursor,
+                limit=per_page + 1 - len(history),
+            )
+
+        return self.render_page(policy, history, per_page)
+
+    def get_queryset(self):
+        policies = Policy.objects.with_latest_history_id().with_archived_history()
+
+        if self.fieldset.is_default:
+            return policies.for_serialization()
+
+        return self.fieldset.apply(policies)
+
+    def parse_page(self):
+        """Parses the query parameters of a request
+
+        :returns: A tuple of (per_page, next_cursor)
+        :raises ValueError: If a query parameter is invalid
+        """
+
         try:
             per_page = int(self.request.GET.get("per_page", 10))
         except ValueError:
-            return JsonResponse(
-                {"detail": "query parameter per_page must be an integer"},
-                status=422,
-            )
+            raise ValueError("query parameter per_page must be an integer")
 
         # Force the maximum per page to be 100
         per_page = min(per_page, 100)
@@ -358,25 +1064,215 @@ class PolicyHistoryView(SingleObjectMixin, ProcessFormView):
                 # Therefore, we start from the first set
                 next_cursor = None
 
-        history = PolicyStateHistory.objects.filter(policy__id=policy.id).order_by(
-            "-id"
-        )
+        return per_page, next_cursor
+
+    def get_history_queryset(self, policy, next_cursor):
+        """Returns the history of the policy from the cursor, newest first"""
+
+        # The related manager hands the already loaded policy to every history entry,
+        # so serializing an entry does not fetch and serialize its policy again
+        history = policy.policystatehistory_set.order_by("-id")
 
         if next_cursor is not None:
             history = history.filter(id__lte=next_cursor)
 
-        # Fetch one more than per_page, so that the extra item becomes the cursor
-        history = list(history[: per_page + 1])
+        return history
+
+    def render_page(self, policy, history, per_page):
+        """
+        :param history: The entries of the page, and the first one of the next page if any
+        """
 
         last_history_id = None
 
         if len(history) > per_page:
             last_history_id = history.pop().id
 
-        return JsonResponse(
+        response = rendering.json_response(
             {
                 "next_cursor": last_history_id,
-                "history": [h.serialize() for h in history],
+                "history": rendering.encode_history(
+                    history,
+                    self.fieldset.encode(policy),
+                    None if self.fieldset.is_default else self.fieldset.prune_snapshot,
+                ),
             },
             status=200,
         )
+
+        return self.set_validators(response, policy)
+
+
+class ExportView(View):
+    # The name of the export. One of :data:`api.exports.EXPORTS`
+    export_name = None
+
+    def get(self, *args, **kwargs):
+        """Stream all the rows of a table as NDJSON (one JSON object per line)
+
+        The rows are returned in ascending order of id, in a single response, instead of
+        being paginated. See: :mod:`api.exports`
+
+        Query parameters
+        ----------------
+            - updated_since (Optional): Only return the rows modified at or after this
+              ISO 8601 date or datetime
+
+        HTTP Response Codes
+        -------------------
+            - 200 OK: Success
+            - 422 Validation Error: The query parameters are invalid
+        """
+
+        updated_since = self.request.GET.get("updated_since")
+
+        if updated_since is not None:
+            try:
+                updated_since = parse_updated_since(updated_since)
+            except ValueError as err:
+                return JsonResponse({"detail": str(err)}, status=422)
+
+        # Django would consume a sync iterator whole under ASGI. See: :mod:`api.exports`
+        if isinstance(self.request, ASGIRequest):
+            lines = aexport_ndjson(self.export_name, updated_since)
+        else:
+            lines = export_ndjson(self.export_name, updated_since)
+
+        return StreamingHttpResponse(lines, content_type="application/x-ndjson")
+
+
+class PolicyChangeFeedView(View):
+    # The maximum time to wait for changes, in seconds
+    max_wait = 30
+
+    # How often to look for changes while waiting, in seconds
+    poll_interval = 0.5
+
+    def get(self, *args, **kwargs):
+        """Tail the state changes of all policies, oldest first
+
+        Each change is a state history entry (see: :class:`api.models.PolicyStateHistory`),
+        so consumers read one range of ids instead of polling the policies.
+
+        With ``Accept: text/event-stream``, the changes are streamed as Server-Sent Events until
+        ``wait`` runs out, and the stream resumes from the ``Last-Event-ID`` header when the
+        client reconnects. Under ASGI, the events are streamed from an async generator, as
+        Django would otherwise consume a sync one whole before sending any of it.
+
+        The entries are only ever appended, with increasing ids. But on databases with
+        concurrent writers (unlike SQLite), an entry may be committed after one with a higher
+        id, so consumers that must not miss any should read again from a little before their
+        last id, and skip the ids already seen.
+        Entries archived by the ``archive_policy_history`` management command are not in the
+        feed.
+
+        Query parameters
+        ----------------
+            - after (Optional): The id of the last change already read. Default is 0
+            - limit (Optional): The maximum number of changes to return. Default is 100. Max is 1000
+            - wait (Optional): If there are no changes yet, the number of seconds to wait for
+              some (long polling). Default is 0. Max is 30
+
+        HTTP Response Codes
+        -------------------
+            - 200 OK: Success. ``next_after`` is the ``after`` to request the next changes with
+            - 422 Validation Error: The query parameters are invalid
+        """
+
+        query_params = self.request.GET
+
+        try:
+            after = int(
+                self.request.headers.get("Last-Event-ID", query_params.get("after", 0))
+            )
+            limit = int(query_params.get("limit", 100))
+            wait = float(query_params.get("wait", 0))
+        except ValueError:
+            return JsonResponse(
+                {"detail": "after, limit and wait must be numbers"}, status=422
+            )
+
+        # float() parses "nan" and "inf", and a nan deadline is never reached
+        if after < 0 or limit < 1 or not math.isfinite(wait) or wait < 0:
+            return JsonResponse(
+                {"detail": "after, limit and wait must be positive numbers"},
+                status=422,
+            )
+
+        limit = min(limit, 1000)
+        deadline = time.monotonic() + min(wait, self.max_wait)
+
+        if "text/event-stream" in self.request.headers.get("Accept", ""):
+            if isinstance(self.request, ASGIRequest):
+                events = self.astream_events(after, limit, deadline)
+            else:
+                events = self.stream_events(after, limit, deadline)
+
+            return StreamingHttpResponse(
+                events,
+                content_type="text/event-stream",
+                headers={"Cache-Control": "no-cache"},
+            )
+
+        changes = self.wait_for_changes(after, limit, deadline)
+
+        return JsonResponse(
+            {
+                "changes": changes,
+                "next_after": changes[-1]["id"] if changes else after,
+            }
+        )
+
+    def wait_for_changes(self, after, limit, deadline):
+        """Returns the changes after an id, waiting for some until the deadline if needed"""
+
+        while True:
+            changes = PolicyStateHistory.changes_after(after, limit)
+
+            if changes or time.monotonic() + self.poll_interval > deadline:
+                return changes
+
+            time.sleep(self.poll_interval)
+
+    def stream_events(self, after, limit, deadline):
+        while True:
+            changes = self.wait_for_changes(after, limit, deadline)
+
+            for change in changes:
+                yield self.encode_event(change)
+
+            if not changes:
+                return
+
+            after = changes[-1]["id"]
+
+    async def await_changes(self, after, limit, deadline):
+        """Async version of :meth:`wait_for_changes`"""
+
+        while True:
+            changes = await PolicyStateHistory.achanges_after(after, limit)
+
+            if changes or time.monotonic() + self.poll_interval > deadline:
+                return changes
+
+            await asyncio.sleep(self.poll_interval)
+
+    async def astream_events(self, after, limit, deadline):
+        """Async version of :meth:`stream_events`, for ASGI"""
+
+        while True:
+            changes = await self.await_changes(after, limit, deadline)
+
+            for change in changes:
+                yield self.encode_event(change)
+
+            if not changes:
+                return
+
+            after = changes[-1]["id"]
+
+    def encode_event(self, change) -> bytes:
+        return (
+            f"id: {change['id']}\n"
+            f"data: {json.dumps(change, cls=DjangoJSONEncoder)}\n\n"
+        ).encode()
@@ -0,0 +1,9 @@
+"""Benchmarks for the API
+
+Each benchmark is a module that can be run from the project root, for example:
+
+    poetry run python -m benchmarks.customer_search --rows 1000000
+
+They run against a throwaway SQLite database (see :func:`benchmarks.utils.setup_django`),
+never against the database in the settings.
+"""
@@ -0,0 +1,177 @@
+"""Benchmarks the sync and async views served with ASGI, under many simultaneous requests
+
+The requests are made in process, straight to Django's ASGI handler, so this measures
+the views and the handler, without a server or the network.
+
+Usage: python -m benchmarks.async_views [--connections 1000] [--policies 1000]
+"""
+
+import argparse
+import asyncio
+import datetime
+import statistics
+import sys
+import time
+import types
+
+from benchmarks.utils import setup_django
+
+# The endpoints, as (name, path) with {customer_id} and {policy_id} filled in
+ENDPOINTS = (
+    ("customers", "/api/v1/customers/?per_page=10&pagination=cursor"),
+    ("policies", "/api/v1/policies/?customer_id={customer_id}"),
+    ("policy details", "/api/v1/policies/{policy_id}/"),
+    ("policy history", "/api/v1/policies/{policy_id}/history/"),
+)
+
+
+def use_views(module):
+    """Routes the API to the views of a module, either views or async_views"""
+
+    from django.conf import settings
+    from django.urls import clear_url_caches, include, path
+
+    from api.v1 import urls
+
+    v1_patterns = (
+        [
+            path("customers/", module.CustomerView.as_view()),
+            path("policies/", module.PolicyListView.as_view()),
+            path("policies/<int:pk>/", module.PolicyDetailView.as_view()),
+            path("policies/<int:pk>/history/", module.PolicyHistoryView.as_view()),
+        ],
+        urls.v1_patterns[1],
+    )
+
+    urlconf = types.ModuleType(f"benchmark_urls_{module.__name__}")
+    urlconf.urlpatterns = [path("api/v1/", include(v1_patterns))]
+    sys.modules[urlconf.__name__] = urlconf
+
+    settings.ROOT_URLCONF = urlconf.__name__
+    clear_url_caches()
+
+
+async def request(application, path):
+    """Makes a GET request to an ASGI application, and returns its latency in seconds"""
+
+    path, _, query_string = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+    received = False
+    status = None
+
+    async def receive():
+        nonlocal received
+
+        if received:
+            # The request is never disconnected
+            await asyncio.Event().wait()
+
+        received = True
+
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    start = time.perf_counter()
+    await application(scope, receive, send)
+    latency = time.perf_counter() - start
+
+    assert status == 200, f"{path} responded with {status}"
+
+    return latency
+
+
+async def run(application, paths):
+    """Makes all the requests at once, and returns the wall time and their latencies"""
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(request(application, path) for path in paths))
+
+    return time.perf_counter() - start, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--policies", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.core.asgi import get_asgi_application
+
+    from api.models import Customer, Policy, Quote
+    from api.v1 import async_views, views
+
+    customers = Customer.objects.bulk_create(
+        Customer(
+            first_name=f"First{i}",
+            last_name=f"Last{i}",
+            date_of_birth=datetime.date(1960, 1, 1) + datetime.timedelta(days=i),
+        )
+        for i in range(args.policies)
+    )
+
+    for customer in customers:
+        Quote.objects.create(
+            customer=customer,
+            cover=20000,
+            premium=200,
+            type=Quote.QuoteType.AUTO_INSURANCE,
+        )
+
+    policies = list(Policy.objects.values_list("id", "customer_id"))
+    settings.ALLOWED_HOSTS = ["localhost"]
+    application = get_asgi_application()
+
+    print(
+        f"{args.connections} simultaneous requests, median of {args.repeat} runs "
+        "(wall time, and the latency of the median and 99th percentile request)"
+    )
+
+    for name, path in ENDPOINTS:
+        paths = [
+            path.format(policy_id=policy_id, customer_id=customer_id)
+            for policy_id, customer_id in (
+                policies[i % len(policies)] for i in range(args.connections)
+            )
+        ]
+
+        for module in (views, async_views):
+            use_views(module)
+
+            # Warm up the handler, the connection and the policy cache
+            asyncio.run(run(application, paths))
+
+            runs = [asyncio.run(run(application, paths)) for _ in range(args.repeat)]
+            wall_time = statistics.median(wall_time for wall_time, _ in runs)
+            latencies = min(runs, key=lambda run: run[0])[1]
+
+            print(
+                f"{name + ', ' + module.__name__.rpartition('.')[2]:<30}"
+                f" wall {wall_time * 1e3:9.1f} ms"
+                f"   p50 {latencies[len(latencies) // 2] * 1e3:9.1f} ms"
+                f"   p99 {latencies[int(len(latencies) * 0.99)] * 1e3:9.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmarks searching customers by name, with and without the trigram index
+
+Usage: python -m benchmarks.customer_search [--rows 1000000]
+"""
+
+import argparse
+import datetime
+import random
+import string
+
+from benchmarks.utils import measure, report, setup_django
+
+
+def random_name(rng):
+    syllables = ["an", "ben", "cor", "dan", "el", "fin", "gar", "ho", "is", "jo", "ka"]
+    syllables += ["li", "mar", "nor", "ol", "pe", "quin", "ro", "sa", "tor", "ul", "vi"]
+
+    return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).title()
+
+
+def populate(rows, batch_size=20_000):
+    from api.models import Customer
+
+    rng = random.Random(42)
+
+    for start in range(0, rows, batch_size):
+        Customer.objects.bulk_create(
+            Customer(
+                first_name=random_name(rng),
+                last_name=random_name(rng),
+                date_of_birth=datetime.date(1950, 1, 1)
+                + datetime.timedelta(days=rng.randrange(20_000)),
+            )
+            for _ in range(min(batch_size, rows - start))
+        )
+
+    # A handful of customers with a rare name
+    for suffix in string.ascii_lowercase[:5]:
+        Customer.objects.create(
+            first_name=f"Zyxw{suffix}",
+            last_name="Smith",
+            date_of_birth=datetime.date(1990, 1, 1),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from api.models import Customer
+    from api.search import filter_name_contains
+
+    print(f"Populating {args.rows} customers...")
+    populate(args.rows)
+
+    customers = Customer.objects.order_by("id")
+
+    # A page of a rare match has to look at every row without the index. A frequent match
+    # is found early, unless the matches are counted, as offset pagination does
+    for label, value in [("rare", "zyxw"), ("frequent", "quin")]:
+        for name, queryset in [
+            ("icontains", customers.filter(first_name__icontains=value)),
+            ("trigram", filter_name_contains(customers, "first_name", value)),
+        ]:
+            report(
+                f"{label} ({value}), first page, {name}",
+                measure(lambda: list(queryset[:11]), repeat=args.repeat),
+            )
+            report(
+                f"{label} ({value}), count, {name}",
+                measure(queryset.count, repeat=args.repeat),
+            )
+
+
+if __name__ == "__main__":
+    main()
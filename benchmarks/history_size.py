@@ -0,0 +1,92 @@
+"""Measures the size of the policy state history, compacted and in full
+
+Every policy goes through its usual transitions (quoted, new, bound).
+
+Usage: python -m benchmarks.history_size [--policies 10000]
+"""
+
+import argparse
+import datetime
+import importlib
+
+from benchmarks.utils import measure, report, setup_django
+
+
+def populate(policies):
+    from api.models import Customer
+    from api.v1 import services
+
+    customers = Customer.objects.bulk_create(
+        Customer(
+            first_name=f"First{number}",
+            last_name=f"Last{number}",
+            date_of_birth=datetime.date(1980, 1, 1),
+        )
+        for number in range(policies)
+    )
+
+    results = services.bulk_create_quotes(
+        [{"customer_id": customer.id, "type": "auto"} for customer in customers]
+    )
+    quote_ids = [result["quote"]["id"] for result in results]
+
+    for status in ("accepted", "active"):
+        services.bulk_update_quote_statuses(
+            [{"quote_id": quote_id, "status": status} for quote_id in quote_ids]
+        )
+
+
+def history_size():
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*), SUM(LENGTH(as_json)) FROM policy_state_history"
+        )
+        return cursor.fetchone()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--policies", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.apps import apps
+    from django.test import Client
+
+    from api.models import Policy
+
+    print(f"Populating {args.policies} policies...")
+    populate(args.policies)
+
+    migration = importlib.import_module(
+        "api.migrations.0010_compact_policy_state_history"
+    )
+    client = Client()
+    policy_id = Policy.objects.order_by("id").values_list("id", flat=True)[0]
+
+    def report_history(name):
+        rows, total = history_size()
+        print(
+            f"{name:<10} {rows} entries, {total} bytes, {total / rows:.1f} bytes/entry"
+        )
+
+        report(
+            f"history of a policy, {name}",
+            measure(
+                lambda: client.get(f"/api/v1/policies/{policy_id}/history/"),
+                repeat=args.repeat,
+            ),
+        )
+
+    report_history("compact")
+
+    migration.expand_history(apps, None)
+    report_history("full")
+
+
+if __name__ == "__main__":
+    main()
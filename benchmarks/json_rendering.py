@@ -0,0 +1,110 @@
+"""Benchmarks rendering the pages of the list endpoints, with JsonResponse and api.rendering
+
+Usage: python -m benchmarks.json_rendering [--per-page 100]
+"""
+
+import argparse
+import datetime
+from decimal import Decimal
+
+from benchmarks.utils import measure, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--per-page", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.http import JsonResponse
+    from django.test import override_settings
+
+    from api import rendering
+    from api.models import Customer, Policy, PolicyStateHistory, Quote, share_customers
+
+    customers = Customer.objects.bulk_create(
+        Customer(
+            first_name=f"First{i}",
+            last_name=f"Last{i}",
+            date_of_birth=datetime.date(1960, 1, 1) + datetime.timedelta(days=i),
+        )
+        for i in range(args.per_page)
+    )
+    quote = Quote.objects.create(
+        customer=customers[0],
+        cover=Decimal("20000.00"),
+        premium=Decimal("200.00"),
+        type=Quote.QuoteType.AUTO_INSURANCE,
+    )
+    policy = Policy.objects.for_serialization().get(quote=quote)
+
+    # A long history, as the history endpoint pages through it
+    for i in range(args.per_page):
+        policy.state = list(Policy.PolicyState)[i % 3]
+        Policy.save_state_changes([policy])
+
+    policy = Policy.objects.for_serialization().get(quote=quote)
+    share_customers([policy])
+    entries = list(policy.policystatehistory_set.order_by("-id")[: args.per_page + 16])
+    PolicyStateHistory.load_snapshots(entries)
+    entries = entries[: args.per_page]
+
+    quotes = [quote] * args.per_page
+
+    pages = (
+        (
+            "customers",
+            lambda: JsonResponse(
+                {"customers": [customer.serialize() for customer in customers]}
+            ),
+            lambda: {
+                "customers": [
+                    rendering.encode_customer(customer) for customer in customers
+                ]
+            },
+        ),
+        (
+            "quote batch results",
+            lambda: JsonResponse({"results": [quote.serialize() for quote in quotes]}),
+            lambda: {"results": [rendering.encode_quote(quote) for quote in quotes]},
+        ),
+        (
+            "policy history",
+            lambda: JsonResponse({"history": [entry.serialize() for entry in entries]}),
+            lambda: {
+                "history": rendering.encode_history(
+                    entries, rendering.encode_policy(policy)
+                )
+            },
+        ),
+    )
+
+    for name, with_json_response, encode in pages:
+        assert with_json_response().content == rendering.json_response(encode()).content
+
+        report(
+            f"{name}, JsonResponse ({args.per_page})",
+            measure(with_json_response, repeat=args.repeat),
+            unit="us",
+        )
+        report(
+            f"{name}, api.rendering ({args.per_page})",
+            measure(lambda: rendering.json_response(encode()), repeat=args.repeat),
+            unit="us",
+        )
+
+        if rendering.orjson is not None:
+            with override_settings(API_FAST_JSON=True):
+                report(
+                    f"{name}, api.rendering with orjson ({args.per_page})",
+                    measure(
+                        lambda: rendering.json_response(encode()), repeat=args.repeat
+                    ),
+                    unit="us",
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmarks serializing a page of the list endpoints from model instances and from tuples
+
+The customers page is fetched as Customer instances and serialized with ``serialize()``,
+or fetched with ``values_list()`` and encoded from the tuples, as ``customers/`` does.
+The policies page is the fallback of ``policies/`` for policies without stored JSON:
+Policy instances rendered with ``render()``, or tuples of the joined columns.
+
+Usage: python -m benchmarks.list_serialization [--per-page 100]
+"""
+
+import argparse
+import datetime
+import tracemalloc
+from decimal import Decimal
+
+from benchmarks.utils import measure, report, setup_django
+
+
+def peak_memory(func) -> int:
+    """Returns the peak memory allocated while calling a function, in bytes"""
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--per-page", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.http import JsonResponse
+
+    from api import rendering
+    from api.models import Customer, Policy, Quote, share_customers
+
+    customers = Customer.objects.bulk_create(
+        Customer(
+            first_name=f"First{i}",
+            last_name=f"Last{i}",
+            date_of_birth=datetime.date(1960, 1, 1) + datetime.timedelta(days=i),
+        )
+        for i in range(args.per_page)
+    )
+
+    for customer in customers:
+        Quote.objects.create(
+            customer=customer,
+            cover=Decimal("20000.00"),
+            premium=Decimal("200.00"),
+            type=Quote.QuoteType.AUTO_INSURANCE,
+        )
+
+    policy_ids = list(Policy.objects.values_list("id", flat=True))
+
+    def customers_from_instances():
+        page = Customer.objects.order_by("id")[: args.per_page]
+
+        return JsonResponse({"customers": [customer.serialize() for customer in page]})
+
+    def customers_from_tuples():
+        page = Customer.objects.order_by("id").values_list(*rendering.CUSTOMER_COLUMNS)[
+            : args.per_page
+        ]
+
+        return rendering.json_response(
+            {"customers": [rendering.encode_customer_row(row) for row in page]}
+        )
+
+    def policies_from_instances():
+        policies = list(Policy.objects.for_serialization().filter(id__in=policy_ids))
+        share_customers(policies)
+
+        return [policy.render() for policy in policies]
+
+    def policies_from_tuples():
+        rows = Policy.objects.filter(id__in=policy_ids).values_list(
+            *rendering.POLICY_COLUMNS
+        )
+
+        return [rendering.dumps(rendering.encode_policy_row(row)) for row in rows]
+
+    assert customers_from_instances().content == customers_from_tuples().content
+    assert policies_from_instances() == policies_from_tuples()
+
+    for name, func in (
+        ("customers, instances", customers_from_instances),
+        ("customers, tuples", customers_from_tuples),
+        ("policies, instances", policies_from_instances),
+        ("policies, tuples", policies_from_tuples),
+    ):
+        report(f"{name} ({args.per_page})", measure(func, repeat=args.repeat))
+        print(f"{'':<50} peak memory {peak_memory(func) / 1024:10.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
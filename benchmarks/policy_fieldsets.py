@@ -0,0 +1,73 @@
+"""Benchmarks a page of ``policies/`` with the fieldsets of :mod:`api.v1.fieldsets`
+
+For each fieldset, this measures the view, and reports the size of the response and the
+number of joins of its query.
+
+Usage: python -m benchmarks.policy_fieldsets [--per-page 100]
+"""
+
+import argparse
+import datetime
+
+from benchmarks.utils import measure, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--per-page", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connection
+    from django.http import QueryDict
+    from django.test import RequestFactory
+    from django.test.utils import CaptureQueriesContext
+
+    from api.models import Customer, Quote
+    from api.v1 import views
+
+    customer = Customer.objects.create(
+        first_name="Ben", last_name="Stokes", date_of_birth=datetime.date(1991, 6, 25)
+    )
+
+    for _ in range(args.per_page):
+        Quote.objects.create(
+            customer=customer,
+            cover=20000,
+            premium=200,
+            type=Quote.QuoteType.AUTO_INSURANCE,
+        )
+
+    factory = RequestFactory()
+    handler = views.PolicyListView.as_view()
+
+    for query in (
+        "",
+        "expand=customer",
+        "expand=",
+        "fields=id,state,premium",
+    ):
+        request = factory.get(
+            "/",
+            QueryDict(f"customer_id={customer.id}&per_page={args.per_page}&{query}"),
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = handler(request)
+
+        assert response.status_code == 200, response.content
+
+        joins = sum(query["sql"].count(" JOIN ") for query in queries)
+
+        report(
+            f"{query or 'default'} ({args.per_page})",
+            measure(lambda: handler(request), repeat=args.repeat),
+            unit="us",
+        )
+        print(f"{'':<50} {len(response.content):8,} bytes, {joins} joins")
+
+
+if __name__ == "__main__":
+    main()
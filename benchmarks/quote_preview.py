@@ -0,0 +1,81 @@
+"""Benchmarks previewing (pricing without creating) a batch of quotes, with and without NumPy
+
+Usage: python -m benchmarks.quote_preview [--items 10000]
+"""
+
+import argparse
+import datetime
+import random
+from unittest import mock
+
+from benchmarks.utils import measure, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from api.v1 import rating, services
+    from api.v1.forms import calculate_quote_price
+
+    rng = random.Random(42)
+    types = ["personal-accident", "auto", "homeowner-insurance"]
+    dates = [
+        datetime.date(1940, 1, 1) + datetime.timedelta(days=rng.randrange(25_000))
+        for _ in range(args.items)
+    ]
+    items = [
+        {"type": rng.choice(types), "dob": date.strftime("%d-%m-%Y")} for date in dates
+    ]
+
+    rate_table = rating.get_rate_table()
+
+    report(
+        f"calculate_quote_price, one at a time ({args.items})",
+        measure(
+            lambda: [
+                calculate_quote_price(item["type"], date, rate_table)
+                for item, date in zip(items, dates)
+            ],
+            repeat=args.repeat,
+        ),
+    )
+
+    if rating.numpy is not None:
+        report(
+            f"preview_quotes, NumPy ({args.items})",
+            measure(lambda: services.preview_quotes(items), repeat=args.repeat),
+        )
+
+    with mock.patch.object(rating, "numpy", None):
+        report(
+            f"preview_quotes, without NumPy ({args.items})",
+            measure(lambda: services.preview_quotes(items), repeat=args.repeat),
+        )
+
+    quote_types = [item["type"] for item in items]
+    ages = [rng.randrange(18, 90) for _ in items]
+
+    if rating.numpy is not None:
+        report(
+            f"price_many, NumPy ({args.items})",
+            measure(
+                lambda: rate_table.price_many(quote_types, ages), repeat=args.repeat
+            ),
+        )
+
+    with mock.patch.object(rating, "numpy", None):
+        report(
+            f"price_many, without NumPy ({args.items})",
+            measure(
+                lambda: rate_table.price_many(quote_types, ages), repeat=args.repeat
+            ),
+        )
+
+
+if __name__ == "__main__":
+    main()
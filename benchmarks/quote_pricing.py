@@ -0,0 +1,102 @@
+"""Benchmarks pricing a quote, with the rate tables and with the if/elif chain they replaced
+
+Usage: python -m benchmarks.quote_pricing [--quotes 100000]
+"""
+
+import argparse
+import datetime
+import random
+
+from benchmarks.utils import measure, report, setup_django
+
+
+def if_chain_price(quote_type, age):
+    """The pricing before the rate tables (with floats), for comparison"""
+
+    if quote_type == "personal-accident":
+        cover, premium = 20000, 200
+    elif quote_type == "auto":
+        cover, premium = 30000, 300
+    elif quote_type == "homeowner-insurance":
+        cover, premium = 40000, 400
+    else:
+        cover, premium = 50000, 500
+
+    if age < 25:
+        cover *= 1.2
+        premium *= 2
+    elif 25 <= age < 50:
+        cover *= 1.1
+        premium *= 1.5
+    else:
+        cover *= 0.7
+
+    return cover, premium
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quotes", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from api.v1 import rating
+    from api.v1.forms import calculate_quote_price
+
+    rng = random.Random(42)
+    types = ["personal-accident", "auto", "homeowner-insurance"]
+    quotes = [(rng.choice(types), rng.randrange(18, 90)) for _ in range(args.quotes)]
+    today = datetime.date.today()
+    dated_quotes = [
+        (quote_type, today - datetime.timedelta(days=age * 365))
+        for quote_type, age in quotes
+    ]
+
+    def per_quote(func, items):
+        def run():
+            for item in items:
+                func(*item)
+
+        median, best = measure(run, repeat=args.repeat)
+
+        return median / len(items), best / len(items)
+
+    report(
+        "if/elif chain (floats), by age",
+        per_quote(if_chain_price, quotes),
+        unit="us",
+    )
+
+    # The rate tables are got (and checked for changes) once per request or batch
+    rate_table = rating.get_rate_table()
+
+    report(
+        "rate table (decimals), by age",
+        per_quote(rate_table.price, quotes),
+        unit="us",
+    )
+    report(
+        "calculate_quote_price, by date of birth",
+        per_quote(
+            lambda *quote: calculate_quote_price(*quote, rate_table), dated_quotes
+        ),
+        unit="us",
+    )
+    report(
+        "get_rate_table, once per request",
+        per_quote(rating.get_rate_table, [()] * len(quotes)),
+        unit="us",
+    )
+    report(
+        "loading the rate tables",
+        measure(
+            lambda: rating.RateTable.from_file(rating.settings.QUOTE_RATES_FILE),
+            repeat=args.repeat,
+        ),
+    )
+
+
+if __name__ == "__main__":
+    main()
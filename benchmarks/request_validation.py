@@ -0,0 +1,112 @@
+"""Benchmarks validating the payloads of the single-item endpoints with forms and schemas
+
+For each endpoint, this measures validating a valid and an invalid payload with the form
+(and, when invalid, its errors as the views used to return them) and with the schema of
+:mod:`api.v1.schemas`, then the requests per second of the view, with its schema.
+
+Usage: python -m benchmarks.request_validation [--requests 2000]
+"""
+
+import argparse
+import datetime
+import json
+
+from benchmarks.utils import measure, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.test import RequestFactory
+
+    from api.models import Customer, Quote
+    from api.v1 import schemas, views
+    from api.v1.forms import CustomerCreationForm, QuoteCreationForm, QuoteUpdateForm
+
+    customer = Customer.objects.create(
+        first_name="Ben", last_name="Stokes", date_of_birth=datetime.date(1991, 6, 25)
+    )
+    quote = Quote.objects.create(
+        customer=customer, cover=20000, premium=200, type=Quote.QuoteType.AUTO_INSURANCE
+    )
+
+    # (endpoint, view, method, form, schema, valid payload, invalid payload)
+    endpoints = (
+        (
+            "create_customer/",
+            views.CustomerCreateView,
+            "post",
+            CustomerCreationForm,
+            schemas.CUSTOMER_CREATION,
+            {"first_name": "Ben", "last_name": "Stokes", "dob": "25-06-1991"},
+            {"first_name": "", "last_name": "Stokes", "dob": "25/06/1991"},
+        ),
+        (
+            "quote/ (POST)",
+            views.QuoteView,
+            "post",
+            QuoteCreationForm,
+            schemas.QUOTE_CREATION,
+            {"customer_id": customer.id, "type": "auto"},
+            {"customer_id": "one", "type": "boat"},
+        ),
+        (
+            "quote/ (PUT)",
+            views.QuoteView,
+            "put",
+            QuoteUpdateForm,
+            schemas.QUOTE_UPDATE,
+            # A no-op, so that every request does the same work
+            {"quote_id": quote.id, "status": "new"},
+            {"quote_id": "one", "status": "paid"},
+        ),
+    )
+
+    factory = RequestFactory()
+    n = args.requests
+
+    def validate_with_form(form_class, payload):
+        form = form_class(payload)
+
+        if not form.is_valid():
+            json.loads(form.errors.as_json())
+
+    for name, view, method, form_class, schema, valid, invalid in endpoints:
+        for label, payload in (("valid", valid), ("invalid", invalid)):
+            report(
+                f"{name}, form, {label} ({n})",
+                measure(
+                    lambda: [validate_with_form(form_class, payload) for _ in range(n)],
+                    repeat=args.repeat,
+                ),
+            )
+            report(
+                f"{name}, schema, {label} ({n})",
+                measure(
+                    lambda: [schema.validate(payload) for _ in range(n)],
+                    repeat=args.repeat,
+                ),
+            )
+
+        handler = view.as_view()
+
+        for label, payload in (("valid", valid), ("invalid", invalid)):
+            requests = [
+                getattr(factory, method)("/", payload, content_type="application/json")
+                for _ in range(n)
+            ]
+
+            median, _ = measure(
+                lambda: [handler(request) for request in requests], repeat=args.repeat
+            )
+
+            print(f"{name}, view, {label}: {n / median:,.0f} requests/s")
+
+
+if __name__ == "__main__":
+    main()
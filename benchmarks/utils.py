@@ -0,0 +1,56 @@
+import os
+import statistics
+import tempfile
+import time
+
+
+def setup_django(database_name=None):
+    """Sets up Django with a throwaway database, and runs the migrations on it
+
+    :param database_name: The SQLite database file to use. By default, a new temporary file
+    :returns: The path of the database file
+    """
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "democrance.settings")
+
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+
+    if database_name is None:
+        database_name = os.path.join(tempfile.mkdtemp(), "benchmark.sqlite3")
+
+    settings.DATABASES["default"]["NAME"] = database_name
+    settings.DEBUG = False
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+
+    return database_name
+
+
+def measure(func, repeat=20, warmup=2):
+    """Calls a function repeatedly and returns its median and best duration, in seconds"""
+
+    for _ in range(warmup):
+        func()
+
+    durations = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    return statistics.median(durations), min(durations)
+
+
+def report(name, durations, unit="ms"):
+    """Prints the durations returned by :func:`measure`"""
+
+    scale = {"s": 1, "ms": 1e3, "us": 1e6}[unit]
+    median, best = durations
+
+    print(
+        f"{name:<50} median {median * scale:10.3f} {unit}   best {best * scale:10.3f} {unit}"
+    )
@@ -78,10 +78,50 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # An in-memory test database uses SQLite's shared cache, where concurrent writers
+        # fail immediately instead of waiting for the lock, as they do on a file
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "democrance",
+    }
+}
+
+# The cache used for rendered policies, and how long they are kept (in seconds).
+# See: :mod:`api.cache`
+POLICY_CACHE_ALIAS = "default"
+POLICY_CACHE_TIMEOUT = 300
+
+# The age (in days) after which policy state history entries are archived by the
+# archive_policy_history management command
+POLICY_HISTORY_ARCHIVE_AFTER_DAYS = 365
+
+# The URLs notified of every policy state change, and how long to wait for them (in seconds).
+# See: :class:`api.models.PolicyEvent`
+POLICY_EVENT_WEBHOOKS = []
+POLICY_EVENT_TIMEOUT = 10
+
+# The rate tables quotes are priced with. It is reloaded when it changes.
+# See: :mod:`api.v1.rating`
+QUOTE_RATES_FILE = BASE_DIR / "api" / "v1" / "rates.json"
+
+# Whether the read endpoints and the quote write paths are served by async views.
+# Only worth it when served with ASGI. See: :mod:`api.v1.async_views`
+API_ASYNC_VIEWS = False
+
+# Whether responses are encoded with orjson, if it is installed. The JSON is the same, but
+# compact and in UTF-8, so not byte for byte the same. See: :mod:`api.rendering`
+API_FAST_JSON = False
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 